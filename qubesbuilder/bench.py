@@ -0,0 +1,419 @@
+# The Qubes OS Project, http://www.qubes-os.org
+#
+# Copyright (C) 2026 Frédéric Pierret (fepitre) <frederic@invisiblethingslab.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+"""
+Benchmark of the executor layer and of the source archive creation.
+
+Each executor type runs the same trivial job against fake backends (see
+qubesbuilder.executors.fake) so that the measured time is the fixed overhead
+of qubes-builder itself: disposable qube creation and start, RPC services
+installation, container creation, copy processes spawns, etc.
+
+Source archives are created several times from the same source with
+'create-archive' to measure the throughput of each compression and check
+that the archives are identical.
+
+The output of a process is read by Executor._read_stream, split in lines
+and/or collected, to measure the throughput of streaming.
+"""
+
+import asyncio
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from qubesbuilder.common import PROJECT_PATH, sha256sum
+from qubesbuilder.exc import QubesBuilderError
+from qubesbuilder.executors import READ_SIZE, Executor, ExecutorError
+from qubesbuilder.executors.container import ContainerExecutor
+from qubesbuilder.executors.fake import (
+    FakeExecutor,
+    read_shim_calls,
+    use_fake_container_client,
+    use_shims,
+)
+from qubesbuilder.executors.local import LocalExecutor
+from qubesbuilder.executors.qubes import LinuxQubesExecutor
+
+BENCH_EXECUTORS = ("local", "fake", "qubes", "podman", "docker")
+
+# Phases of a job: 'setup' goes from the start of the job to the copy-in
+# (e.g. disposable qube creation and start, RPC services installation) and
+# 'copy-out' includes the cleanup.
+BENCH_PHASES = ("setup", "copy-in", "run", "copy-out")
+
+BENCH_ARCHIVE_FORMATS = ("gz", "bz2", "xz", "zst")
+
+# Read modes of the output: split in lines, collected or both
+BENCH_READ_MODES = ("lines", "collect", "lines+collect")
+
+# Write 'size' bytes of lines from 0 to ~20k characters (longer than the
+# default maximum line length) using a fixed pattern.
+READ_STREAM_GENERATOR = """
+import sys
+size = int(sys.argv[1])
+lengths = [0, 1, 17, 80, 133, 512, 4095, 20000]
+block = b"".join(b"x" * n + b"\\n" for n in lengths) * 64
+out = sys.stdout.buffer
+while size > 0:
+    out.write(block[:size])
+    size -= len(block)
+"""
+
+CREATE_ARCHIVE = (
+    PROJECT_PATH
+    / "qubesbuilder"
+    / "plugins"
+    / "fetch"
+    / "scripts"
+    / "create-archive"
+)
+
+
+class BenchError(QubesBuilderError):
+    pass
+
+
+@dataclass
+class BenchResult:
+    executor: str
+    jobs: int
+    # mean time per job for each phase
+    phases: Dict[str, float] = field(default_factory=dict)
+    # mean time per job simulated by the fake backends
+    simulated: float = 0.0
+    # mean number of calls per job
+    calls: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def total(self) -> float:
+        return sum(self.phases.values())
+
+    @property
+    def overhead(self) -> float:
+        return self.total - self.simulated
+
+
+@dataclass
+class ArchiveBenchResult:
+    archive_format: str
+    threads: int
+    input_size: int
+    # reason for which the benchmark has been skipped
+    skipped: Optional[str] = None
+    # mean time to create the archive
+    time: float = 0.0
+    size: int = 0
+    # digest of the archive created by each run
+    digests: List[str] = field(default_factory=list)
+
+    @property
+    def throughput(self) -> float:
+        return self.input_size / self.time if self.time else 0.0
+
+    @property
+    def ratio(self) -> float:
+        return self.size / self.input_size if self.input_size else 0.0
+
+    @property
+    def deterministic(self) -> bool:
+        return len(set(self.digests)) == 1
+
+
+@dataclass
+class ReadStreamBenchResult:
+    mode: str
+    size: int
+    time: float = 0.0
+    lines: int = 0
+
+    @property
+    def throughput(self) -> float:
+        return self.size / self.time if self.time else 0.0
+
+
+def create_input(directory: Path, size: int, files: int = 10) -> Path:
+    """
+    Create an input tree of the given total size.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    for i in range(files):
+        (directory / f"file{i}").write_bytes(b"\0" * (size // files))
+    return directory
+
+
+def get_executor(
+    executor_type: str, latency: float, bandwidth: float, directory: Path
+) -> Executor:
+    if executor_type == "local":
+        return LocalExecutor(directory=directory)
+    if executor_type == "fake":
+        return FakeExecutor(latency=latency, bandwidth=bandwidth)
+    if executor_type == "qubes":
+        return LinuxQubesExecutor(dispvm="builder-dvm", retries=0)
+    if executor_type in ("podman", "docker"):
+        try:
+            return ContainerExecutor(executor_type, "fedora:latest", retries=0)
+        except ExecutorError as e:
+            # the Python client is needed even with the fake backend
+            raise BenchError(str(e)) from e
+    raise BenchError(f"Unknown executor '{executor_type}'.")
+
+
+def run_job(executor: Executor, source: Path, output: Path) -> Dict[str, float]:
+    """
+    Run a trivial job and return the time spent in each phase.
+    """
+    marks = [("setup", time.monotonic())]
+
+    def on_phase(phase: str):
+        marks.append((phase, time.monotonic()))
+
+    executor.phase_callbacks.append(on_phase)
+    builder_dir = executor.get_builder_dir()
+    try:
+        executor.run(
+            [f"mkdir -p {builder_dir}/build", f"touch {builder_dir}/build/out"],
+            copy_in=[(source, builder_dir)],
+            copy_out=[(builder_dir / "build" / "out", output)],
+            environment={},
+        )
+    finally:
+        executor.phase_callbacks.remove(on_phase)
+    marks.append(("", time.monotonic()))
+    phases = {phase: 0.0 for phase in BENCH_PHASES}
+    for (phase, start), (_, stop) in zip(marks, marks[1:]):
+        phases[phase] += stop - start
+    return phases
+
+
+def bench_executor(
+    executor_type: str,
+    jobs: int = 10,
+    latency: float = 0,
+    bandwidth: float = 0,
+    input_size: int = 1024 * 1024,
+    directory: Optional[Path] = None,
+) -> BenchResult:
+    """
+    Run jobs with the given executor type against the fake backends.
+    """
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        tmp_dir = Path(tmp)
+        source = create_input(tmp_dir / "input", input_size)
+        output = tmp_dir / "output"
+        result = BenchResult(executor=executor_type, jobs=jobs)
+        calls: Counter = Counter()
+        simulated = 0.0
+        with ExitStack() as stack:
+            calls_file = stack.enter_context(
+                use_shims(tmp_dir / "shims", latency, bandwidth)
+            )
+            for i in range(jobs):
+                executor = get_executor(
+                    executor_type, latency, bandwidth, tmp_dir
+                )
+                if isinstance(executor, ContainerExecutor) and i == 0:
+                    stack.enter_context(
+                        use_fake_container_client(executor.get_client_key())
+                    )
+                try:
+                    phases = run_job(executor, source, output)
+                except ExecutorError as e:
+                    raise BenchError(
+                        f"Failed to run job with executor '{executor_type}': {str(e)}"
+                    ) from e
+                for phase, duration in phases.items():
+                    result.phases[phase] = (
+                        result.phases.get(phase, 0.0) + duration / jobs
+                    )
+                if isinstance(executor, FakeExecutor):
+                    calls += executor.calls
+                    simulated += executor.simulated
+            shim_calls, shim_simulated = read_shim_calls(calls_file)
+        calls += shim_calls
+        simulated += shim_simulated
+        result.calls = {k: v / jobs for k, v in sorted(calls.items())}
+        result.simulated = simulated / jobs
+    return result
+
+
+def create_source_input(directory: Path, size: int, files: int = 20) -> Path:
+    """
+    Create a git repository of the given total size. Files are made of
+    random words to be compressible like source code.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    rand = random.Random(0)
+    words = [
+        "".join(
+            rand.choices("abcdefghijklmnopqrstuvwxyz_", k=rand.randint(2, 10))
+        )
+        for _ in range(4096)
+    ]
+    for i in range(files):
+        content = bytearray()
+        while len(content) < size // files:
+            content += " ".join(rand.choices(words, k=4096)).encode() + b"\n"
+        (directory / f"file{i}.c").write_bytes(content[: size // files])
+    environment = {
+        **os.environ,
+        "GIT_AUTHOR_DATE": "@0 +0000",
+        "GIT_COMMITTER_DATE": "@0 +0000",
+    }
+    for cmd in (
+        ["init", "-q"],
+        ["add", "."],
+        ["commit", "-q", "-m", "Bench"],
+    ):
+        subprocess.run(
+            ["git", "-c", "user.name=bench", "-c", "user.email=bench@localhost"]
+            + cmd,
+            cwd=directory,
+            env=environment,
+            check=True,
+            capture_output=True,
+        )
+    return directory
+
+
+def get_compressor(archive_format: str, threads: int) -> str:
+    if archive_format == "gz":
+        return "gzip" if threads == 1 else "pigz"
+    if archive_format == "bz2":
+        return "bzip2"
+    if archive_format == "zst":
+        return "zstd"
+    return archive_format
+
+
+def bench_archive(
+    source: Path, archive_format: str, threads: int = 1, runs: int = 2
+) -> ArchiveBenchResult:
+    """
+    Create an archive of the source with the given compression several
+    times. The files mtime is changed before each run, which must not change
+    the archive.
+    """
+    input_size = sum(p.stat().st_size for p in source.glob("file*"))
+    result = ArchiveBenchResult(
+        archive_format=archive_format, threads=threads, input_size=input_size
+    )
+    compressor = get_compressor(archive_format, threads)
+    if not shutil.which(compressor):
+        result.skipped = f"cannot find '{compressor}'"
+        return result
+    archive = source / f"bench.tar.{archive_format}"
+    rand = random.Random()
+    for _ in range(runs):
+        for path in source.glob("file*"):
+            mtime = rand.randint(0, int(time.time()))
+            os.utime(path, (mtime, mtime))
+        start = time.monotonic()
+        try:
+            subprocess.run(
+                [
+                    str(CREATE_ARCHIVE),
+                    "--threads",
+                    str(threads),
+                    str(source),
+                    archive.name,
+                ],
+                check=True,
+                capture_output=True,
+            )
+        except subprocess.CalledProcessError as e:
+            raise BenchError(
+                f"Failed to create archive: {e.stderr.decode(errors='replace')}"
+            ) from e
+        result.time += (time.monotonic() - start) / runs
+        result.size = archive.stat().st_size
+        result.digests.append(sha256sum(archive))
+        archive.unlink()
+    return result
+
+
+def bench_archives(
+    archive_formats: Sequence[str] = BENCH_ARCHIVE_FORMATS,
+    threads: Sequence[int] = (1, 0),
+    runs: int = 2,
+    input_size: int = 32 * 1024 * 1024,
+    directory: Optional[Path] = None,
+) -> Iterator[ArchiveBenchResult]:
+    """
+    Create archives of the same source with the given compressions and
+    numbers of threads.
+    """
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        source = create_source_input(Path(tmp) / "source", input_size)
+        for archive_format in archive_formats:
+            for thread in threads:
+                yield bench_archive(source, archive_format, thread, runs)
+
+
+async def read_stream(
+    result: ReadStreamBenchResult, read_size: int
+) -> ReadStreamBenchResult:
+    def count(line):
+        result.lines += 1
+
+    process = await asyncio.create_subprocess_exec(
+        sys.executable,
+        "-c",
+        READ_STREAM_GENERATOR,
+        str(result.size),
+        stdout=asyncio.subprocess.PIPE,
+    )
+    start = time.monotonic()
+    output = await Executor._read_stream(
+        process.stdout,
+        count if "lines" in result.mode else None,
+        collect="collect" in result.mode,
+        read_size=read_size,
+    )
+    result.time = time.monotonic() - start
+    await process.wait()
+    if "collect" in result.mode and len(output) != result.size:
+        raise BenchError(
+            f"Collected {len(output)} bytes instead of {result.size}."
+        )
+    return result
+
+
+def bench_read_stream(
+    modes: Sequence[str] = BENCH_READ_MODES,
+    size: int = 1024**3,
+    read_size: int = READ_SIZE,
+) -> Iterator[ReadStreamBenchResult]:
+    """
+    Read the output of a process writing lines of mixed lengths with the
+    given read modes.
+    """
+    for mode in modes:
+        yield asyncio.run(
+            read_stream(ReadStreamBenchResult(mode, size), read_size)
+        )
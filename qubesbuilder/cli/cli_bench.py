@@ -0,0 +1,257 @@
+# The Qubes OS Project, http://www.qubes-os.org
+#
+# Copyright (C) 2026 Frédéric Pierret (fepitre) <frederic@invisiblethingslab.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import click
+
+from qubesbuilder.bench import (
+    BENCH_ARCHIVE_FORMATS,
+    BENCH_EXECUTORS,
+    BENCH_PHASES,
+    BENCH_READ_MODES,
+    BenchError,
+    bench_archives,
+    bench_executor,
+    bench_read_stream,
+)
+from qubesbuilder.cli.cli_base import aliased_group, ContextObj
+from qubesbuilder.cli.cli_exc import CliError
+from qubesbuilder.executors import READ_SIZE, ExecutorError, parse_size
+
+
+@aliased_group("bench")
+def bench():
+    """
+    Benchmark CLI
+    """
+
+
+@bench.command(name="executors")
+@click.option(
+    "--executor",
+    "executor_types",
+    type=click.Choice(BENCH_EXECUTORS),
+    multiple=True,
+    help="Executor type to benchmark (can be repeated, default: all).",
+)
+@click.option(
+    "--jobs", default=10, show_default=True, help="Number of jobs to run."
+)
+@click.option(
+    "--latency",
+    default=0.0,
+    show_default=True,
+    help="Simulated latency of each backend call in seconds.",
+)
+@click.option(
+    "--bandwidth",
+    default="0",
+    show_default=True,
+    help="Simulated copy bandwidth in bytes per second (e.g. 100M, 0 for unlimited).",
+)
+@click.option(
+    "--input-size",
+    default="1M",
+    show_default=True,
+    help="Size of the job inputs copied in.",
+)
+@click.pass_obj
+def executors(
+    obj: ContextObj,
+    executor_types,
+    jobs: int,
+    latency: float,
+    bandwidth: str,
+    input_size: str,
+):
+    """
+    Measure the per-job fixed overhead of executors.
+
+    Each executor runs trivial jobs against fake backends instead of
+    disposable qubes and containers. The time simulated by the backends is
+    subtracted from the total to get the overhead of qubes-builder itself.
+    Windows executors are not covered.
+    """
+    try:
+        bandwidth_bytes = parse_size(bandwidth)
+        input_size_bytes = parse_size(input_size)
+    except ExecutorError as e:
+        raise CliError(str(e))
+
+    obj.config.temp_dir.mkdir(parents=True, exist_ok=True)
+    header = ["executor", *BENCH_PHASES, "total", "overhead", "calls"]
+    click.echo(f"{header[0]:<10}" + "".join(f"{h:>10}" for h in header[1:]))
+    details = []
+    for executor_type in executor_types or BENCH_EXECUTORS:
+        try:
+            result = bench_executor(
+                executor_type,
+                jobs=jobs,
+                latency=latency,
+                bandwidth=bandwidth_bytes,
+                input_size=input_size_bytes,
+                directory=obj.config.temp_dir,
+            )
+        except BenchError as e:
+            click.secho(f"{executor_type:<10}  skipped: {str(e)}", fg="yellow")
+            continue
+        values = [result.phases[phase] for phase in BENCH_PHASES]
+        values += [result.total, result.overhead]
+        click.echo(
+            f"{executor_type:<10}"
+            + "".join(f"{v * 1000:>8.1f}ms" for v in values)
+            + f"{sum(result.calls.values()):>10g}"
+        )
+        details.append(result)
+
+    for result in details:
+        if not result.calls:
+            continue
+        click.echo(f"\nCalls per job ({result.executor}):")
+        for call, count in result.calls.items():
+            click.echo(f"  {count:>6g}  {call}")
+
+
+@bench.command(name="archives")
+@click.option(
+    "--format",
+    "archive_formats",
+    type=click.Choice(BENCH_ARCHIVE_FORMATS),
+    multiple=True,
+    help="Archive compression to benchmark (can be repeated, default: all).",
+)
+@click.option(
+    "--threads",
+    type=click.IntRange(min=0),
+    multiple=True,
+    help="Number of compression threads, 0 for one per CPU (can be repeated, default: 1 and 0).",
+)
+@click.option(
+    "--runs",
+    default=2,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of archives created for each compression.",
+)
+@click.option(
+    "--input-size",
+    default="32M",
+    show_default=True,
+    help="Size of the archived source.",
+)
+@click.pass_obj
+def archives(
+    obj: ContextObj,
+    archive_formats,
+    threads,
+    runs: int,
+    input_size: str,
+):
+    """
+    Measure the throughput and determinism of source archives creation.
+
+    The same source is archived several times with 'create-archive' for each
+    compression and number of threads, with different files mtime. The
+    archives of a compression are expected to be identical.
+    """
+    try:
+        input_size_bytes = parse_size(input_size)
+    except ExecutorError as e:
+        raise CliError(str(e))
+
+    obj.config.temp_dir.mkdir(parents=True, exist_ok=True)
+    header = ["format", "threads", "time", "MB/s", "ratio", "identical"]
+    click.echo(
+        f"{header[0]:<8}" + "".join(f"{h:>10}" for h in header[1:]) + "  sha256"
+    )
+    try:
+        for result in bench_archives(
+            archive_formats=archive_formats or BENCH_ARCHIVE_FORMATS,
+            threads=threads or (1, 0),
+            runs=runs,
+            input_size=input_size_bytes,
+            directory=obj.config.temp_dir,
+        ):
+            if result.skipped:
+                click.secho(
+                    f"{result.archive_format:<8}{result.threads:>10}  skipped: {result.skipped}",
+                    fg="yellow",
+                )
+                continue
+            click.echo(
+                f"{result.archive_format:<8}{result.threads:>10}"
+                f"{result.time:>9.2f}s"
+                f"{result.throughput / 1000000:>10.1f}"
+                f"{result.ratio:>10.3f}"
+                f"{'yes' if result.deterministic else 'NO':>10}"
+                f"  {result.digests[0][:16]}"
+            )
+    except BenchError as e:
+        raise CliError(str(e))
+
+
+@bench.command(name="read-stream")
+@click.option(
+    "--mode",
+    "modes",
+    type=click.Choice(BENCH_READ_MODES),
+    multiple=True,
+    help="Read mode to benchmark (can be repeated, default: all).",
+)
+@click.option(
+    "--size",
+    default="1G",
+    show_default=True,
+    help="Size of the output read.",
+)
+@click.option(
+    "--read-size",
+    default=str(READ_SIZE),
+    show_default=True,
+    help="Size of each read from the output.",
+)
+def read_stream(modes, size: str, read_size: str):
+    """
+    Measure the throughput of reading the output of processes.
+
+    A process writes lines of mixed lengths, some longer than the maximum
+    line length, which are read as executors do: split in lines for
+    logging, collected, or both.
+    """
+    try:
+        size_bytes = parse_size(size)
+        read_size_bytes = parse_size(read_size)
+    except ExecutorError as e:
+        raise CliError(str(e))
+
+    header = ["mode", "time", "MB/s", "lines"]
+    click.echo(f"{header[0]:<14}" + "".join(f"{h:>10}" for h in header[1:]))
+    try:
+        for result in bench_read_stream(
+            modes=modes or BENCH_READ_MODES,
+            size=size_bytes,
+            read_size=read_size_bytes,
+        ):
+            click.echo(
+                f"{result.mode:<14}"
+                f"{result.time:>9.2f}s"
+                f"{result.throughput / 1000000:>10.1f}"
+                f"{result.lines:>10}"
+            )
+    except BenchError as e:
+        raise CliError(str(e))
@@ -26,6 +26,7 @@ from typing import List, Dict, Any
 import click
 
 from qubesbuilder.cli.cli_base import ContextObj, AliasedGroup, aliased_group
+from qubesbuilder.cli.cli_bench import bench
 from qubesbuilder.cli.cli_cleanup import cleanup
 from qubesbuilder.cli.cli_config import config
 from qubesbuilder.cli.cli_exc import CliError
@@ -252,7 +253,12 @@ def main(
     obj.config.set("session", obj)
 
     # init QubesBuilderLogger
-    init_logger(verbose=obj.config.verbose, log_file=log_file)
+    init_logger(
+        verbose=obj.config.verbose,
+        log_file=log_file,
+        log_queue=obj.config.log_queue,
+        log_compression=obj.config.log_compression,
+    )
 
     # Throttled update notice, build subcommands only (keeps query output clean).
     # Run it on close so it prints at the end, after the build output.
@@ -296,3 +302,4 @@ main.add_command(config)
 main.add_command(cleanup)
 main.add_command(list_deps)
 main.add_command(self_group, name="self")
+main.add_command(bench)
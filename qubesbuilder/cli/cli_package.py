@@ -13,6 +13,7 @@ from qubesbuilder.common import STAGES, STAGES_ALIAS
 from qubesbuilder.component import QubesComponent
 from qubesbuilder.config import Config
 from qubesbuilder.distribution import QubesDistribution
+from qubesbuilder.jobs import run_jobs, run_jobs_concurrently
 from qubesbuilder.log import QubesBuilderLogger
 
 
@@ -63,19 +64,35 @@ def _component_stage(
     if not component_keys.issubset(fetch_done_set) and any(
         s in stages_needing_fetch for s in stages
     ):
-        for job in config.get_jobs(
+        pipeline = config.get_pipeline(
             components=components,
             distributions=distributions,
             templates=[],
             stages=["fetch"],
-        ):
+        )
+        fetch_jobs = pipeline.sorted_jobs(config)
+        for job in fetch_jobs:
             if (
                 hasattr(job, "executor")
                 and hasattr(job.executor, "cleanup")
                 and root_group
             ):
                 root_group.add_cleanup(job.executor.cleanup)
-            job.run(**kwargs)
+        # With 'fetch-jobs', fetch jobs are run concurrently.
+        if config.fetch_jobs > 1:
+            run_jobs_concurrently(
+                fetch_jobs,
+                lambda job: job.run(**kwargs),
+                graph=pipeline.build_graph(config),
+                max_workers=config.fetch_jobs,
+            )
+        else:
+            run_jobs(
+                fetch_jobs,
+                lambda job: job.run(**kwargs),
+                graph=pipeline.build_graph(config),
+                overlap=config.overlap_io,
+            )
         fetch_done_set.update(component_keys)
         config.set("session-fetch-done", fetch_done_set)
 
@@ -87,13 +104,14 @@ def _component_stage(
     # The key includes dist and component so jobs for different dists are not skipped.
     session_jobs_done: set = config.get("session-jobs-done", set())
 
-    for job in config.get_jobs(
+    pipeline = config.get_pipeline(
         components=components,
         distributions=distributions,
         templates=[],
         stages=stages,
-        with_dependencies=True,
-    ):
+    )
+    jobs = []
+    for job in pipeline.sorted_jobs(config):
         # fetch was already run above.
         if job.stage == "fetch":
             continue
@@ -111,8 +129,26 @@ def _component_stage(
             and root_group
         ):
             root_group.add_cleanup(job.executor.cleanup)
+        jobs.append(job)
+
+    def run_job(job):
         job.run(**kwargs)
-        session_jobs_done.add(job_key)
+        session_jobs_done.add(
+            (
+                job.stage,
+                getattr(job, "component", None),
+                getattr(job, "dist", None),
+            )
+        )
+
+    # With 'overlap-io', independent jobs are started as soon as the
+    # previous one is copying out its outputs.
+    run_jobs(
+        jobs,
+        run_job,
+        graph=pipeline.build_graph(config),
+        overlap=config.overlap_io,
+    )
 
     config.set("session-jobs-done", session_jobs_done)
 
@@ -22,11 +22,17 @@ import re
 import shutil
 import subprocess
 import tempfile
+import uuid
 from enum import Enum
 from pathlib import Path
 from string import digits, ascii_letters
 from typing import List
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None  # type: ignore[assignment]
+
 PROJECT_PATH = Path(__file__).resolve().parents[1]
 
 STAGES = [
@@ -59,6 +65,23 @@ def sha256sum(path: Path) -> str:
     return h.hexdigest()
 
 
+def link_file(source: Path, destination: Path):
+    """
+    Atomically hardlink source to destination. The file is copied if they
+    are not on the same filesystem.
+    """
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = destination.with_name(f".{destination.name}.{uuid.uuid4().hex}")
+    try:
+        try:
+            os.link(source, temp_path)
+        except OSError:
+            shutil.copy2(source, temp_path)
+        os.replace(temp_path, destination)
+    finally:
+        temp_path.unlink(missing_ok=True)
+
+
 class VerificationMode(Enum):
     SignedTag = "signed-tag"
     SignedCommit = "less-secure-signed-commits-sufficient"
@@ -108,17 +131,15 @@ def get_archive_name(file: dict):
 
 
 # Originally from QubesOS/qubes-builder/rpc-services/qubesbuilder.BuildLog
+# Printable ASCII is kept, windows newline is replaced by a space and
+# anything else by a dot.
+SANITIZE_TABLE = bytes(
+    c if 0x20 <= c <= 0x7E else 0x20 if c == 0x0D else 0x2E for c in range(256)
+)
+
+
 def sanitize_line(untrusted_line: bytes):
-    line = bytearray(untrusted_line)
-    for i, c in enumerate(line):
-        if 0x20 <= c <= 0x7E:
-            pass
-        else:
-            if c == 0x0D:  # windows newline
-                line[i] = 0x20
-            else:
-                line[i] = 0x2E
-    return bytearray(line).decode("ascii")
+    return bytes(untrusted_line).translate(SANITIZE_TABLE).decode("ascii")
 
 
 def str_to_bool(input_str: str) -> bool:
@@ -176,6 +197,17 @@ def sed(pattern, replace, source, destination=None):
 def extract_lines_before(
     file_path, search_string, num_lines_before=10, max_split=4
 ):
+    if file_path and file_path.exists() and file_path.suffix == ".zst":
+        if zstandard is None:
+            return None, None
+        # compressed log file
+        with tempfile.NamedTemporaryFile(suffix=".log") as log_file:
+            with zstandard.open(file_path, "rb") as compressed:
+                shutil.copyfileobj(compressed, log_file)
+            log_file.flush()
+            return extract_lines_before(
+                Path(log_file.name), search_string, num_lines_before, max_split
+            )
     if file_path and file_path.exists():
         try:
             # Run grep to find the line number with the search string
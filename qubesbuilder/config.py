@@ -27,8 +27,9 @@ from qubesbuilder.common import PROJECT_PATH, VerificationMode
 from qubesbuilder.component import QubesComponent
 from qubesbuilder.distribution import QubesDistribution
 from qubesbuilder.exc import ConfigError
-from qubesbuilder.executors import ExecutorError
+from qubesbuilder.executors import Executor, ExecutorError
 from qubesbuilder.executors.container import ContainerExecutor
+from qubesbuilder.executors.fake import FakeExecutor
 from qubesbuilder.executors.local import LocalExecutor
 from qubesbuilder.executors.qubes import (
     LinuxQubesExecutor,
@@ -36,7 +37,7 @@ from qubesbuilder.executors.qubes import (
 )
 from qubesbuilder.executors.windows import SSHWindowsExecutor
 from qubesbuilder.jobs import JobFactory
-from qubesbuilder.log import QubesBuilderLogger
+from qubesbuilder.log import QubesBuilderLogger, zstandard
 from qubesbuilder.pluginmanager import PluginManager
 from qubesbuilder.plugins import (
     JobReference,
@@ -133,6 +134,13 @@ class Config:
     increment_devel_versions: Union[bool, property]      = property(lambda self: self.get("increment-devel-versions", False))
     automatic_upload_on_publish: Union[bool, property]   = property(lambda self: self.get("automatic-upload-on-publish", False))
     session: Union[Any, property]                        = property(lambda self: self.get("session", None))
+    log_queue: Union[bool, property]                     = property(lambda self: self.get("log-queue", False))
+    log_compression: Union[str, property]                = property(lambda self: self.get_log_compression())
+    overlap_io: Union[bool, property]                    = property(lambda self: self.get("overlap-io", False))
+    fetch_jobs: Union[int, property]                     = property(lambda self: int(self.get("fetch-jobs", 1)))
+    git_cache: Union[bool, property]                     = property(lambda self: self.get("git-cache", False))
+    git_check_remote_head: Union[bool, property]         = property(lambda self: self.get("git-check-remote-head", False))
+    verified_objects_cache: Union[bool, property]        = property(lambda self: self.get("verified-objects-cache", False))
     # fmt: on
 
     def __repr__(self):
@@ -271,6 +279,16 @@ class Config:
             conf_file = Path(conf_file).expanduser().resolve()
         return conf_file
 
+    def get_log_compression(self) -> Optional[str]:
+        compression = self.get("log-compression", None)
+        if compression not in (None, "zstd"):
+            raise ConfigError(f"Unsupported log compression '{compression}'.")
+        if compression == "zstd" and zstandard is None:
+            raise ConfigError(
+                "Log compression 'zstd' requires the 'zstandard' Python module."
+            )
+        return compression
+
     def get_distributions(self, filtered_distributions=None):
         if not self._dists:
             distributions = self._conf.get("distributions", [])
@@ -519,6 +537,7 @@ class Config:
             )
         if plugin:
             executor.log = plugin.log.getChild(stage_name)
+            executor.footprints_file = self.cache_dir / "footprints.json"
         return executor
 
     def get_component_from_dict_or_string(
@@ -584,6 +603,7 @@ class Config:
         for key, val in options.get("options", {}).items():
             new_key = key.replace("-", "_") if "-" in key else key
             executor_options[new_key] = val
+        executor: Executor
         if executor_type in ("podman", "docker"):
             executor = ContainerExecutor(executor_type, **executor_options)
         elif executor_type == "local":
@@ -592,6 +612,8 @@ class Config:
             executor = LinuxQubesExecutor(**executor_options)  # type: ignore
         elif executor_type == "windows":
             executor = WindowsQubesExecutor(**executor_options)  # type: ignore
+        elif executor_type == "fake":
+            executor = FakeExecutor(**executor_options)
         elif executor_type == "windows-ssh":
             executor = SSHWindowsExecutor(**executor_options)  # type: ignore
         else:
@@ -18,14 +18,88 @@
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
 import asyncio
+import fcntl
+import json
 import logging
+import os
+import re
+import threading
 from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import Tuple, Union
+from typing import Callable, Dict, List, Optional, Tuple, Union
 
-from qubesbuilder.common import sanitize_line, str_to_bool
+from qubesbuilder.common import sanitize_line, sha256sum, str_to_bool
 from qubesbuilder.exc import QubesBuilderError
 
+# Size of reads from subprocess output streams
+READ_SIZE = 64 * 1024
+
+
+# Run a command given as arguments and write, as JSON to the file given first,
+# the resources used by it and its descendants. Executors wrap their workload
+# with it to account for it, see Executor.add_resources.
+RUSAGE_WRAPPER = """
+import json, resource, subprocess, sys
+rc = subprocess.call(sys.argv[2:])
+r = resource.getrusage(resource.RUSAGE_CHILDREN)
+with open(sys.argv[1], "w") as f:
+    json.dump({
+        "cpu_time": r.ru_utime + r.ru_stime,
+        "max_rss": r.ru_maxrss * 1024,
+        "read_bytes": r.ru_inblock * 512,
+        "write_bytes": r.ru_oublock * 512,
+    }, f)
+sys.exit(rc)
+"""
+
+
+class _ThreadLoop:
+    """
+    Event loop of a thread, closed once the thread is done.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+
+    def __del__(self):
+        if not self.loop.is_closed():
+            self.loop.close()
+
+
+# Event loops used by Executor.run_until_complete, one per thread so that
+# asynchronous resources (e.g. worker processes) can be reused across calls.
+_thread_loops = threading.local()
+
+
+# Resources accounted for executors workload: CPU time (seconds), peak RSS
+# (bytes), block I/O (bytes), wall time (seconds) and number of runs retried
+# after an infrastructure failure.
+RESOURCES = (
+    "cpu_time",
+    "max_rss",
+    "read_bytes",
+    "write_bytes",
+    "wall_time",
+    "retries",
+)
+
+
+def parse_rusage(data: Union[str, bytes]) -> Dict[str, float]:
+    """
+    Parse the output of RUSAGE_WRAPPER, ignoring anything unexpected.
+    """
+    try:
+        usage = json.loads(data)
+    except ValueError:
+        return {}
+    if not isinstance(usage, dict):
+        return {}
+    return {
+        k: v
+        for k, v in usage.items()
+        if k in RESOURCES and isinstance(v, (int, float))
+    }
+
 
 class ExecutorError(QubesBuilderError):
     """
@@ -35,16 +109,159 @@ class ExecutorError(QubesBuilderError):
     pass
 
 
+class InfrastructureError(ExecutorError):
+    """
+    Executor failure not caused by the job itself (e.g. worker creation or
+    connection issues). The run is retried on a fresh worker.
+    """
+
+    pass
+
+
+# Phases of a run notified to the executor 'phase_callbacks', allowing to
+# schedule other jobs while a run is busy with I/O.
+PHASES = ("copy-in", "run", "copy-out")
+
+# Parts of the builder directory that can be put on a tmpfs.
+TMPFS_MODES = ("build", "builder")
+
+# Margin applied to the footprint of previous runs of a job when checking if
+# it fits on a tmpfs.
+TMPFS_MARGIN = 1.25
+
+
+def get_meminfo() -> Dict[str, int]:
+    """
+    Get system memory information in bytes, as provided by /proc/meminfo.
+    """
+    meminfo = {}
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                fields = value.split()
+                if fields and fields[0].isdigit():
+                    factor = 1024 if fields[1:] == ["kB"] else 1
+                    meminfo[key] = int(fields[0]) * factor
+    except OSError:
+        pass
+    return meminfo
+
+
+def parse_size(value: Union[str, int]) -> int:
+    """
+    Parse a size given in bytes, with an optional K, M, G or T suffix, or as a
+    percentage of the total memory.
+    """
+    parsed = re.fullmatch(r"\s*(\d+)\s*([kKmMgGtT%]?)\s*", str(value))
+    if not parsed:
+        raise ExecutorError(f"Invalid size '{value}'.")
+    size, suffix = int(parsed.group(1)), parsed.group(2).upper()
+    if suffix == "%":
+        total = get_meminfo().get("MemTotal")
+        if not total:
+            raise ExecutorError("Cannot determine total memory.")
+        return total * size // 100
+    return size * 1024 ** "_KMGT".index(suffix or "_")
+
+
+def get_footprint(path: Path, key: str) -> Optional[int]:
+    """
+    Get the footprint recorded for a job in a footprints file.
+    """
+    try:
+        with open(path) as f:
+            fcntl.flock(f, fcntl.LOCK_SH)
+            footprints = json.load(f)
+    except (OSError, ValueError):
+        return None
+    footprint = footprints.get(key) if isinstance(footprints, dict) else None
+    return footprint if isinstance(footprint, int) else None
+
+
+def set_footprint(path: Path, key: str, footprint: int):
+    """
+    Record the footprint of a job in a footprints file.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a+") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        f.seek(0)
+        try:
+            footprints = json.load(f)
+        except ValueError:
+            footprints = {}
+        if not isinstance(footprints, dict):
+            footprints = {}
+        footprints[key] = footprint
+        f.seek(0)
+        f.truncate()
+        json.dump(footprints, f, indent=2, sort_keys=True)
+
+
+def get_manifest(
+    path: Path, previous: Optional[Dict[str, List]] = None
+) -> Dict[str, List]:
+    """
+    Get the manifest of a file or of a directory tree: relative POSIX path
+    (empty for a file) mapped to size, modification time and SHA256. Hashes
+    are reused from previous manifest for files with same size and mtime.
+    """
+    previous = previous or {}
+    if path.is_file():
+        files = [(path, "")]
+    else:
+        files = [
+            (f, f.relative_to(path).as_posix())
+            for f in sorted(path.rglob("*"))
+            if f.is_file()
+        ]
+    manifest: Dict[str, List] = {}
+    for f, rel in files:
+        stat = f.stat()
+        entry = previous.get(rel)
+        if entry and entry[:2] == [stat.st_size, stat.st_mtime_ns]:
+            digest = entry[2]
+        else:
+            digest = sha256sum(f)
+        manifest[rel] = [stat.st_size, stat.st_mtime_ns, digest]
+    return manifest
+
+
+def diff_manifest(
+    old: Dict[str, List], new: Dict[str, List]
+) -> Tuple[List[str], List[str]]:
+    """
+    Return paths that are new or changed and paths that have been deleted.
+    """
+    changed = sorted(
+        rel
+        for rel, entry in new.items()
+        if old.get(rel, [None] * 3)[2] != entry[2]
+    )
+    deleted = sorted(set(old).difference(new))
+    return changed, deleted
+
+
 class Executor(ABC):
     """
     Base executor class
     """
 
     _builder_dir = Path("/builder")
+    _read_size = READ_SIZE
     log = logging.getLogger("executor")
 
     def __init__(self, **kwargs):
         self._kwargs = kwargs
+        self.resources: Dict[str, float] = {}
+        self._tmpfs: Optional[str] = None
+        self._tmpfs_size = 0
+        self.footprints_file: Optional[Path] = None
+        self.phase_callbacks: List[Callable[[str], None]] = []
+
+        self._retries = int(self._kwargs.get("retries", 2))
+        self._retry_delay = float(self._kwargs.get("retry_delay", 10))
 
         clean: Union[str, bool] = self._kwargs.get("clean", True)
         self._clean = clean if isinstance(clean, bool) else str_to_bool(clean)
@@ -61,6 +278,90 @@ class Executor(ABC):
     def get_builder_dir(self):
         return self._builder_dir
 
+    def notify_phase(self, phase: str):
+        """
+        Notify that a run enters one of its phases, see PHASES.
+        """
+        for callback in list(self.phase_callbacks):
+            callback(phase)
+
+    def parse_tmpfs_options(self):
+        """
+        Parse options for executors supporting a tmpfs backed builder
+        directory. Footprints of jobs are recorded in 'footprints_file', if
+        set, to estimate if they fit in memory.
+        """
+        tmpfs = self._kwargs.get("tmpfs", "none")
+        self._tmpfs = None if tmpfs in ("none", None, False) else tmpfs
+        if not self._tmpfs:
+            return
+        if self._tmpfs not in TMPFS_MODES:
+            raise ExecutorError(f"Unknown tmpfs mode '{self._tmpfs}'.")
+        self._tmpfs_size = parse_size(self._kwargs.get("tmpfs_size", "50%"))
+
+    def get_tmpfs_dir(self):
+        if self._tmpfs == "builder":
+            return self.get_builder_dir()
+        return self.get_build_dir()
+
+    def use_tmpfs(self) -> bool:
+        """
+        Check if the tmpfs can be used for the next run: the footprint of its
+        previous run, if any, must fit in the tmpfs size and in the available
+        memory. Otherwise, the disk is used.
+        """
+        if not self._tmpfs:
+            return False
+        if not self.footprints_file:
+            return True
+        footprint = get_footprint(self.footprints_file, self.log.name)
+        if footprint is None:
+            return True
+        estimate = footprint * TMPFS_MARGIN
+        available = get_meminfo().get("MemAvailable", self._tmpfs_size)
+        if estimate > min(self._tmpfs_size, available):
+            self.log.info(
+                f"Estimated footprint of {int(estimate)} bytes exceeds tmpfs size"
+                f" or available memory, using disk for {self.get_tmpfs_dir()}."
+            )
+            return False
+        return True
+
+    def save_footprint(self, footprint: int):
+        self.log.debug(
+            f"Footprint of {self.get_tmpfs_dir()}: {footprint} bytes."
+        )
+        if not self.footprints_file:
+            return
+        try:
+            set_footprint(self.footprints_file, self.log.name, footprint)
+        except OSError as e:
+            self.log.warning(f"Cannot save footprint: {e!s}")
+
+    def add_resources(self, usage: Dict[str, float]):
+        """
+        Account for the resources used by a run. Peak RSS is the maximum over
+        runs and other resources are summed.
+        """
+        self.log.debug(
+            "Resources used: "
+            + ", ".join(
+                f"{k}={round(usage[k], 3)}" for k in RESOURCES if k in usage
+            )
+        )
+        for key, value in usage.items():
+            if key == "max_rss":
+                self.resources[key] = max(self.resources.get(key, 0), value)
+            else:
+                self.resources[key] = self.resources.get(key, 0) + value
+
+    def pop_resources(self) -> Dict[str, float]:
+        """
+        Get the resources used by runs since the last call and reset them.
+        """
+        resources, self.resources = self.resources, {}
+        return resources
+
     def get_build_dir(self):
         return self.get_builder_dir() / "build"
 
@@ -94,6 +395,49 @@ class Executor(ABC):
     def run(self, *args, **kwargs):
         pass
 
+    # Executors running their commands natively on the event loop override
+    # the asynchronous methods below and keep the synchronous ones as thin
+    # wrappers. Otherwise, synchronous methods are run in a thread.
+
+    async def copy_in_async(self, *args, **kwargs):
+        return await asyncio.to_thread(self.copy_in, *args, **kwargs)
+
+    async def copy_out_async(self, *args, **kwargs):
+        return await asyncio.to_thread(self.copy_out, *args, **kwargs)
+
+    async def run_async(self, *args, **kwargs):
+        return await asyncio.to_thread(self.run, *args, **kwargs)
+
+    async def retry_async(self, func, *args, **kwargs):
+        """
+        Call the coroutine function 'func' and call it again, with an
+        exponential backoff, if it fails because of the infrastructure. It is
+        expected to run on a fresh worker on each call.
+        """
+        attempt = 0
+        while True:
+            try:
+                return await func(*args, **kwargs)
+            except InfrastructureError as e:
+                if attempt >= self._retries:
+                    raise
+                delay = self._retry_delay * 2**attempt
+                attempt += 1
+                self.resources["retries"] = self.resources.get("retries", 0) + 1
+                self.log.warning(
+                    f"Retrying in {delay:g}s ({attempt}/{self._retries}) after"
+                    f" infrastructure failure: {str(e)}"
+                )
+                await asyncio.sleep(delay)
+
+    @staticmethod
+    def run_until_complete(coro):
+        thread_loop = getattr(_thread_loops, "thread_loop", None)
+        if thread_loop is None:
+            thread_loop = _ThreadLoop()
+            _thread_loops.thread_loop = thread_loop
+        return thread_loop.loop.run_until_complete(coro)
+
     def get_user(self):
         raise NotImplementedError
 
@@ -116,84 +460,98 @@ class Executor(ABC):
 
     @staticmethod
     async def _read_stream(
-        stream, callback, collect=False, max_length=10000
-    ) -> bytes:
-        remaining_line = b""
-        if collect:
-            buffer = b""
+        stream,
+        callback,
+        collect=False,
+        max_length=10000,
+        read_size=READ_SIZE,
+    ) -> bytearray:
+        buffer = bytearray()
+        pending = bytearray()
 
         while True:
-            chunk = await stream.read(4096)
+            chunk = await stream.read(read_size)
             if not chunk:
-                if remaining_line and callback:
-                    callback(sanitize_line(remaining_line).rstrip())
+                if pending and callback:
+                    callback(sanitize_line(bytes(pending)).rstrip())
                 break
 
             if collect:
                 buffer += chunk
-            lines = chunk.split(b"\n")
-
-            lines[0] = remaining_line + lines[0]
-
-            if callback:
-                for line in lines[:-1]:
-                    callback(sanitize_line(line).rstrip())
-
-            remaining_line = lines[-1]
-            if len(remaining_line) > max_length:
-                line = remaining_line[:max_length]
-                remaining_line = remaining_line[max_length:]
-                if callback:
-                    callback(sanitize_line(line).rstrip() + "\u2026")
-
-        return buffer if collect else b""
+            if not callback:
+                continue
+
+            pending += chunk
+            view = memoryview(pending)
+            start = 0
+            end = pending.find(b"\n", start)
+            while end != -1:
+                callback(sanitize_line(bytes(view[start:end])).rstrip())
+                start = end + 1
+                end = pending.find(b"\n", start)
+            while len(pending) - start > max_length:
+                line = bytes(view[start : start + max_length])
+                callback(sanitize_line(line).rstrip() + "\u2026")
+                start += max_length
+            view.release()
+            del pending[:start]
+
+        # the collected output is returned as is to avoid copying it
+        return buffer
 
     async def _stream_subprocess(
         self, cmd, stdout_cb, stderr_cb, stdin=b"", collect=False, **kwargs
-    ) -> Tuple[int, bytes, bytes]:
+    ) -> Tuple[int, bytearray, bytearray]:
+        # stdin is either the data to write or a file descriptor to read from
         process = await asyncio.create_subprocess_exec(
             *cmd,
-            stdin=asyncio.subprocess.PIPE,
+            stdin=(
+                stdin if isinstance(stdin, int) else asyncio.subprocess.PIPE
+            ),
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE,
             **kwargs,
         )
 
-        if stdin:
-            assert process.stdin is not None
-            process.stdin.write(stdin)
+        if not isinstance(stdin, int):
+            if stdin:
+                assert process.stdin is not None
+                process.stdin.write(stdin)
 
-        # we use this also for qrexec admin calls, and they need stdin being closed
-        assert process.stdin
-        process.stdin.close()
+            # we use this also for qrexec admin calls, and they need stdin being closed
+            assert process.stdin
+            process.stdin.close()
 
         results = await asyncio.gather(
-            self._read_stream(process.stdout, stdout_cb, collect),
-            self._read_stream(process.stderr, stderr_cb, collect),
+            self._read_stream(
+                process.stdout, stdout_cb, collect, read_size=self._read_size
+            ),
+            self._read_stream(
+                process.stderr, stderr_cb, collect, read_size=self._read_size
+            ),
         )
 
         rc = await process.wait()
         return rc, results[0], results[1]
 
-    def execute(self, cmd, collect=False, stdin=b"", echo=True, **kwargs):
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-
-        rc, stdout, stderr = loop.run_until_complete(
-            self._stream_subprocess(
-                cmd=cmd,
-                stdout_cb=self.log.debug if echo else None,
-                stderr_cb=self.log.debug if echo else None,
-                stdin=stdin,
-                collect=collect,
-                **kwargs,
-            )
+    async def execute_async(
+        self, cmd, collect=False, stdin=b"", echo=True, **kwargs
+    ):
+        rc, stdout, stderr = await self._stream_subprocess(
+            cmd=cmd,
+            stdout_cb=self.log.debug if echo else None,
+            stderr_cb=self.log.debug if echo else None,
+            stdin=stdin,
+            collect=collect,
+            **kwargs,
         )
 
         if collect:
             return rc, stdout, stderr
 
         return rc
+
+    def execute(self, cmd, collect=False, stdin=b"", echo=True, **kwargs):
+        return self.run_until_complete(
+            self.execute_async(cmd, collect, stdin, echo, **kwargs)
+        )
@@ -16,32 +16,169 @@
 # with this program. If not, see <https://www.gnu.org/licenses/>.
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
-import subprocess
+import asyncio
+import atexit
+import io
+import json
+import os
+import tarfile
 import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
 from contextlib import contextmanager
-from pathlib import Path, PurePath
+from pathlib import Path, PurePath, PurePosixPath
 from shlex import quote
-from typing import List, Tuple, Union, Dict, Any
+from typing import List, Optional, Tuple, Union, Dict, Any, Hashable
 
-from qubesbuilder.common import sanitize_line
-from qubesbuilder.executors import Executor, ExecutorError
+from qubesbuilder.common import sanitize_line, str_to_bool
+from qubesbuilder.executors import (
+    Executor,
+    ExecutorError,
+    InfrastructureError,
+)
 
 try:
     from docker import DockerClient
-    from docker.errors import DockerException
+    from docker.errors import DockerException, NotFound as DockerNotFound
 except ImportError:
     DockerClient = None
     DockerException = ExecutorError
+    DockerNotFound = ExecutorError
+
+try:
+    from requests import ConnectionError as RequestsConnectionError
+except ImportError:
+    RequestsConnectionError = ConnectionError  # type: ignore[assignment,misc]
 
 try:
     from podman import PodmanClient
-    from podman.errors import PodmanError
+    from podman.errors import PodmanError, NotFound as PodmanNotFound
 except ImportError:
     PodmanClient = None  # type: ignore[assignment,misc]
     PodmanError = ExecutorError  # type: ignore[assignment,misc]
+    PodmanNotFound = ExecutorError  # type: ignore[assignment,misc]
+
+
+# Input directories that can be bind-mounted read-only instead of being
+# copied into the container. Builds may still write to them (chroot cache
+# updates, placeholders substitution, local repository metadata) through an
+# overlay, see ContainerExecutor.get_bind_mounts.
+BIND_MOUNTS_INPUTS = (
+    "plugins",
+    "sources",
+    "distfiles",
+    "repository",
+    "cache",
+    "dependencies",
+)
+
+# Container clients are shared by all the executors of the process for a
+# given client type and connection options. Resolved images are cached the
+# same way and only refreshed when pulled.
+_clients: Dict[Hashable, Any] = {}
+_images: Dict[Hashable, Dict[str, Any]] = {}
+_images_locks: Dict[Hashable, threading.Lock] = defaultdict(threading.Lock)
+_lock = threading.Lock()
+
+
+def drop_client(key: Hashable, client: Any):
+    """
+    Remove a client with a broken connection from the pool and close it.
+    """
+    with _lock:
+        if _clients.get(key) is client:
+            del _clients[key]
+    try:
+        client.close()
+    except Exception:
+        pass
+
+
+def is_connection_error(e: BaseException) -> bool:
+    """
+    Return whether the exception, or one it was raised from, is caused by the
+    connection to the container client rather than by an API call.
+    """
+    cause: Optional[BaseException] = e
+    while cause is not None:
+        if isinstance(cause, (RequestsConnectionError, ConnectionError)):
+            return True
+        cause = cause.__cause__ or cause.__context__
+    return False
+
+
+def close_clients():
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        try:
+            client.close()
+        except Exception:
+            pass
+
+
+atexit.register(close_clients)
+
+# Interval in seconds between two samples of the container cgroup stats.
+STATS_INTERVAL = 2
+
+
+def parse_container_stats(stats: Any) -> Dict[str, float]:
+    """
+    Parse container cgroup stats as returned by Docker or by the Podman
+    libpod API into the resources accounted for by executors.
+    """
+    if isinstance(stats, (bytes, str)):
+        try:
+            stats = json.loads(stats)
+        except ValueError:
+            return {}
+    if not isinstance(stats, dict):
+        return {}
+    usage: Dict[str, float] = {}
+    if stats.get("Stats"):
+        # Podman libpod format
+        entry = stats["Stats"][0]
+        if "CPUNano" in entry:
+            usage["cpu_time"] = entry["CPUNano"] / 1e9
+        if "MemUsage" in entry:
+            usage["max_rss"] = entry["MemUsage"]
+        if "BlockInput" in entry:
+            usage["read_bytes"] = entry["BlockInput"]
+        if "BlockOutput" in entry:
+            usage["write_bytes"] = entry["BlockOutput"]
+        return usage
+    cpu = stats.get("cpu_stats", {}).get("cpu_usage", {})
+    if "total_usage" in cpu:
+        usage["cpu_time"] = cpu["total_usage"] / 1e9
+    memory = stats.get("memory_stats", {})
+    # max_usage is only available with cgroup v1
+    rss = memory.get("max_usage", memory.get("usage"))
+    if rss is not None:
+        usage["max_rss"] = rss
+    blkio = stats.get("blkio_stats", {}).get("io_service_bytes_recursive")
+    for entry in blkio or []:
+        op = str(entry.get("op", "")).lower()
+        if op in ("read", "write"):
+            key = f"{op}_bytes"
+            usage[key] = usage.get(key, 0) + entry.get("value", 0)
+    return usage
 
 
 class ContainerExecutor(Executor):
+    # Read-only bind mounts are staged outside the builder directory and used
+    # as lower directories of overlays. Upper directories are kept on a
+    # volume of the container as overlayfs cannot be used as upper layer.
+    _mounts_dir = PurePosixPath("/mnt/qubesbuilder")
+    _overlays_dir = PurePosixPath("/mnt/qubesbuilder-overlays")
+    # Outputs are saved out of the tmpfs backed builder directory, if any, as
+    # it does not survive the container.
+    _outputs_dir = PurePosixPath("/mnt/qubesbuilder-outputs")
+    _footprint_file = PurePosixPath("/mnt/qubesbuilder-footprint")
+
     def __init__(
         self,
         container_client,
@@ -72,9 +209,25 @@ class ContainerExecutor(Executor):
         self._image = image
         self._attrs: Dict[Any, Any] = {}
         self.container: Container = None  # type: ignore
+        self._overlays_volume: Optional[str] = None
 
-    @contextmanager
-    def get_client(self):
+        bind_mounts = self._kwargs.get("bind_mounts", False)
+        if isinstance(bind_mounts, str):
+            bind_mounts = str_to_bool(bind_mounts)
+        if bind_mounts is True:
+            bind_mounts = list(BIND_MOUNTS_INPUTS)
+        elif not bind_mounts:
+            bind_mounts = []
+        unknown = set(bind_mounts).difference(BIND_MOUNTS_INPUTS)
+        if unknown:
+            raise ExecutorError(
+                f"Unknown bind mounts input(s): {', '.join(sorted(unknown))}."
+            )
+        self._bind_mounts: List[str] = list(bind_mounts)
+
+        self.parse_tmpfs_options()
+
+    def get_client_key(self) -> Tuple[str, Tuple]:
         kwargs = {
             k: v
             for k, v in self._kwargs.items()
@@ -87,18 +240,103 @@ class ContainerExecutor(Executor):
                 "max_pool_size",
             )
         }
+        return self._container_client, tuple(sorted(kwargs.items()))
+
+    @contextmanager
+    def get_client(self):
+        key = self.get_client_key()
         client = None
         try:
-            client = self._client(**kwargs)
-            yield client
-        except (PodmanError, DockerException, ValueError) as e:
-            raise ExecutorError("Cannot connect to container client.") from e
-        finally:
+            with _lock:
+                client = _clients.get(key)
+                if client is None:
+                    client = self._client(**dict(key[1]))
+                    _clients[key] = client
+            # the pooled connection may have been broken since its last use
+            client.ping()
+        except (
+            PodmanError,
+            DockerException,
+            RequestsConnectionError,
+            ConnectionError,
+            ValueError,
+        ) as e:
             if client is not None:
+                drop_client(key, client)
+            raise InfrastructureError(
+                "Cannot connect to container client."
+            ) from e
+        try:
+            yield client
+        except ExecutorError:
+            # raised by the run itself
+            raise
+        except (
+            PodmanError,
+            DockerException,
+            RequestsConnectionError,
+            ConnectionError,
+        ) as e:
+            if is_connection_error(e):
+                drop_client(key, client)
+                raise InfrastructureError(
+                    "Cannot connect to container client."
+                ) from e
+            raise ExecutorError(f"Container client error: {str(e)}") from e
+
+    def get_image(self, client) -> Dict[str, Any]:
+        """
+        Return the attributes of the executor image, pulling it if needed.
+
+        Concurrent requests for an image not resolved yet wait for the first
+        one, so that an image is pulled only once.
+        """
+        key = (self.get_client_key(), self._image)
+        with _lock:
+            image_lock = _images_locks[key]
+        with image_lock:
+            attrs = _images.get(key)
+            if attrs is None:
                 try:
-                    client.close()
-                except Exception:
-                    pass
+                    attrs = client.images.get(self._image).attrs
+                except (PodmanError, DockerException):
+                    try:
+                        attrs = client.images.pull(self._image).attrs
+                    except (PodmanNotFound, DockerNotFound) as e:
+                        raise ExecutorError(
+                            f"Cannot find {self._image}."
+                        ) from e
+                    except (PodmanError, DockerException) as e:
+                        # e.g. registry or network issues
+                        raise InfrastructureError(
+                            f"Cannot find {self._image}."
+                        ) from e
+                _images[key] = attrs
+        return attrs
+
+    def forget_image(self, attrs: Dict[str, Any]):
+        """
+        Drop the given resolved image attributes from the cache, unless they
+        have already been refreshed by another executor.
+        """
+        key = (self.get_client_key(), self._image)
+        with _lock:
+            image_lock = _images_locks[key]
+        with image_lock:
+            if _images.get(key) is attrs:
+                del _images[key]
+
+    def create_container(self, client, *args, **kwargs):
+        """
+        Create the container from the executor image. The cached image is
+        resolved again once if it has been removed since (e.g. pruned).
+        """
+        try:
+            return client.containers.create(self._attrs["Id"], *args, **kwargs)
+        except (PodmanNotFound, DockerNotFound):
+            self.forget_image(self._attrs)
+            self._attrs = self.get_image(client)
+            return client.containers.create(self._attrs["Id"], *args, **kwargs)
 
     def get_user(self):
         return self._user
@@ -106,38 +344,118 @@ class ContainerExecutor(Executor):
     def get_group(self):
         return self._group
 
-    def copy_in(self, source_path: Path, destination_dir: PurePath):  # type: ignore
-        src = source_path.resolve()
-        dst = destination_dir.as_posix()
+    def get_bind_mounts(
+        self, copy_in: List[Tuple[Path, PurePath]]
+    ) -> Tuple[
+        List[Tuple[Path, PurePath, PurePosixPath]], List[Tuple[Path, PurePath]]
+    ]:
+        """
+        Split copy-in entries into read-only bind mounts and regular copies.
 
-        try:
-            # docker doesn't create parent target dirs on copy (similar to `cp`), do that first
-            with tempfile.TemporaryDirectory() as empty_dir:
-                for parent in list(reversed(destination_dir.parents)) + [
-                    destination_dir
-                ]:
-                    cmd = [
-                        self._container_client,
-                        "cp",
-                        f"{empty_dir!s}/.",
-                        f"{self.container.id}:{parent}",
-                    ]
-                    self.log.debug(f"copy-in (cmd): {' '.join(cmd)}")
-                    subprocess.run(cmd, check=True, capture_output=True)
-            cmd = [
-                self._container_client,
-                "cp",
-                str(src),
-                f"{self.container.id}:{dst}",
+        A directory is mounted only if its destination is within one of the
+        enabled inputs and nothing else is copied inside it. It is exposed
+        at its destination through an overlay so that the build can still
+        write to it without modifying the host: only modified files are
+        copied up.
+        """
+        roots = [self.get_builder_dir() / name for name in self._bind_mounts]
+        mounts: List[Tuple[Path, PurePath, PurePosixPath]] = []
+        copies: List[Tuple[Path, PurePath]] = []
+        for src, dst in sorted(set(copy_in), key=lambda x: x[1]):
+            target = dst / src.name
+            if (
+                src.is_dir()
+                and any(target.is_relative_to(root) for root in roots)
+                and not any(
+                    other_dst.is_relative_to(target)
+                    for other_src, other_dst in copy_in
+                    if (other_src, other_dst) != (src, dst)
+                )
+            ):
+                mounts.append((src, dst, self._mounts_dir / str(len(mounts))))
+            else:
+                copies.append((src, dst))
+        return mounts, copies
+
+    def get_bind_mounts_volumes(
+        self, mounts: List[Tuple[Path, PurePath, PurePosixPath]]
+    ) -> Dict[str, Dict[str, Any]]:
+        volumes: Dict[str, Dict[str, Any]] = {}
+        for src, _, staging in mounts:
+            if self._container_client == "podman":
+                volume = {
+                    "bind": str(staging),
+                    "mode": "ro",
+                    "extended_mode": ["z"],
+                }
+            else:
+                volume = {"bind": str(staging), "mode": "ro,z"}
+            volumes[str(src.resolve())] = volume
+        if mounts:
+            assert self._overlays_volume
+            volumes[self._overlays_volume] = {
+                "bind": str(self._overlays_dir),
+                "mode": "rw",
+            }
+        return volumes
+
+    def get_overlays_cmd(
+        self, mounts: List[Tuple[Path, PurePath, PurePosixPath]]
+    ) -> List[str]:
+        """
+        Mount an overlay of each read-only bind mount at its destination.
+        Metadata only copy-up is used if supported, so that changing the
+        owner of the builder directory does not copy up file contents.
+        """
+        overlays_cmd = []
+        for i, (src, dst, staging) in enumerate(mounts):
+            target = quote(str(dst / src.name))
+            layers = self._overlays_dir / str(i)
+            options = quote(
+                f"lowerdir={staging},upperdir={layers}/upper,workdir={layers}/work"
+            )
+            overlays_cmd += [
+                f"sudo mkdir -p -- {target} {quote(str(layers / 'upper'))} {quote(str(layers / 'work'))}",
+                f"{{ sudo mount -t overlay -o {options},metacopy=on overlay {target} 2>/dev/null || sudo mount -t overlay -o {options} overlay {target}; }}",
             ]
-            self.log.debug(f"copy-in (cmd): {' '.join(cmd)}")
-            subprocess.run(cmd, check=True, capture_output=True)
-        except subprocess.CalledProcessError as e:
-            content = sanitize_line(e.stderr.rstrip(b"\n")).rstrip()
-            msg = f"Failed to copy-in: {content}"
+        return overlays_cmd
+
+    async def _cp_async(self, cmd: List[str], action: str):
+        self.log.debug(f"{action} (cmd): {' '.join(cmd)}")
+        rc, _, stderr = await self.execute_async(cmd, collect=True, echo=False)
+        if rc != 0:
+            content = sanitize_line(stderr.rstrip(b"\n")).rstrip()
+            msg = f"Failed to {action}: {content}"
             raise ExecutorError(msg, name=self.container.id)
 
-    def copy_out(self, source_path: PurePath, destination_dir: Path):  # type: ignore
+    async def copy_in_async(self, source_path: Path, destination_dir: PurePath):  # type: ignore
+        src = source_path.resolve()
+        dst = destination_dir.as_posix()
+
+        # docker doesn't create parent target dirs on copy (similar to `cp`), do that first
+        with tempfile.TemporaryDirectory() as empty_dir:
+            for parent in list(reversed(destination_dir.parents)) + [
+                destination_dir
+            ]:
+                cmd = [
+                    self._container_client,
+                    "cp",
+                    f"{empty_dir!s}/.",
+                    f"{self.container.id}:{parent}",
+                ]
+                await self._cp_async(cmd, "copy-in")
+        cmd = [
+            self._container_client,
+            "cp",
+            str(src),
+            f"{self.container.id}:{dst}",
+        ]
+        await self._cp_async(cmd, "copy-in")
+
+    def copy_in(self, *args, **kwargs):  # type: ignore
+        return self.run_until_complete(self.copy_in_async(*args, **kwargs))
+
+    async def copy_out_async(self, source_path: PurePath, destination_dir: Path):  # type: ignore
         src = source_path.as_posix()
         dst = destination_dir.resolve()
 
@@ -147,21 +465,150 @@ class ContainerExecutor(Executor):
             f"{self.container.id}:{src}",
             str(dst),
         ]
-        try:
-            self.log.debug(f"copy-out (cmd): {' '.join(cmd)}")
-            dst.mkdir(parents=True, exist_ok=True)
-            subprocess.run(cmd, check=True, capture_output=True)
-        except subprocess.CalledProcessError as e:
-            content = sanitize_line(e.stderr.rstrip(b"\n")).rstrip()
-            msg = f"Failed to copy-out: {content}"
-            raise ExecutorError(msg, name=self.container.id)
+        dst.mkdir(parents=True, exist_ok=True)
+        await self._cp_async(cmd, "copy-out")
+
+    def copy_out(self, *args, **kwargs):  # type: ignore
+        return self.run_until_complete(self.copy_out_async(*args, **kwargs))
 
     def cleanup(self):
         if self.container:
             self.container.wait()
             self.container.remove()
+        if self._overlays_volume:
+            try:
+                with self.get_client() as client:
+                    client.volumes.get(self._overlays_volume).remove(force=True)
+            except ExecutorError as e:
+                self.log.warning(
+                    f"Cannot remove volume {self._overlays_volume}: {str(e)}"
+                )
+            self._overlays_volume = None
+
+    def get_tmpfs_copies(
+        self, copy_in: List[Tuple[Path, PurePath]]
+    ) -> Tuple[List[Tuple[Path, str]], List[Tuple[Path, PurePath]]]:
+        """
+        Split copy-in entries into those within the tmpfs directory and the
+        others. The tmpfs is mounted when the container starts, hiding what
+        was copied beforehand, so its entries are streamed to the container
+        as a tar archive extracted onto the tmpfs.
+        """
+        entries: List[Tuple[Path, str]] = []
+        copies: List[Tuple[Path, PurePath]] = []
+        for src, dst in copy_in:
+            target = dst / src.name
+            if target.is_relative_to(self.get_tmpfs_dir()):
+                arcname = target.relative_to("/").as_posix()
+                entries.append((src.resolve(), arcname))
+            else:
+                copies.append((src, dst))
+        return entries, copies
+
+    @staticmethod
+    def _write_tar(fd: int, entries: List[Tuple[Path, str]]):
+        with os.fdopen(fd, "wb") as f, tarfile.open(
+            fileobj=f, mode="w|"
+        ) as tar:
+            for src, arcname in entries:
+                tar.add(src, arcname=arcname)
+
+    def get_outputs_cmd(
+        self,
+        copy_out: List[Tuple[PurePath, Path]],
+        directories: List[PurePath],
+    ) -> Tuple[List[str], List[Tuple[PurePath, Path]]]:
+        """
+        Save outputs located in directories mounted inside the container
+        (tmpfs or overlays) so that they can be copied out once the container
+        has stopped.
+        """
+        outputs_cmd = []
+        outputs = []
+        for src, dst in copy_out:
+            if any(src.is_relative_to(d) for d in directories):
+                saved = self._outputs_dir / src.relative_to(
+                    self.get_builder_dir()
+                )
+                outputs_cmd.append(
+                    f"sudo mkdir -p -- {quote(str(saved.parent))} && "
+                    f"{{ sudo cp -a -- {quote(str(src))} {quote(str(saved.parent))}/ 2>/dev/null || true; }}"
+                )
+                src = saved
+            outputs.append((src, dst))
+        return outputs_cmd, outputs
+
+    async def get_footprint_async(self) -> Optional[int]:
+        rc, stdout, _ = await self.execute_async(
+            [
+                self._container_client,
+                "cp",
+                f"{self.container.id}:{self._footprint_file}",
+                "-",
+            ],
+            collect=True,
+            echo=False,
+        )
+        if rc != 0:
+            return None
+        try:
+            with tarfile.open(fileobj=io.BytesIO(stdout)) as tar:
+                member = tar.extractfile(self._footprint_file.name)
+                return int(member.read()) if member else None
+        except (tarfile.TarError, KeyError, ValueError):
+            return None
+
+    async def sample_stats_async(self, usage: Dict[str, float]):
+        """
+        Sample the container cgroup stats until cancelled. Counters are
+        cumulative so the last sample is kept, except for the memory usage for
+        which the peak is kept.
+        """
+        while True:
+            try:
+                stats = await asyncio.to_thread(
+                    self.container.stats, stream=False
+                )
+            except Exception as e:
+                self.log.debug(f"Cannot get container stats: {e!s}")
+            else:
+                sample = parse_container_stats(stats)
+                if "max_rss" in sample:
+                    sample["max_rss"] = max(
+                        sample["max_rss"], usage.get("max_rss", 0)
+                    )
+                usage.update(sample)
+            await asyncio.sleep(STATS_INTERVAL)
 
-    def run(  # type: ignore
+    async def run_with_tmpfs_entries_async(
+        self, cmd: List[str], entries: List[Tuple[Path, str]]
+    ) -> int:
+        """
+        Start the container with the tmpfs entries streamed to its standard
+        input.
+        """
+        read_fd, write_fd = os.pipe()
+        writer = asyncio.ensure_future(
+            asyncio.to_thread(self._write_tar, write_fd, entries)
+        )
+        try:
+            rc = await self.execute_async(cmd, stdin=read_fd)
+        finally:
+            os.close(read_fd)
+        try:
+            await writer
+        except BrokenPipeError:
+            # the container stopped before reading everything, its status
+            # tells if the archive has been extracted
+            pass
+        except OSError as e:
+            raise ExecutorError(f"Failed to copy-in (tar): {e}") from e
+        return rc
+
+    async def run_async(self, *args, **kwargs):  # type: ignore
+        return await self.retry_async(self.run_once_async, *args, **kwargs)
+
+    async def run_once_async(  # type: ignore
         self,
         cmd: List[str],
         copy_in: List[Tuple[Path, PurePath]] = None,
@@ -171,28 +618,46 @@ class ContainerExecutor(Executor):
         no_fail_copy_out_allowed_patterns=None,
         **kwargs,
     ):
+        start = time.monotonic()
+        usage: Dict[str, float] = {}
         try:
             with self.get_client() as client:
                 # Check if we have the image locally and pull if needed
-                try:
-                    docker_image = client.images.get(self._image)
-                except (PodmanError, DockerException):
-                    # Try to pull the image
-                    try:
-                        docker_image = client.images.pull(self._image)
-                    except (PodmanError, DockerException) as e:
-                        raise ExecutorError(
-                            f"Cannot find {self._image}."
-                        ) from e
+                self._attrs = await asyncio.to_thread(self.get_image, client)
 
-                self._attrs = docker_image.attrs
+                mounts, copies = self.get_bind_mounts(copy_in or [])
+                if mounts:
+                    self._overlays_volume = (
+                        f"qubesbuilder-overlays-{uuid.uuid4().hex}"
+                    )
 
-                # prepare container for given image and command
-                image = client.images.get(self._attrs["Id"])
+                # put the builder directory or the build directory on a tmpfs
+                tmpfs: Dict[str, str] = {}
+                tmpfs_cmd = []
+                tmpfs_entries: List[Tuple[Path, str]] = []
+                mounted_dirs: List[PurePath] = [
+                    dst / src.name for src, dst, _ in mounts
+                ]
+                if self.use_tmpfs():
+                    tmpfs_dir = str(self.get_tmpfs_dir())
+                    tmpfs = {tmpfs_dir: f"size={self._tmpfs_size},exec"}
+                    tmpfs_entries, copies = self.get_tmpfs_copies(copies)
+                    if tmpfs_entries:
+                        tmpfs_cmd = ["sudo tar -x -f - -C /"]
+                    mounted_dirs.append(self.get_tmpfs_dir())
+                if mounted_dirs:
+                    outputs_cmd, copy_out = self.get_outputs_cmd(
+                        copy_out or [], mounted_dirs
+                    )
+                    cmd = cmd + outputs_cmd
 
                 # fix permissions and user group
-                permissions_cmd = [
+                permissions_cmd = tmpfs_cmd + [
                     f"sudo mkdir -p -- {quote(str(self.get_builder_dir()))} {quote(str(self.get_builder_dir()/'build'))} {quote(str(self.get_builder_dir()/'plugins'))} {quote(str(self.get_builder_dir()/'distfiles'))}",
+                ]
+                # expose read-only bind mounts through writable overlays
+                permissions_cmd += self.get_overlays_cmd(mounts)
+                permissions_cmd += [
                     f"sudo chown -R -- {quote(self._user)}:{quote(self._group)} {quote(str(self.get_builder_dir()))}",
                 ]
 
@@ -210,6 +675,10 @@ class ContainerExecutor(Executor):
                     ]
 
                 final_cmd = "&&".join(permissions_cmd + sed_cmd + cmd)
+                if self._tmpfs:
+                    # record the footprint even if the command fails
+                    footprint_cmd = f"sudo du -sx -B1 -- {quote(str(self.get_tmpfs_dir()))} | cut -f1 | sudo tee -- {self._footprint_file} >/dev/null"
+                    final_cmd = f"trap {quote(footprint_cmd)} EXIT; {final_cmd}"
                 container_cmd = ["bash", "-c", final_cmd]
 
                 # FIXME: Ensure podman client can parse non str value
@@ -217,27 +686,32 @@ class ContainerExecutor(Executor):
                 if self._container_client == "podman":
                     for k, v in environment.copy().items():
                         environment[k] = str(v)
-                mounts = [
+                mounts_devices = [
                     {
                         "type": "bind",
                         "source": "/dev/loop-control",
                         "target": "/dev/loop-control",
                     },
                 ]
-                self.container = client.containers.create(
-                    image,
+                self.container = await asyncio.to_thread(
+                    self.create_container,
+                    client,
                     container_cmd,
                     privileged=True,
                     environment=environment,
-                    mounts=mounts,
+                    mounts=mounts_devices,
+                    volumes=self.get_bind_mounts_volumes(mounts),
+                    tmpfs=tmpfs,
+                    stdin_open=bool(tmpfs_entries),
                     init=True,
                 )
 
                 # copy-in hook
-                for src_in, dst_in in sorted(
-                    set(copy_in or []), key=lambda x: x[1]
-                ):
-                    self.copy_in(source_path=src_in, destination_dir=dst_in)
+                self.notify_phase("copy-in")
+                for src_in, dst_in in copies:
+                    await self.copy_in_async(
+                        source_path=src_in, destination_dir=dst_in
+                    )
 
                 self.log.debug(
                     f"Using executor {self._container_client}:{self.container.short_id} to run '{final_cmd}'."
@@ -249,19 +723,35 @@ class ContainerExecutor(Executor):
                     self._container_client,
                     "start",
                     "--attach",
+                    *(["--interactive"] if tmpfs_entries else []),
                     self.container.id,
                 ]
-                rc = self.execute(cmd)
+                self.notify_phase("run")
+                sampler = asyncio.create_task(self.sample_stats_async(usage))
+                try:
+                    if tmpfs_entries:
+                        rc = await self.run_with_tmpfs_entries_async(
+                            cmd, tmpfs_entries
+                        )
+                    else:
+                        rc = await self.execute_async(cmd)
+                finally:
+                    sampler.cancel()
+                if self._tmpfs:
+                    footprint = await self.get_footprint_async()
+                    if footprint is not None:
+                        self.save_footprint(footprint)
                 if rc != 0:
                     msg = f"Failed to run '{final_cmd}' (status={rc})."
                     raise ExecutorError(msg, name=self.container.id)
 
                 # copy-out hook
+                self.notify_phase("copy-out")
                 for src_out, dst_out in sorted(
                     set(copy_out or []), key=lambda x: x[1]
                 ):
                     try:
-                        self.copy_out(
+                        await self.copy_out_async(
                             source_path=src_out,
                             destination_dir=dst_out,
                         )
@@ -282,8 +772,14 @@ class ContainerExecutor(Executor):
                         raise e
         except ExecutorError as e:
             if self.container and self._clean_on_error:
-                self.cleanup()
+                await asyncio.to_thread(self.cleanup)
             raise e
         else:
             if self.container and self._clean:
-                self.cleanup()
+                await asyncio.to_thread(self.cleanup)
+        finally:
+            usage["wall_time"] = time.monotonic() - start
+            self.add_resources(usage)
+
+    def run(self, *args, **kwargs):  # type: ignore
+        return self.run_until_complete(self.run_async(*args, **kwargs))
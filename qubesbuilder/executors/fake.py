@@ -0,0 +1,321 @@
+# The Qubes OS Project, http://www.qubes-os.org
+#
+# Copyright (C) 2026 Frédéric Pierret (fepitre) <frederic@invisiblethingslab.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program. If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+"""
+Fake executor backends, to measure and test the executor layer without
+disposable qubes, containers or build tools.
+"""
+
+import asyncio
+import os
+import sys
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path, PurePath
+from typing import Dict, Hashable, Iterator, List, Tuple
+
+from qubesbuilder.executors import Executor, ExecutorError
+from qubesbuilder.executors import container, qrexec, qubes
+
+# Tools replaced by the shims
+SHIM_TOOLS = ("qrexec-client-vm", "qvm-run-vm", "docker", "podman")
+
+# Stand-in for the tools above, dispatching on its name. Calls are appended
+# to the file given by QB_FAKE_CALLS as 'tool<TAB>call<TAB>simulated time'.
+# Each call takes QB_FAKE_LATENCY seconds, plus the time to transfer copied-in
+# files at QB_FAKE_BANDWIDTH bytes per second (unlimited if 0). It only uses
+# the standard library to keep its own startup time low.
+SHIM_SCRIPT = r"""
+import os, sys, time
+
+tool, args = os.path.basename(sys.argv[0]), sys.argv[1:]
+latency = float(os.environ.get("QB_FAKE_LATENCY") or 0)
+bandwidth = float(os.environ.get("QB_FAKE_BANDWIDTH") or 0)
+
+
+def size(paths):
+    total = 0
+    for path in paths:
+        if os.path.isfile(path):
+            total += os.path.getsize(path)
+        for root, _, files in os.walk(path):
+            for name in files:
+                try:
+                    total += os.lstat(os.path.join(root, name)).st_size
+                except OSError:
+                    pass
+    return total
+
+
+stdout = b""
+transferred = 0
+if tool == "qrexec-client-vm":
+    args = args[args.index("--") + 1 :]
+    service, local_cmd = args[1], args[2:]
+    call = service.split("+")[0]
+    if local_cmd and local_cmd[0].endswith("qfile-agent"):
+        transferred = size(a for a in local_cmd[1:] if not a.startswith("-"))
+    if call == "admin.vm.CreateDisposable":
+        stdout = b"0\x00disp%d" % (os.getpid() % 1000000)
+    elif call == "admin.vm.CurrentState":
+        stdout = b"0\x00power_state=Running"
+    elif call.startswith("admin."):
+        stdout = b"0\x00"
+elif tool == "qvm-run-vm":
+    call = args[-1].split()[0] if args else ""
+else:
+    call = args[0] if args else ""
+    if call == "cp" and len(args) == 3 and os.path.exists(args[1]):
+        transferred = size([args[1]])
+sys.stdin.buffer.read()
+simulated = latency + (transferred / bandwidth if bandwidth else 0)
+time.sleep(simulated)
+calls = os.environ.get("QB_FAKE_CALLS")
+if calls:
+    with open(calls, "a") as f:
+        f.write(f"{tool}\t{call}\t{simulated}\n")
+sys.stdout.buffer.write(stdout)
+"""
+
+
+def install_shims(directory: Path) -> Dict[str, Path]:
+    """
+    Install the shims in the given directory.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    shim = directory / "shim.py"
+    shim.write_text(f"#!{sys.executable} -I\n{SHIM_SCRIPT}")
+    shim.chmod(0o755)
+    shims = {}
+    for tool in SHIM_TOOLS:
+        path = directory / tool
+        path.unlink(missing_ok=True)
+        path.symlink_to(shim.name)
+        shims[tool] = path
+    return shims
+
+
+def read_shim_calls(path: Path) -> Tuple[Counter, float]:
+    """
+    Read the calls recorded by the shims. Return the number of calls per
+    'tool call' and the total simulated time.
+    """
+    calls: Counter = Counter()
+    simulated = 0.0
+    try:
+        lines = path.read_text().splitlines()
+    except FileNotFoundError:
+        lines = []
+    for line in lines:
+        tool, call, seconds = line.split("\t")
+        calls[f"{tool} {call}".strip()] += 1
+        simulated += float(seconds)
+    return calls, simulated
+
+
+@contextmanager
+def use_shims(
+    directory: Path, latency: float = 0, bandwidth: float = 0
+) -> Iterator[Path]:
+    """
+    Make executors use the shims instead of the Qubes tools and container
+    CLIs. Yield the path of the file where calls are recorded.
+    """
+    shims = install_shims(directory)
+    calls = directory / "calls"
+    calls.unlink(missing_ok=True)
+    environ = {
+        "PATH": f"{directory}{os.pathsep}{os.environ.get('PATH', '')}",
+        "QB_FAKE_CALLS": str(calls),
+        "QB_FAKE_LATENCY": str(latency),
+        "QB_FAKE_BANDWIDTH": str(bandwidth),
+    }
+    saved_environ = {key: os.environ.get(key) for key in environ}
+    saved_tools = (qrexec.QREXEC_CLIENT_VM, qubes.QVM_RUN_VM)
+    os.environ.update(environ)
+    qrexec.QREXEC_CLIENT_VM = str(shims["qrexec-client-vm"])
+    qubes.QVM_RUN_VM = str(shims["qvm-run-vm"])
+    try:
+        yield calls
+    finally:
+        qrexec.QREXEC_CLIENT_VM, qubes.QVM_RUN_VM = saved_tools
+        for key, value in saved_environ.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+class FakeContainer:
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.short_id = self.id[:12]
+
+    def stats(self, stream=False):
+        return {}
+
+    def wait(self):
+        pass
+
+    def remove(self):
+        pass
+
+
+class FakeImages:
+    def get(self, name):
+        return type("Image", (), {"attrs": {"Id": f"sha256:{name}"}})()
+
+    pull = get
+
+
+class FakeContainers:
+    def __init__(self):
+        self.created: List[FakeContainer] = []
+
+    def create(self, image, command, **kwargs):
+        container = FakeContainer()
+        self.created.append(container)
+        return container
+
+
+class FakeContainerClient:
+    """
+    Stand-in for the Docker and Podman Python clients. Commands run through
+    the container CLI, see use_shims.
+    """
+
+    def __init__(self, **kwargs):
+        self.images = FakeImages()
+        self.containers = FakeContainers()
+
+    def ping(self):
+        return True
+
+    def close(self):
+        pass
+
+
+@contextmanager
+def use_fake_container_client(key: Hashable) -> Iterator[FakeContainerClient]:
+    """
+    Make container executors with the given client key use a fake client.
+    """
+    client = FakeContainerClient()
+    with container._lock:
+        saved = container._clients.get(key)
+        container._clients[key] = client
+    try:
+        yield client
+    finally:
+        with container._lock:
+            if saved is None:
+                container._clients.pop(key, None)
+            else:
+                container._clients[key] = saved
+            for image_key in list(container._images):
+                if image_key[0] == key:  # type: ignore[index]
+                    del container._images[image_key]
+
+
+class FakeExecutor(Executor):
+    """
+    Executor simulating transfers and commands without running them.
+
+    Each call takes 'latency' seconds. Copies take in addition the time to
+    transfer the files at 'bandwidth' bytes per second (unlimited if 0) and
+    commands the given 'run_time' seconds. Calls are counted in 'calls' and
+    the total simulated time is kept in 'simulated'. Nothing is actually
+    copied out.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0,
+        bandwidth: float = 0,
+        run_time: float = 0,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self._latency = float(latency)
+        self._bandwidth = float(bandwidth)
+        self._run_time = float(run_time)
+        self.calls: Counter = Counter()
+        self.simulated = 0.0
+
+    def get_user(self):
+        return "user"
+
+    def get_group(self):
+        return "user"
+
+    async def _simulate(self, size: int = 0, run_time: float = 0):
+        duration = self._latency + run_time
+        if self._bandwidth:
+            duration += size / self._bandwidth
+        self.simulated += duration
+        await asyncio.sleep(duration)
+
+    async def copy_in_async(self, source_path: Path, destination_dir: PurePath):  # type: ignore
+        self.calls["copy-in"] += 1
+        if not source_path.exists():
+            raise ExecutorError(
+                f"Failed to copy-in: cannot find {source_path}."
+            )
+        if source_path.is_dir():
+            size = sum(
+                p.stat().st_size for p in source_path.rglob("*") if p.is_file()
+            )
+        else:
+            size = source_path.stat().st_size
+        await self._simulate(size)
+
+    def copy_in(self, *args, **kwargs):  # type: ignore
+        return self.run_until_complete(self.copy_in_async(*args, **kwargs))
+
+    async def copy_out_async(self, source_path: PurePath, destination_dir: Path):  # type: ignore
+        self.calls["copy-out"] += 1
+        await self._simulate()
+
+    def copy_out(self, *args, **kwargs):  # type: ignore
+        return self.run_until_complete(self.copy_out_async(*args, **kwargs))
+
+    async def run_async(  # type: ignore
+        self,
+        cmd: List[str],
+        copy_in: List[Tuple[Path, PurePath]] = None,
+        copy_out: List[Tuple[PurePath, Path]] = None,
+        **kwargs,
+    ):
+        start = time.monotonic()
+        try:
+            self.notify_phase("copy-in")
+            for src, dst in copy_in or []:
+                await self.copy_in_async(src, dst)
+            self.notify_phase("run")
+            self.calls["run"] += 1
+            await self._simulate(run_time=self._run_time)
+            self.notify_phase("copy-out")
+            for src_out, dst_out in copy_out or []:
+                await self.copy_out_async(src_out, dst_out)
+        finally:
+            self.add_resources({"wall_time": time.monotonic() - start})
+
+    def run(self, *args, **kwargs):  # type: ignore
+        return self.run_until_complete(self.run_async(*args, **kwargs))
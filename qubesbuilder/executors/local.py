@@ -16,17 +16,37 @@
 # with this program. If not, see <https://www.gnu.org/licenses/>.
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
+import asyncio
+import fcntl
 import getpass
 import grp
 import os
 import pwd
 import shutil
 import subprocess
+import sys
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Tuple
+from typing import Dict, List, Tuple
 
-from qubesbuilder.executors import Executor, ExecutorError
+from qubesbuilder.executors import (
+    RUSAGE_WRAPPER,
+    Executor,
+    ExecutorError,
+    parse_rusage,
+)
+
+# ioctl request for cloning a file (linux/fs.h)
+FICLONE = getattr(fcntl, "FICLONE", 0x40049409)
+
+COPY_STRATEGIES = ("copy", "reflink")
+
+# Inputs that can be hardlinked when reflinks are not supported. Only
+# distfiles are: they are verified and never modified in place, whereas build
+# tools may update repository metadata or dependencies in place.
+IMMUTABLE_INPUTS = ("distfiles",)
 
 
 class LocalExecutor(Executor):
@@ -49,6 +69,17 @@ class LocalExecutor(Executor):
         self._builder_dir = self._temporary_dir / "builder"
         self._builder_dir_exists = False
 
+        self._copy_strategy = self._kwargs.get("copy_strategy", "copy")
+        if self._copy_strategy not in COPY_STRATEGIES:
+            raise ExecutorError(
+                f"Unknown copy strategy '{self._copy_strategy}'."
+            )
+        self._copy_jobs = int(
+            self._kwargs.get("copy_jobs", os.cpu_count() or 1)
+        )
+        self.parse_tmpfs_options()
+        self._tmpfs_mounted = False
+
     def get_directory(self):
         return self._directory
 
@@ -60,9 +91,78 @@ class LocalExecutor(Executor):
         group = grp.getgrgid(gid).gr_name
         return self._kwargs.get("group", group)
 
+    @staticmethod
+    def _reflink(src: Path, dst: Path):
+        with open(src, "rb") as fsrc, open(dst, "xb") as fdst:
+            try:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            except OSError:
+                # leave no empty file behind for the other strategies
+                dst.unlink()
+                raise
+        shutil.copystat(src, dst)
+
+    def _copy_file(self, src: Path, dst: Path, hardlink: bool = False):
+        # never write through an existing link to an input
+        dst.unlink(missing_ok=True)
+        try:
+            self._reflink(src, dst)
+            return
+        except OSError:
+            pass
+        if hardlink:
+            try:
+                os.link(src, dst)
+                return
+            except OSError:
+                pass
+        shutil.copy2(src, dst)
+
+    def _copy_tree(self, src: Path, dst: Path, hardlink: bool = False):
+        directories = []
+        files = []
+        for root, dirnames, filenames in os.walk(src):
+            target = dst / Path(root).relative_to(src)
+            target.mkdir(parents=True, exist_ok=True)
+            directories.append((Path(root), target))
+            for name in dirnames + filenames:
+                path = Path(root) / name
+                if path.is_symlink():
+                    os.symlink(os.readlink(path), target / name)
+                elif name in filenames:
+                    files.append((path, target / name))
+        with ThreadPoolExecutor(max_workers=self._copy_jobs) as pool:
+            for future in [
+                pool.submit(self._copy_file, s, d, hardlink) for s, d in files
+            ]:
+                future.result()
+        for src_dir, dst_dir in reversed(directories):
+            shutil.copystat(src_dir, dst_dir)
+
+    def _is_immutable_input(self, destination_dir: Path):
+        return any(
+            destination_dir.is_relative_to(self.get_builder_dir() / name)
+            for name in IMMUTABLE_INPUTS
+        )
+
     def copy_in(self, source_path: Path, destination_dir: Path, action="copy-in"):  # type: ignore
         src = source_path.resolve()
         dst = destination_dir.resolve()
+        if self._copy_strategy == "reflink":
+            hardlink = action == "copy-in" and self._is_immutable_input(dst)
+            try:
+                if src.is_dir():
+                    dst = dst / src.name
+                    if dst.exists():
+                        shutil.rmtree(str(dst))
+                    self._copy_tree(src, dst, hardlink=hardlink)
+                else:
+                    dst.mkdir(parents=True, exist_ok=True)
+                    self._copy_file(src, dst / src.name, hardlink=hardlink)
+            except OSError as e:
+                msg = f"Failed to {action}: {e!s}"
+                raise ExecutorError(msg) from e
+            return
         try:
             if src.is_dir():
                 dst = dst / src.name
@@ -79,7 +179,109 @@ class LocalExecutor(Executor):
     def copy_out(self, source_path: Path, destination_dir: Path):  # type: ignore
         self.copy_in(source_path, destination_dir, action="copy-out")
 
+    def mount_tmpfs(self):
+        """
+        Mount a tmpfs on the tmpfs directory. Content kept on disk by a
+        previous run is moved to it.
+        """
+        tmpfs_dir = self.get_tmpfs_dir()
+        tmpfs_dir.mkdir(parents=True, exist_ok=True)
+        disk_dir = tmpfs_dir.with_name(f"{tmpfs_dir.name}.disk")
+        if any(tmpfs_dir.iterdir()):
+            tmpfs_dir.rename(disk_dir)
+            tmpfs_dir.mkdir()
+        try:
+            subprocess.run(
+                [
+                    "sudo",
+                    "--non-interactive",
+                    "mount",
+                    "-t",
+                    "tmpfs",
+                    "-o",
+                    f"size={self._tmpfs_size},mode=0755,uid={os.getuid()},gid={os.getgid()}",
+                    "tmpfs",
+                    tmpfs_dir,
+                ],
+                check=True,
+                capture_output=True,
+            )
+        except (OSError, subprocess.CalledProcessError) as e:
+            self.log.warning(
+                f"Cannot mount tmpfs on {tmpfs_dir}, using disk: {str(e)}"
+            )
+            if disk_dir.exists():
+                tmpfs_dir.rmdir()
+                disk_dir.rename(tmpfs_dir)
+            return
+        self._tmpfs_mounted = True
+        if disk_dir.exists():
+            self.move_content(disk_dir, tmpfs_dir)
+
+    def umount_tmpfs(self, keep: bool = False):
+        """
+        Unmount the tmpfs. If requested, its content is kept on disk in place.
+        """
+        tmpfs_dir = self.get_tmpfs_dir()
+        disk_dir = tmpfs_dir.with_name(f"{tmpfs_dir.name}.disk")
+        try:
+            if keep:
+                disk_dir.mkdir()
+                self.move_content(tmpfs_dir, disk_dir)
+            subprocess.run(
+                [
+                    "sudo",
+                    "--non-interactive",
+                    "umount",
+                    "--",
+                    tmpfs_dir,
+                ],
+                check=True,
+            )
+            self._tmpfs_mounted = False
+            if keep:
+                tmpfs_dir.rmdir()
+                disk_dir.rename(tmpfs_dir)
+        except (OSError, subprocess.CalledProcessError) as e:
+            raise ExecutorError(f"Failed to unmount tmpfs: {str(e)}")
+
+    @staticmethod
+    def move_content(src: Path, dst: Path):
+        subprocess.run(
+            [
+                "sudo",
+                "--non-interactive",
+                "find",
+                src,
+                "-mindepth",
+                "1",
+                "-maxdepth",
+                "1",
+                "-exec",
+                "mv",
+                "-t",
+                dst,
+                "--",
+                "{}",
+                "+",
+            ],
+            check=True,
+        )
+
+    @staticmethod
+    def _disk_usage(path: Path) -> int:
+        usage = 0
+        for root, dirnames, filenames in os.walk(path):
+            for name in dirnames + filenames:
+                try:
+                    usage += os.lstat(os.path.join(root, name)).st_blocks * 512
+                except OSError:
+                    pass
+        return usage
+
     def cleanup(self):
+        if self._tmpfs_mounted:
+            self.umount_tmpfs()
         try:
             shutil.rmtree(self._temporary_dir)
         except PermissionError:
@@ -105,7 +307,7 @@ class LocalExecutor(Executor):
                 f"Failed to clean executor temporary directory: {str(e)}"
             )
 
-    def run(  # type: ignore
+    async def run_async(  # type: ignore
         self,
         cmd: List[str],
         copy_in: List[Tuple[Path, Path]] = None,
@@ -115,6 +317,9 @@ class LocalExecutor(Executor):
         no_fail_copy_out_allowed_patterns=None,
         **kwargs,
     ):
+        start = time.monotonic()
+        usage: Dict[str, float] = {}
+
         # Create temporary builder directory. In an unlikely case of conflict,
         # run will abort instead of using unsafe directory.
         try:
@@ -128,9 +333,13 @@ class LocalExecutor(Executor):
             )
 
         try:
+            if not self._tmpfs_mounted and self.use_tmpfs():
+                await asyncio.to_thread(self.mount_tmpfs)
+
             # copy-in hook
+            self.notify_phase("copy-in")
             for src, dst in sorted(set(copy_in or []), key=lambda x: x[1]):
-                self.copy_in(
+                await self.copy_in_async(
                     source_path=src,
                     destination_dir=dst,
                 )
@@ -162,15 +371,39 @@ class LocalExecutor(Executor):
                 environment_new.update(environment)
                 environment = environment_new
 
-            rc = self.execute(final_cmd, env=environment)
+            self.notify_phase("run")
+            rusage_file = self._temporary_dir / "rusage.json"
+            rc = await self.execute_async(
+                [
+                    sys.executable,
+                    "-c",
+                    RUSAGE_WRAPPER,
+                    str(rusage_file),
+                    *final_cmd,
+                ],
+                env=environment,
+            )
+            try:
+                usage = parse_rusage(rusage_file.read_text())
+            except OSError:
+                pass
+            if self._tmpfs:
+                self.save_footprint(
+                    await asyncio.to_thread(
+                        self._disk_usage, self.get_tmpfs_dir()
+                    )
+                )
             if rc != 0:
                 msg = f"Failed to run '{final_cmd}' (status={rc})."
                 raise ExecutorError(msg)
 
             # copy-out hook
+            self.notify_phase("copy-out")
             for src, dst in sorted(set(copy_out or []), key=lambda x: x[1]):
                 try:
-                    self.copy_out(source_path=src, destination_dir=dst)
+                    await self.copy_out_async(
+                        source_path=src, destination_dir=dst
+                    )
                 except ExecutorError as e:
                     # Ignore copy-out failure if requested
                     if isinstance(
@@ -188,8 +421,17 @@ class LocalExecutor(Executor):
                     raise e
         except ExecutorError as e:
             if self._temporary_dir.exists() and self._clean_on_error:
-                self.cleanup()
+                await asyncio.to_thread(self.cleanup)
             raise e
         else:
             if self._temporary_dir.exists() and self._clean:
-                self.cleanup()
+                await asyncio.to_thread(self.cleanup)
+        finally:
+            # the tmpfs is not left mounted when the builder directory is kept
+            if self._tmpfs_mounted:
+                await asyncio.to_thread(self.umount_tmpfs, keep=True)
+            usage["wall_time"] = time.monotonic() - start
+            self.add_resources(usage)
+
+    def run(self, *args, **kwargs):  # type: ignore
+        return self.run_until_complete(self.run_async(*args, **kwargs))
@@ -22,10 +22,16 @@ import re
 from typing import List, Optional
 
 from qubesbuilder.common import sanitize_line
-from qubesbuilder.executors import Executor, ExecutorError
+from qubesbuilder.executors import (
+    Executor,
+    ExecutorError,
+    InfrastructureError,
+)
 
+QREXEC_CLIENT_VM = "/usr/lib/qubes/qrexec-client-vm"
 
-def qrexec_call(
+
+async def qrexec_call_async(
     executor: Executor,
     what: str,
     vm: str,
@@ -36,9 +42,7 @@ def qrexec_call(
     echo: bool = True,
     ignore_errors: bool = False,
 ) -> bytes:
-    cmd = [
-        "/usr/lib/qubes/qrexec-client-vm",
-    ]
+    cmd = [QREXEC_CLIENT_VM]
 
     if options:
         cmd += options
@@ -54,13 +58,16 @@ def qrexec_call(
 
     admin = service.startswith("admin.")
     echo = echo and not admin
-    rc, stdout, stderr = executor.execute(
+    rc, stdout, stderr = await executor.execute_async(
         cmd, collect=True, stdin=stdin, echo=echo
     )
 
     if not ignore_errors and rc != 0:
         err = sanitize_line(stderr).rstrip() if stderr else ""
         msg = f"Failed to {what}: {err}qrexec call failed with code {rc}"
+        # failures of the Admin API are not caused by the job
+        if admin:
+            raise InfrastructureError(msg, name=vm)
         raise ExecutorError(msg, name=vm)
 
     if admin:
@@ -69,15 +76,41 @@ def qrexec_call(
 
             msg = f"Failed to {what}: qrexec call failed: {stdout.decode('ascii', 'strict')}"
             if not ignore_errors:
-                raise ExecutorError(msg)
+                raise InfrastructureError(msg)
             else:
                 executor.log.debug(msg)
         stdout = stdout[2:]
     return stdout
 
 
-def create_dispvm(executor: Executor, template: str) -> str:
-    stdout = qrexec_call(
+def qrexec_call(
+    executor: Executor,
+    what: str,
+    vm: str,
+    service: str,
+    args: Optional[List[str]] = None,
+    options: Optional[List[str]] = None,
+    stdin: bytes = b"",
+    echo: bool = True,
+    ignore_errors: bool = False,
+) -> bytes:
+    return executor.run_until_complete(
+        qrexec_call_async(
+            executor=executor,
+            what=what,
+            vm=vm,
+            service=service,
+            args=args,
+            options=options,
+            stdin=stdin,
+            echo=echo,
+            ignore_errors=ignore_errors,
+        )
+    )
+
+
+async def create_dispvm_async(executor: Executor, template: str) -> str:
+    stdout = await qrexec_call_async(
         executor=executor,
         what="create disposable qube",
         vm=template,
@@ -85,15 +118,19 @@ def create_dispvm(executor: Executor, template: str) -> str:
     )
 
     if not re.match(rb"\Adisp(0|[1-9][0-9]{0,8})\Z", stdout):
-        raise ExecutorError("Failed to create disposable qube.")
+        raise InfrastructureError("Failed to create disposable qube.")
     try:
         return stdout.decode("ascii", "strict")
     except UnicodeDecodeError as e:
         raise ExecutorError(f"Failed to obtain disposable qube name: {str(e)}")
 
 
-def start_vm(executor: Executor, vm: str):
-    qrexec_call(
+def create_dispvm(executor: Executor, template: str) -> str:
+    return executor.run_until_complete(create_dispvm_async(executor, template))
+
+
+async def start_vm_async(executor: Executor, vm: str):
+    await qrexec_call_async(
         executor=executor,
         what="start vm",
         vm=vm,
@@ -101,8 +138,12 @@ def start_vm(executor: Executor, vm: str):
     )
 
 
-def vm_state(executor: Executor, vm: str) -> str:
-    stdout = qrexec_call(
+def start_vm(executor: Executor, vm: str):
+    executor.run_until_complete(start_vm_async(executor, vm))
+
+
+async def vm_state_async(executor: Executor, vm: str) -> str:
+    stdout = await qrexec_call_async(
         executor=executor,
         what="query vm state",
         vm=vm,
@@ -120,8 +161,12 @@ def vm_state(executor: Executor, vm: str) -> str:
     )
 
 
-def kill_vm(executor: Executor, vm: str):
-    qrexec_call(
+def vm_state(executor: Executor, vm: str) -> str:
+    return executor.run_until_complete(vm_state_async(executor, vm))
+
+
+async def kill_vm_async(executor: Executor, vm: str):
+    await qrexec_call_async(
         executor=executor,
         what="kill vm",
         vm=vm,
@@ -130,10 +175,18 @@ def kill_vm(executor: Executor, vm: str):
     )
 
 
-def remove_vm(executor: Executor, vm: str):
-    qrexec_call(
+def kill_vm(executor: Executor, vm: str):
+    executor.run_until_complete(kill_vm_async(executor, vm))
+
+
+async def remove_vm_async(executor: Executor, vm: str):
+    await qrexec_call_async(
         executor=executor,
         what="remove vm",
         vm=vm,
         service="admin.vm.Remove",
     )
+
+
+def remove_vm(executor: Executor, vm: str):
+    executor.run_until_complete(remove_vm_async(executor, vm))
@@ -17,24 +17,33 @@
 # with this program. If not, see <https://www.gnu.org/licenses/>.
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
+import asyncio
+import atexit
 import os
 import re
 import shutil
-import subprocess
+import threading
+import time
+from collections import defaultdict
 from pathlib import Path, PurePath
 from shlex import quote
-from time import sleep
-from typing import List, Optional, Tuple, Union
-
-from qubesbuilder.common import sanitize_line, PROJECT_PATH
-from qubesbuilder.executors import Executor, ExecutorError
+from typing import Dict, List, Optional, Tuple, Union
+
+from qubesbuilder.common import sanitize_line, PROJECT_PATH, str_to_bool
+from qubesbuilder.executors import (
+    RUSAGE_WRAPPER,
+    Executor,
+    ExecutorError,
+    InfrastructureError,
+    parse_rusage,
+)
 from qubesbuilder.executors.qrexec import (
-    create_dispvm,
-    kill_vm,
-    qrexec_call,
-    remove_vm,
-    start_vm,
-    vm_state,
+    create_dispvm_async,
+    kill_vm_async,
+    qrexec_call_async,
+    remove_vm_async,
+    start_vm_async,
+    vm_state_async,
 )
 from qubesbuilder.executors.windows import BaseWindowsExecutor
 
@@ -59,14 +68,65 @@ def quote_and_list(cmds: List[List[Union[str, Path]]]) -> str:
     return " && ".join(map(quote_list, cmds))
 
 
+QVM_RUN_VM = "/usr/bin/qvm-run-vm"
+
+# File where the resources used by the command are written in the disposable.
+RUSAGE_FILE = "/tmp/qubesbuilder-rusage.json"
+
+
 def build_run_cmd(vm_name: str, cmd: List[Union[str, Path]]) -> List[str]:
-    return ["/usr/bin/qvm-run-vm", "--", vm_name, quote_list(cmd)]
+    return [QVM_RUN_VM, "--", vm_name, quote_list(cmd)]
+
+
+# Compressed copies are negotiated for each transfer: the service announces
+# on its first output line whether it can use the requested mode ('zstd') or
+# falls back to the regular qfile stream ('raw'). Copy-in trees are streamed
+# with 'tar --sparse' so that holes are not transferred. Copy-out keeps the
+# qfile stream, checked by qfile-unpacker, and only compresses its transport
+# as a sequence of zstd frames each preceded by its size on a line: sparse
+# files are expanded as with the regular stream and holes are only restored
+# with 'dig_holes'.
+COPY_COMPRESSIONS = ("zstd",)
+
+# Run as: bash -c COPY_IN_SENDER bash DIR NAME IGNORE_SYMLINKS QFILE_AGENT_CMD...
+COPY_IN_SENDER = """
+dir=$1 name=$2 ignore_symlinks=$3
+shift 3
+read -r mode || exit 1
+if [ "$mode" != zstd ]; then
+    exec "$@"
+fi
+set -o pipefail
+if [ "$ignore_symlinks" = 1 ]; then
+    # skip symbolic links as 'qfile-agent --ignore-symlinks'
+    (cd -- "$dir" && find "./$name" ! -type l -print0) |
+        tar -c --sparse --null --no-recursion -C "$dir" -T - |
+        zstd -T0 -q -c || exit 1
+else
+    tar -c --sparse -C "$dir" -- "$name" | zstd -T0 -q -c || exit 1
+fi
+exec >&-
+read -r status && [ "$status" = ok ]
+"""
+
+# Run as: bash -c COPY_OUT_RECEIVER bash QFILE_UNPACKER_CMD...
+COPY_OUT_RECEIVER = """
+read -r mode || exit 1
+if [ "$mode" != zstd ]; then
+    exec "$@"
+fi
+set -o pipefail
+while read -r size; do
+    [[ "$size" =~ ^[0-9]{1,10}$ ]] || exit 1
+    head -c "$size" | zstd -d -q -c || exit 1
+done | "$@"
+"""
 
 
 def build_run_cmd_and_list(
     vm_name: str, cmds: List[List[Union[str, Path]]]
 ) -> List[str]:
-    return ["/usr/bin/qvm-run-vm", "--", vm_name, quote_and_list(cmds)]
+    return [QVM_RUN_VM, "--", vm_name, quote_and_list(cmds)]
 
 
 class QubesExecutor(Executor):
@@ -80,6 +140,7 @@ class QubesExecutor(Executor):
         self.dispvm: Optional[str] = None  # actual dispvm name
         self.copy_in_service = "qubesbuilder.FileCopyIn"
         self.copy_out_service = "qubesbuilder.FileCopyOut"
+        self._copy_compression: Optional[str] = None
 
     def get_user(self):
         return "user"
@@ -87,7 +148,7 @@ class QubesExecutor(Executor):
     def get_group(self):
         return "user"
 
-    def copy_in(self, source_path: Path, destination_dir: PurePath, ignore_symlinks: bool = False):  # type: ignore
+    async def copy_in_async(self, source_path: Path, destination_dir: PurePath, ignore_symlinks: bool = False):  # type: ignore
         assert self.dispvm
         src = source_path.expanduser().resolve()
         dst = destination_dir
@@ -98,15 +159,32 @@ class QubesExecutor(Executor):
             args += ["--ignore-symlinks"]
         args += [str(src)]
 
-        qrexec_call(
+        service = f"{self.copy_in_service}+{encoded_dst_path}"
+        if self._copy_compression:
+            service = f"{self.copy_in_service}+{self._copy_compression}+{encoded_dst_path}"
+            args = [
+                "bash",
+                "-c",
+                COPY_IN_SENDER,
+                "bash",
+                str(src.parent),
+                src.name,
+                str(int(ignore_symlinks)),
+                *args,
+            ]
+
+        await qrexec_call_async(
             executor=self,
             what="copy-in",
             vm=self.dispvm,
-            service=f"{self.copy_in_service}+{encoded_dst_path}",
+            service=service,
             args=args,
         )
 
-    def copy_out(
+    def copy_in(self, *args, **kwargs):  # type: ignore
+        return self.run_until_complete(self.copy_in_async(*args, **kwargs))
+
+    async def copy_out_async(
         self,
         source_path: PurePath,
         destination_dir: Path,
@@ -133,37 +211,42 @@ class QubesExecutor(Executor):
         else:
             unpacker_path = old_unpacker_path
         encoded_src_path = encode_for_vmexec(str(src))
-        qrexec_call(
+        service = f"{self.copy_out_service}+{encoded_src_path}"
+        args = [
+            unpacker_path,
+            str(os.getuid()),
+            str(dst),
+        ]
+        if self._copy_compression:
+            service = f"{self.copy_out_service}+{self._copy_compression}+{encoded_src_path}"
+            args = ["bash", "-c", COPY_OUT_RECEIVER, "bash", *args]
+
+        await qrexec_call_async(
             executor=self,
             what="copy-out",
             vm=self.dispvm,
-            service=f"{self.copy_out_service}+{encoded_src_path}",
-            args=[
-                unpacker_path,
-                str(os.getuid()),
-                str(dst),
-            ],
+            service=service,
+            args=args,
         )
 
         if dig_holes and not dst_path.is_dir():
-            try:
-                self.log.debug(
-                    "copy-out (detect zeroes and replace with holes)"
-                )
-                subprocess.run(
-                    ["/usr/bin/fallocate", "-d", str(dst_path)], check=True
-                )
-            except subprocess.CalledProcessError as e:
-                if e.stderr is not None:
-                    content = sanitize_line(e.stderr.rstrip(b"\n")).rstrip()
-                else:
-                    content = str(e)
+            self.log.debug("copy-out (detect zeroes and replace with holes)")
+            rc, _, stderr = await self.execute_async(
+                ["/usr/bin/fallocate", "-d", str(dst_path)],
+                collect=True,
+                echo=False,
+            )
+            if rc != 0:
+                content = sanitize_line(stderr.rstrip(b"\n")).rstrip()
                 msg = f"Failed to dig holes in copy-out: {content}"
                 raise ExecutorError(msg, name=self.dispvm)
 
-    def copy_rpc_services(self):
+    def copy_out(self, *args, **kwargs):  # type: ignore
+        return self.run_until_complete(self.copy_out_async(*args, **kwargs))
+
+    async def copy_rpc_services_async(self):
         assert self.dispvm
-        qrexec_call(
+        await qrexec_call_async(
             executor=self,
             what="copy builder rpc services",
             vm=self.dispvm,
@@ -176,16 +259,19 @@ class QubesExecutor(Executor):
             options=["--filter-escape-chars-stderr"],
         )
 
-    def cleanup(self):
+    async def cleanup_async(self):
         if self.dispvm is None:
             return
 
-        state = vm_state(self, self.dispvm)
+        state = await vm_state_async(self, self.dispvm)
 
         if state != "Halted":
-            kill_vm(self, self.dispvm)
+            await kill_vm_async(self, self.dispvm)
         else:
-            remove_vm(self, self.dispvm)
+            await remove_vm_async(self, self.dispvm)
+
+    def cleanup(self):
+        self.run_until_complete(self.cleanup_async())
 
 
 class LinuxQubesExecutor(QubesExecutor):
@@ -194,7 +280,40 @@ class LinuxQubesExecutor(QubesExecutor):
     ):
         super().__init__(dispvm=dispvm, clean=clean, **kwargs)
 
-    def run(  # type: ignore
+        copy_compression = self._kwargs.get("copy_compression", "none")
+        if copy_compression not in ("none", *COPY_COMPRESSIONS):
+            raise ExecutorError(
+                f"Unknown copy compression '{copy_compression}'."
+            )
+        if copy_compression != "none":
+            if shutil.which("zstd") and shutil.which("tar"):
+                self._copy_compression = copy_compression
+            else:
+                self.log.warning(
+                    "Cannot find 'zstd' or 'tar', copying without compression."
+                )
+
+    async def run_async(self, *args, **kwargs):  # type: ignore
+        return await self.retry_async(self.run_once_async, *args, **kwargs)
+
+    async def get_resources_async(self) -> Dict[str, float]:
+        """
+        Read the resources used by the last command run in the disposable
+        qube. admin.vm.Stats is only available to dom0 and covers the whole
+        qube, so the command is wrapped to collect its own usage instead.
+        """
+        assert self.dispvm
+        rc, stdout, _ = await self.execute_async(
+            build_run_cmd(self.dispvm, ["cat", "--", RUSAGE_FILE]),
+            collect=True,
+            echo=False,
+        )
+        if rc != 0:
+            self.log.debug("Cannot get resources used by the command.")
+            return {}
+        return parse_rusage(stdout)
+
+    async def run_once_async(  # type: ignore
         self,
         cmd: List[str],
         copy_in: List[Tuple[Path, PurePath]] = None,
@@ -204,10 +323,12 @@ class LinuxQubesExecutor(QubesExecutor):
         no_fail_copy_out_allowed_patterns=None,
         dig_holes: bool = False,
     ):
+        start = time.monotonic()
+        usage: Dict[str, float] = {}
         try:
-            self.dispvm = create_dispvm(self, self._dispvm_template)
-            start_vm(self, self.dispvm)
-            self.copy_rpc_services()
+            self.dispvm = await create_dispvm_async(self, self._dispvm_template)
+            await start_vm_async(self, self.dispvm)
+            await self.copy_rpc_services_async()
 
             assert self.dispvm
             prep_cmd = build_run_cmd_and_list(
@@ -257,13 +378,16 @@ class LinuxQubesExecutor(QubesExecutor):
                     ],
                 ],
             )
-            subprocess.run(prep_cmd, stdin=subprocess.DEVNULL)
+            await self.execute_async(prep_cmd)
 
             # copy-in hook
+            self.notify_phase("copy-in")
             for src_in, dst_in in sorted(
                 set(copy_in or []), key=lambda x: x[1]
             ):
-                self.copy_in(source_path=src_in, destination_dir=dst_in)
+                await self.copy_in_async(
+                    source_path=src_in, destination_dir=dst_in
+                )
 
             # replace placeholders
             if files_inside_executor_with_placeholders and isinstance(
@@ -294,7 +418,10 @@ class LinuxQubesExecutor(QubesExecutor):
                     ]
                     + files,
                 )
-                subprocess.run(sed_cmd, stdin=subprocess.DEVNULL, check=True)
+                rc = await self.execute_async(sed_cmd)
+                if rc != 0:
+                    msg = f"Failed to replace placeholders (status={rc})."
+                    raise ExecutorError(msg, name=self.dispvm)
 
             bash_env = []
             if environment:
@@ -311,6 +438,10 @@ class LinuxQubesExecutor(QubesExecutor):
                     "env",
                     "--",
                     *bash_env,
+                    "python3",
+                    "-c",
+                    RUSAGE_WRAPPER,
+                    RUSAGE_FILE,
                     "bash",
                     "-c",
                     " && ".join(cmd),
@@ -321,17 +452,20 @@ class LinuxQubesExecutor(QubesExecutor):
             self.log.debug(" ".join(qvm_run_cmd))
 
             # stream output for command
-            rc = self.execute(qvm_run_cmd)
+            self.notify_phase("run")
+            rc = await self.execute_async(qvm_run_cmd)
+            usage = await self.get_resources_async()
             if rc != 0:
                 msg = f"Failed to run '{' '.join(qvm_run_cmd)}' (status={rc})."
                 raise ExecutorError(msg, name=self.dispvm)
 
             # copy-out hook
+            self.notify_phase("copy-out")
             for src_out, dst_out in sorted(
                 set(copy_out or []), key=lambda x: x[1]
             ):
                 try:
-                    self.copy_out(
+                    await self.copy_out_async(
                         source_path=src_out,
                         destination_dir=dst_out,
                         dig_holes=dig_holes,
@@ -351,13 +485,43 @@ class LinuxQubesExecutor(QubesExecutor):
                         )
                         continue
                     raise e
-        except (subprocess.CalledProcessError, ExecutorError) as e:
+        except ExecutorError as e:
             if self.dispvm and self._clean_on_error:
-                self.cleanup()
+                await self.cleanup_async()
             raise e
         else:
             if self.dispvm and self._clean:
-                self.cleanup()
+                await self.cleanup_async()
+        finally:
+            usage["wall_time"] = time.monotonic() - start
+            self.add_resources(usage)
+
+    def run(self, *args, **kwargs):  # type: ignore
+        return self.run_until_complete(self.run_async(*args, **kwargs))
+
+
+# Windows workers kept running between builds with the 'persistent-worker'
+# option, indexed by disposable template and EWDK image. A worker serves one
+# build at a time and is removed on exit.
+_windows_workers: Dict[Tuple[str, str], "WindowsQubesExecutor"] = {}
+_windows_workers_locks: Dict[Tuple[str, str], threading.Lock] = defaultdict(
+    threading.Lock
+)
+_windows_workers_lock = threading.Lock()
+
+
+def close_windows_workers():
+    with _windows_workers_lock:
+        workers = list(_windows_workers.values())
+        _windows_workers.clear()
+    for worker in workers:
+        try:
+            worker.cleanup()
+        except ExecutorError as e:
+            worker.log.error(f"Failed to remove worker '{worker.dispvm}': {e}")
+
+
+atexit.register(close_windows_workers)
 
 
 class WindowsQubesExecutor(BaseWindowsExecutor, QubesExecutor):
@@ -374,17 +538,23 @@ class WindowsQubesExecutor(BaseWindowsExecutor, QubesExecutor):
         )
         self.copy_in_service = "qubesbuilder.WinFileCopyIn"
         self.copy_out_service = "qubesbuilder.WinFileCopyOut"
+        persistent_worker = self._kwargs.get("persistent_worker", False)
+        self.persistent_worker = (
+            persistent_worker
+            if isinstance(persistent_worker, bool)
+            else str_to_bool(persistent_worker)
+        )
 
-    def start_worker(self):
-        self.dispvm = create_dispvm(self, self._dispvm_template)
+    async def start_worker_async(self):
+        self.dispvm = await create_dispvm_async(self, self._dispvm_template)
         self.log.debug(f"dispvm: {self.dispvm}")
-        self.attach_ewdk(self.dispvm, vm_running=False)
-        start_vm(self, self.dispvm)
+        await asyncio.to_thread(self.attach_ewdk, self.dispvm, vm_running=False)
+        await start_vm_async(self, self.dispvm)
 
         # wait for startup
         for _ in range(10):
             try:
-                qrexec_call(
+                await qrexec_call_async(
                     executor=self,
                     what="dispvm qrexec test",
                     vm=self.dispvm,
@@ -394,84 +564,187 @@ class WindowsQubesExecutor(BaseWindowsExecutor, QubesExecutor):
                 return  # all good
             except ExecutorError as e:
                 self.log.debug(f"VMShell failed: {e}")
-            sleep(5)
-        raise ExecutorError(
+            await asyncio.sleep(5)
+        raise InfrastructureError(
             f"Failed to communicate with windows dispvm '{self.dispvm}'"
         )
 
-    def run(
+    def start_worker(self):
+        self.run_until_complete(self.start_worker_async())
+
+    async def prepare_worker_async(self):
+        """
+        Start a worker qube and install the RPC services in it.
+        """
+        await self.start_worker_async()
+        # TODO: don't require two scripts per service
+        assert self.dispvm
+        await qrexec_call_async(
+            executor=self,
+            what="copy RPC services to dispvm",
+            vm=self.dispvm,
+            service="qubes.Filecopy",
+            args=[
+                "/usr/lib/qubes/qfile-agent",
+                str(PROJECT_PATH / "rpc" / "qubesbuilder.WinFileCopyIn"),
+                str(PROJECT_PATH / "rpc" / "qubesbuilder.WinFileCopyOut"),
+                str(PROJECT_PATH / "rpc" / "qubesbuilder-file-copy-in.ps1"),
+                str(PROJECT_PATH / "rpc" / "qubesbuilder-file-copy-out.ps1"),
+            ],
+        )
+
+        inc_dir = (
+            f"c:\\users\\{self.user}\\Documents\\QubesIncoming\\{self.name}"
+        )
+
+        prep_cmd = [
+            f"if not exist q:\\qubes-rpc mkdir q:\\qubes-rpc",
+            f"if not exist q:\\qubes-rpc-services mkdir q:\\qubes-rpc-services",
+            f'move /y "{inc_dir}\\qubesbuilder.WinFileCopyIn" "q:\\qubes-rpc\\"',
+            f'move /y "{inc_dir}\\qubesbuilder.WinFileCopyOut" "q:\\qubes-rpc\\"',
+            f'move /y "{inc_dir}\\qubesbuilder-file-copy-in.ps1" "q:\\qubes-rpc-services\\"',
+            f'move /y "{inc_dir}\\qubesbuilder-file-copy-out.ps1" "q:\\qubes-rpc-services\\"',
+        ]
+
+        await qrexec_call_async(
+            executor=self,
+            what="prepare RPC services in dispvm",
+            vm=self.dispvm,
+            service="qubes.VMShell",
+            stdin=(
+                " & ".join(prep_cmd) + " & exit !errorlevel!" + "\r\n"
+            ).encode("utf-8"),
+        )
+
+    async def wipe_worker_async(self):
+        """
+        Remove the workspace left in the worker qube by a previous build.
+        """
+        assert self.dispvm
+        await qrexec_call_async(
+            executor=self,
+            what="wipe workspace in dispvm",
+            vm=self.dispvm,
+            service="qubes.VMShell",
+            stdin=(
+                f'if exist "{self.get_builder_dir()}" rmdir /s /q "{self.get_builder_dir()}"'
+                + " & exit !errorlevel!"
+                + "\r\n"
+            ).encode("utf-8"),
+        )
+
+    async def build_async(
         self,
         cmd: List[str],
         copy_in: List[Tuple[Path, PurePath]] = None,
         copy_out: List[Tuple[PurePath, Path]] = None,
     ) -> str:
-        try:
-            # copy the rpc handlers
-            self.start_worker()
-            # TODO: don't require two scripts per service
-            assert self.dispvm
-            qrexec_call(
-                executor=self,
-                what="copy RPC services to dispvm",
-                vm=self.dispvm,
-                service="qubes.Filecopy",
-                args=[
-                    "/usr/lib/qubes/qfile-agent",
-                    str(PROJECT_PATH / "rpc" / "qubesbuilder.WinFileCopyIn"),
-                    str(PROJECT_PATH / "rpc" / "qubesbuilder.WinFileCopyOut"),
-                    str(PROJECT_PATH / "rpc" / "qubesbuilder-file-copy-in.ps1"),
-                    str(
-                        PROJECT_PATH / "rpc" / "qubesbuilder-file-copy-out.ps1"
-                    ),
-                ],
-            )
-
-            inc_dir = (
-                f"c:\\users\\{self.user}\\Documents\\QubesIncoming\\{self.name}"
-            )
+        assert self.dispvm
+        self.notify_phase("copy-in")
+        for src_in, dst_in in copy_in or []:
+            await self.copy_in_async(src_in, dst_in, ignore_symlinks=True)
 
-            prep_cmd = [
-                f"if not exist q:\\qubes-rpc mkdir q:\\qubes-rpc",
-                f"if not exist q:\\qubes-rpc-services mkdir q:\\qubes-rpc-services",
-                f'move /y "{inc_dir}\\qubesbuilder.WinFileCopyIn" "q:\\qubes-rpc\\"',
-                f'move /y "{inc_dir}\\qubesbuilder.WinFileCopyOut" "q:\\qubes-rpc\\"',
-                f'move /y "{inc_dir}\\qubesbuilder-file-copy-in.ps1" "q:\\qubes-rpc-services\\"',
-                f'move /y "{inc_dir}\\qubesbuilder-file-copy-out.ps1" "q:\\qubes-rpc-services\\"',
-            ]
+        bin_cmd = (" & ".join(cmd) + " & exit !errorlevel!" + "\r\n").encode(
+            "utf-8"
+        )
+        self.log.debug(f"{bin_cmd=}")
 
-            qrexec_call(
-                executor=self,
-                what="prepare RPC services in dispvm",
-                vm=self.dispvm,
-                service="qubes.VMShell",
-                stdin=(
-                    " & ".join(prep_cmd) + " & exit !errorlevel!" + "\r\n"
-                ).encode("utf-8"),
-            )
+        self.notify_phase("run")
+        stdout = await qrexec_call_async(
+            executor=self,
+            what="run command in dispvm",
+            vm=self.dispvm,
+            service="qubes.VMShell",
+            stdin=bin_cmd,
+        )
 
-            for src_in, dst_in in copy_in or []:
-                self.copy_in(src_in, dst_in, ignore_symlinks=True)
+        self.notify_phase("copy-out")
+        for src_out, dst_out in copy_out or []:
+            await self.copy_out_async(src_out, dst_out)
+        return stdout.decode("utf-8")
 
-            bin_cmd = (
-                " & ".join(cmd) + " & exit !errorlevel!" + "\r\n"
-            ).encode("utf-8")
-            self.log.debug(f"{bin_cmd=}")
+    async def run_on_worker_async(
+        self,
+        cmd: List[str],
+        copy_in: List[Tuple[Path, PurePath]] = None,
+        copy_out: List[Tuple[PurePath, Path]] = None,
+    ) -> str:
+        """
+        Run on the persistent worker of the disposable template, starting it
+        if needed. Builds wait for the worker to be available and the
+        workspace is wiped before each of them.
+        """
+        key = (self._dispvm_template, str(self.ewdk_path))
+        with _windows_workers_lock:
+            worker_lock = _windows_workers_locks[key]
+        await asyncio.to_thread(worker_lock.acquire)
+        try:
+            worker = _windows_workers.get(key)
+            if worker is not None:
+                self.dispvm = worker.dispvm
+                assert self.dispvm
+                if await vm_state_async(self, self.dispvm) != "Running":
+                    self.log.debug(f"worker '{self.dispvm}' is not running")
+                    del _windows_workers[key]
+                    await self.cleanup_async()
+                    worker = None
+            if worker is None:
+                self.dispvm = None
+                try:
+                    await self.prepare_worker_async()
+                except ExecutorError:
+                    await self.cleanup_async()
+                    raise
+                _windows_workers[key] = self
+            else:
+                self.log.debug(f"reusing worker '{self.dispvm}'")
+                await self.wipe_worker_async()
+            try:
+                return await self.build_async(cmd, copy_in, copy_out)
+            except ExecutorError:
+                # never reuse a worker left in an unknown state
+                _windows_workers.pop(key, None)
+                await self.cleanup_async()
+                raise
+        except ExecutorError as e:
+            raise self.get_run_error(e) from e
+        finally:
+            worker_lock.release()
+
+    def get_run_error(self, e: ExecutorError) -> ExecutorError:
+        suffix = f" in qube {self.dispvm}" if self.dispvm else ""
+        # keep infrastructure failures retryable
+        error = (
+            InfrastructureError
+            if isinstance(e, InfrastructureError)
+            else ExecutorError
+        )
+        return error(f"Failed to run command{suffix}: {str(e)}")
 
-            stdout = qrexec_call(
-                executor=self,
-                what="run command in dispvm",
-                vm=self.dispvm,
-                service="qubes.VMShell",
-                stdin=bin_cmd,
-            )
+    async def run_async(self, *args, **kwargs):  # type: ignore
+        return await self.retry_async(self.run_once_async, *args, **kwargs)
 
-            for src_out, dst_out in copy_out or []:
-                self.copy_out(src_out, dst_out)
-            return stdout.decode("utf-8")
-        except ExecutorError as e:
-            suffix = f" in qube {self.dispvm}" if self.dispvm else ""
-            raise ExecutorError(
-                f"Failed to run command{suffix}: {str(e)}"
-            ) from e
+    async def run_once_async(  # type: ignore
+        self,
+        cmd: List[str],
+        copy_in: List[Tuple[Path, PurePath]] = None,
+        copy_out: List[Tuple[PurePath, Path]] = None,
+    ) -> str:
+        # resources used on the Windows side are not available, only account
+        # for the wall time
+        start = time.monotonic()
+        try:
+            if self.persistent_worker:
+                return await self.run_on_worker_async(cmd, copy_in, copy_out)
+            try:
+                await self.prepare_worker_async()
+                return await self.build_async(cmd, copy_in, copy_out)
+            except ExecutorError as e:
+                raise self.get_run_error(e) from e
+            finally:
+                await self.cleanup_async()
         finally:
-            self.cleanup()
+            self.add_resources({"wall_time": time.monotonic() - start})
+
+    def run(self, *args, **kwargs) -> str:  # type: ignore
+        return self.run_until_complete(self.run_async(*args, **kwargs))
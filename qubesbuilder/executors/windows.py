@@ -18,11 +18,20 @@
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import asyncio
+import atexit
+import json
 import os
+import shutil
+import subprocess
+import tarfile
+import tempfile
+import threading
 from abc import ABC
-from pathlib import Path, PurePath, PureWindowsPath
-from time import sleep
-from typing import List, Optional, Tuple
+from collections import defaultdict
+from pathlib import Path, PurePath, PurePosixPath, PureWindowsPath
+from time import monotonic, sleep
+from typing import Dict, List, Optional, Set, Tuple, Union
 
 try:
     import qubesadmin
@@ -40,15 +49,84 @@ except ImportError:
     qubesadmin = None
     _QUBESADMIN_NEW_API = False
 
-from qubesbuilder.common import sha256sum
-from qubesbuilder.executors import Executor, ExecutorError
+from qubesbuilder.common import sha256sum, str_to_bool
+from qubesbuilder.executors import (
+    Executor,
+    ExecutorError,
+    InfrastructureError,
+    diff_manifest,
+    get_manifest,
+)
 from qubesbuilder.executors.qrexec import (
     create_dispvm,
     kill_vm as qkill_vm,
     start_vm,
-    vm_state,
+    start_vm_async,
+    vm_state_async,
+)
+
+COPY_MODES = ("scp", "tar")
+
+# Exit status of ssh when the connection fails, which remote commands may
+# also exit with. Failures of ssh itself are told apart by their messages.
+SSH_ERROR = 255
+SSH_ERROR_MESSAGES = (
+    "ssh:",
+    "Control socket",
+    "ControlSocket",
+    "mux_client",
+    "kex_exchange_identification",
+    "client_loop:",
+    "Connection closed by",
+    "Connection reset by",
 )
 
+# SSH connections are multiplexed through control masters shared by all the
+# executors of the process (see ControlMaster in ssh_config(5)). They are
+# closed on exit.
+_control_dir: Optional[str] = None
+_control_targets: Set[str] = set()
+_control_lock = threading.Lock()
+
+# EWDK images known to be present on remote hosts, indexed by host and remote
+# path, with the size and modification time of the local image transferred.
+_remote_ewdk: Dict[Tuple[str, str], Tuple[str, int, int]] = {}
+
+
+def get_control_path(target: str) -> str:
+    global _control_dir
+    with _control_lock:
+        if _control_dir is None:
+            _control_dir = tempfile.mkdtemp(prefix="qb-ssh-")
+        _control_targets.add(target)
+        return f"{_control_dir}/%C"
+
+
+def close_control_masters():
+    global _control_dir
+    with _control_lock:
+        if _control_dir is None:
+            return
+        for target in _control_targets:
+            subprocess.run(
+                [
+                    "ssh",
+                    "-o",
+                    f"ControlPath {_control_dir}/%C",
+                    "-O",
+                    "exit",
+                    target,
+                ],
+                stdin=subprocess.DEVNULL,
+                capture_output=True,
+            )
+        _control_targets.clear()
+        shutil.rmtree(_control_dir, ignore_errors=True)
+        _control_dir = None
+
+
+atexit.register(close_control_masters)
+
 
 class BaseWindowsExecutor(Executor, ABC):
     def __init__(
@@ -59,7 +137,7 @@ class BaseWindowsExecutor(Executor, ABC):
         self.user = user
 
     @staticmethod
-    def decode_win(data: bytes) -> str:
+    def decode_win(data: Union[bytes, bytearray]) -> str:
         return data.decode("utf-8", errors="replace")
 
     def get_builder_dir(self):
@@ -255,10 +333,27 @@ class SSHWindowsExecutor(BaseWindowsExecutor):
             raise ExecutorError(
                 "ewdk-mode 'attach' requires ssh-vm to be set: block-device attachment needs a qubes name"
             )
+        delta_copy_in = self._kwargs.get("delta_copy_in", False)
+        self.delta_copy_in = (
+            delta_copy_in
+            if isinstance(delta_copy_in, bool)
+            else str_to_bool(delta_copy_in)
+        )
+        control_master = self._kwargs.get("ssh_control_master", True)
+        self.control_master = (
+            control_master
+            if isinstance(control_master, bool)
+            else str_to_bool(control_master)
+        )
+        self.copy_mode = self._kwargs.get("copy_mode", "scp")
+        if self.copy_mode not in COPY_MODES:
+            raise ExecutorError(f"Unknown copy mode '{self.copy_mode}'.")
 
-    def _ssh_base_cmd(self) -> List[str]:
-        return [
-            "ssh",
+    def get_mirror_dir(self):
+        return PureWindowsPath("c:\\builder-mirror")
+
+    def _ssh_options(self) -> List[str]:
+        options = [
             "-i",
             self.key_path,
             "-o",
@@ -267,11 +362,29 @@ class SSHWindowsExecutor(BaseWindowsExecutor):
             "StrictHostKeyChecking accept-new",
             "-o",
             "ConnectTimeout 60",
-            f"{self.user}@{self.ip}",
         ]
+        if self.control_master:
+            options += [
+                "-o",
+                "ControlMaster auto",
+                "-o",
+                f"ControlPath {get_control_path(self._ssh_target())}",
+                "-o",
+                "ControlPersist 60",
+            ]
+        return options
 
-    def ssh_cmd(self, cmd: List[str]) -> str:
-        ret, stdout, stderr = self.execute(
+    def _ssh_target(self) -> str:
+        return f"{self.user}@{self.ip}"
+
+    def _ssh_base_cmd(self) -> List[str]:
+        return ["ssh", *self._ssh_options(), self._ssh_target()]
+
+    def _scp_base_cmd(self) -> List[str]:
+        return ["scp", *self._ssh_options(), "-B", "-q"]
+
+    async def ssh_cmd_async(self, cmd: List[str]) -> str:
+        ret, stdout, stderr = await self.execute_async(
             cmd=[
                 *self._ssh_base_cmd(),
                 "cmd",
@@ -283,63 +396,346 @@ class SSHWindowsExecutor(BaseWindowsExecutor):
             ],
             collect=True,
         )
+        if ret == SSH_ERROR and await self.ssh_failed_async(stderr):
+            raise InfrastructureError(
+                f"SSH connection failed for cmd {cmd}: {self.decode_win(stderr)}"
+            )
         if ret != 0:
             raise ExecutorError(
                 f"Failed to run SSH cmd {cmd}: {self.decode_win(stderr)}"
             )
         return self.decode_win(stdout)
 
-    def copy_in(self, source_path: Path, destination_dir: PurePath):
+    async def ssh_failed_async(self, stderr: bytes) -> bool:
+        """
+        Check if a command exiting with the ssh error status failed because
+        of ssh itself, as reported on its error output or, with a control
+        master, if it is not running anymore.
+        """
+        if any(
+            line.strip().startswith(SSH_ERROR_MESSAGES)
+            for line in self.decode_win(stderr).splitlines()
+        ):
+            return True
+        if self.control_master:
+            rc, _, _ = await self.execute_async(
+                [
+                    "ssh",
+                    *self._ssh_options(),
+                    "-O",
+                    "check",
+                    self._ssh_target(),
+                ],
+                collect=True,
+                echo=False,
+            )
+            return rc != 0
+        return False
+
+    def ssh_cmd(self, cmd: List[str]) -> str:
+        return self.run_until_complete(self.ssh_cmd_async(cmd))
+
+    async def copy_in_async(self, source_path: Path, destination_dir: PurePath):  # type: ignore
         src = str(source_path.expanduser().resolve())
         dst = str(destination_dir)
         self.log.debug(f"copy_in: {src} -> {dst}")
 
-        self.ssh_cmd(
+        await self.ssh_cmd_async(
             [
                 f'if not exist "{dst}" md "{dst}"',
             ]
         )
 
-        target = f"{self.user}@{self.ip}"
-        self.execute(
+        target = self._ssh_target()
+        await self.execute_async(
             [
-                "scp",
-                "-i",
-                self.key_path,
+                *self._scp_base_cmd(),
                 "-r",
-                "-B",
-                "-q",
                 src,
                 f"{target}:{dst}",
             ]
         )
 
-    def copy_out(self, source_path: PurePath, destination_dir: Path):
+    def copy_in(self, *args, **kwargs):  # type: ignore
+        return self.run_until_complete(self.copy_in_async(*args, **kwargs))
+
+    async def copy_out_async(self, source_path: PurePath, destination_dir: Path):  # type: ignore
         self.log.debug(f"copy_out: {source_path} -> {destination_dir}")
         src = str(source_path)
         dst = str(destination_dir.expanduser().resolve())
 
-        target = f"{self.user}@{self.ip}"
+        target = self._ssh_target()
         target_path = src.replace("\\", "/")
-        self.execute(
+        await self.execute_async(
             [
-                "scp",
-                "-i",
-                self.key_path,
+                *self._scp_base_cmd(),
                 "-r",
-                "-B",
-                "-q",
                 f"{target}:{target_path}",
                 dst,
             ]
         )
 
-    def _remote_file_exists(self, path: str) -> bool:
+    def copy_out(self, *args, **kwargs):  # type: ignore
+        return self.run_until_complete(self.copy_out_async(*args, **kwargs))
+
+    @staticmethod
+    def _write_tar(fd: int, entries: List[Tuple[Path, str]]):
+        with os.fdopen(fd, "wb") as f, tarfile.open(
+            fileobj=f, mode="w|", dereference=True
+        ) as tar:
+            for src, arcname in entries:
+                tar.add(src, arcname=arcname)
+
+    @staticmethod
+    def _read_tar(fd: int, entries: List[Tuple[str, Path]]):
+        with os.fdopen(fd, "rb") as f, tarfile.open(
+            fileobj=f, mode="r|"
+        ) as tar:
+            for member in tar:
+                for name, dst in entries:
+                    if member.name == name or member.name.startswith(
+                        f"{name}/"
+                    ):
+                        member.name = (
+                            PurePosixPath(name).name + member.name[len(name) :]
+                        )
+                        tar.extract(member, dst, filter="data")
+                        break
+
+    async def copy_in_tar_async(self, copy_in: List[Tuple[Path, PurePath]]):
+        """
+        Copy-in entries with a single tar stream extracted by the remote
+        'tar.exe' relative to the builder directory.
+        """
+        entries = []
+        for src_in, dst_in in copy_in:
+            src = src_in.expanduser().resolve()
+            target = PureWindowsPath(dst_in) / src.name
+            if not target.is_relative_to(self.get_builder_dir()):
+                await self.copy_in_async(src_in, dst_in)
+                continue
+            self.log.debug(f"copy_in (tar): {src} -> {target}")
+            arcname = target.relative_to(self.get_builder_dir()).as_posix()
+            entries.append((src, arcname))
+        if not entries:
+            return
+
+        await self.ssh_cmd_async(
+            [
+                f'if not exist "{self.get_builder_dir()}" md "{self.get_builder_dir()}"'
+            ]
+        )
+        cmd = [
+            *self._ssh_base_cmd(),
+            "tar",
+            "-x",
+            "-f",
+            "-",
+            "-C",
+            str(self.get_builder_dir()),
+        ]
+        read_fd, write_fd = os.pipe()
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=read_fd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+        except OSError:
+            os.close(write_fd)
+            raise
+        finally:
+            os.close(read_fd)
+        writer = asyncio.ensure_future(
+            asyncio.to_thread(self._write_tar, write_fd, entries)
+        )
+        _, stderr = await asyncio.gather(
+            self._read_stream(process.stdout, self.log.debug, False),
+            self._read_stream(process.stderr, self.log.debug, True),
+        )
+        rc = await process.wait()
+        try:
+            await writer
+        except OSError as e:
+            if rc == 0:
+                raise ExecutorError(f"Failed to copy-in (tar): {e}") from e
+        if rc != 0:
+            raise ExecutorError(
+                f"Failed to copy-in (tar): {self.decode_win(stderr)}"
+            )
+
+    async def copy_out_tar_async(self, copy_out: List[Tuple[PurePath, Path]]):
+        """
+        Copy-out entries with a single tar stream created by the remote
+        'tar.exe' relative to the builder directory.
+        """
+        entries = []
+        for src_out, dst_out in copy_out:
+            src = PureWindowsPath(src_out)
+            if not src.is_relative_to(self.get_builder_dir()):
+                await self.copy_out_async(src_out, dst_out)
+                continue
+            self.log.debug(f"copy_out (tar): {src} -> {dst_out}")
+            dst = dst_out.expanduser().resolve()
+            dst.mkdir(parents=True, exist_ok=True)
+            entries.append(
+                (src.relative_to(self.get_builder_dir()).as_posix(), dst)
+            )
+        if not entries:
+            return
+
+        cmd = [
+            *self._ssh_base_cmd(),
+            "tar",
+            "-c",
+            "-f",
+            "-",
+            "-C",
+            str(self.get_builder_dir()),
+            *[name for name, _ in entries],
+        ]
+        read_fd, write_fd = os.pipe()
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=write_fd,
+                stderr=asyncio.subprocess.PIPE,
+            )
+        except OSError:
+            os.close(read_fd)
+            raise
+        finally:
+            os.close(write_fd)
+        reader = asyncio.ensure_future(
+            asyncio.to_thread(self._read_tar, read_fd, entries)
+        )
+        stderr = await self._read_stream(process.stderr, self.log.debug, True)
+        rc = await process.wait()
+        try:
+            await reader
+        except (OSError, tarfile.TarError) as e:
+            if rc == 0:
+                raise ExecutorError(f"Failed to copy-out (tar): {e}") from e
+        if rc != 0:
+            raise ExecutorError(
+                f"Failed to copy-out (tar): {self.decode_win(stderr)}"
+            )
+
+    async def ssh_cmd_batch_async(self, cmd: List[str], size: int = 32):
+        # stay below cmd.exe command line length limit
+        for i in range(0, len(cmd), size):
+            await self.ssh_cmd_async(cmd[i : i + size])
+
+    def ssh_cmd_batch(self, cmd: List[str], size: int = 32):
+        self.run_until_complete(self.ssh_cmd_batch_async(cmd, size))
+
+    async def _read_manifests_async(self) -> Dict[str, Dict[str, List]]:
+        manifest = self.get_mirror_dir() / "manifest.json"
+        try:
+            out = await self._run_powershell_async(
+                f"if (Test-Path '{manifest}') {{ Get-Content -Raw '{manifest}' }}"
+            )
+            return json.loads(out) if out.strip() else {}
+        except (ExecutorError, ValueError):
+            self.log.debug("no usable manifest on remote host")
+            return {}
+
+    async def _write_manifests_async(
+        self, manifests: Dict[str, Dict[str, List]]
+    ):
+        await self.ssh_cmd_async(
+            [
+                f'if not exist "{self.get_mirror_dir()}" md "{self.get_mirror_dir()}"'
+            ]
+        )
+        with tempfile.TemporaryDirectory() as tmpdir:
+            manifest = Path(tmpdir) / "manifest.json"
+            manifest.write_text(json.dumps(manifests))
+            await self._scp_file_async(
+                manifest, str(self.get_mirror_dir() / "manifest.json")
+            )
+
+    async def copy_in_delta_async(self, copy_in: List[Tuple[Path, PurePath]]):
+        """
+        Copy-in through a mirror kept on the remote host: only new or changed
+        files are transferred and deleted ones are removed, based on the
+        manifest of what the mirror already contains. The mirror content is
+        then copied locally into the builder directory.
+        """
+        manifests = await self._read_manifests_async()
+        copy_cmd = []
+        mirrored = False
+        for src_in, dst_in in copy_in:
+            src = src_in.expanduser().resolve()
+            target = PureWindowsPath(dst_in) / src.name
+            if not target.is_relative_to(self.get_builder_dir()):
+                await self.copy_in_async(src_in, dst_in)
+                continue
+            mirror = self.get_mirror_dir() / target.relative_to(
+                self.get_builder_dir()
+            )
+            previous = manifests.get(str(target), {})
+            current = await asyncio.to_thread(get_manifest, src, previous)
+            changed, deleted = diff_manifest(previous, current)
+            self.log.debug(
+                f"copy_in (delta): {src} -> {target}: {len(changed)} changed, {len(deleted)} deleted"
+            )
+
+            deleted_paths = [
+                mirror.joinpath(*rel.split("/")) for rel in deleted
+            ]
+            await self.ssh_cmd_batch_async(
+                [f'if exist "{p}" del /f /q "{p}"' for p in deleted_paths]
+            )
+            groups: Dict[PureWindowsPath, List[str]] = defaultdict(list)
+            for rel in changed:
+                groups[mirror.joinpath(*rel.split("/")).parent].append(
+                    str(src.joinpath(*rel.split("/")))
+                )
+            await self.ssh_cmd_batch_async(
+                [f'if not exist "{d}" md "{d}"' for d in groups.keys()]
+            )
+            for remote_dir, files in groups.items():
+                remote_dir_fwd = str(remote_dir).replace("\\", "/")
+                rc = await self.execute_async(
+                    [
+                        *self._scp_base_cmd(),
+                        *files,
+                        f"{self._ssh_target()}:{remote_dir_fwd}/",
+                    ]
+                )
+                if rc != 0:
+                    raise ExecutorError(
+                        f"Failed to copy-in {src} to {remote_dir} (status={rc})."
+                    )
+            manifests[str(target)] = current
+            mirrored = True
+
+            if src.is_dir():
+                copy_cmd.append(
+                    f'xcopy "{mirror}" "{target}\\" /e /i /q /y /h /k >nul'
+                )
+            else:
+                copy_cmd += [
+                    f'if not exist "{target.parent}" md "{target.parent}"',
+                    f'copy /y "{mirror}" "{target}" >nul',
+                ]
+
+        if mirrored:
+            await self._write_manifests_async(manifests)
+        await self.ssh_cmd_batch_async(copy_cmd)
+
+    def copy_in_delta(self, copy_in: List[Tuple[Path, PurePath]]):
+        self.run_until_complete(self.copy_in_delta_async(copy_in))
+
+    async def _remote_file_exists_async(self, path: str) -> bool:
         """
         Check if a file exists on the remote Windows host.
         """
         try:
-            out = self._run_powershell(f"Test-Path '{path}'")
+            out = await self._run_powershell_async(f"Test-Path '{path}'")
             exists = out.strip().lower() == "true"
             self.log.debug(
                 f"remote file '{path}': {'found' if exists else 'not found'}"
@@ -351,40 +747,36 @@ class SSHWindowsExecutor(BaseWindowsExecutor):
             )
             return False
 
-    def _remote_sha256(self, path: str) -> Optional[str]:
+    async def _remote_sha256_async(self, path: str) -> Optional[str]:
         """
         Return the lowercase SHA256 hex digest of a file on the remote host, or None if unavailable.
         """
         try:
-            out = self._run_powershell(
+            out = await self._run_powershell_async(
                 f"(Get-FileHash '{path}' -Algorithm SHA256).Hash"
             )
             return out.strip().lower()
         except ExecutorError:
             return None
 
-    def _scp_file(self, local_path: Path, remote_path: str):
+    async def _scp_file_async(self, local_path: Path, remote_path: str):
         """
         SCP a single file to the remote host at the exact path specified.
         """
         remote_path_fwd = remote_path.replace("\\", "/")
-        self.execute(
+        await self.execute_async(
             [
-                "scp",
-                "-i",
-                self.key_path,
-                "-B",
-                "-q",
+                *self._scp_base_cmd(),
                 str(local_path),
-                f"{self.user}@{self.ip}:{remote_path_fwd}",
+                f"{self._ssh_target()}:{remote_path_fwd}",
             ]
         )
 
-    def _run_powershell(self, ps_script: str):
+    async def _run_powershell_async(self, ps_script: str):
         """
         Run a PowerShell script on the remote host.
         """
-        ret, stdout, stderr = self.execute(
+        ret, stdout, stderr = await self.execute_async(
             cmd=[
                 *self._ssh_base_cmd(),
                 "powershell",
@@ -401,7 +793,7 @@ class SSHWindowsExecutor(BaseWindowsExecutor):
             )
         return self.decode_win(stdout)
 
-    def setup_remote(self):
+    async def setup_remote_async(self):
         """
         Transfer and set up the EWDK ISO on the remote host.
         """
@@ -414,8 +806,21 @@ class SSHWindowsExecutor(BaseWindowsExecutor):
 
         remote_ewdk = f"c:\\Users\\{self.user}\\ewdk.iso"
 
+        # skip probing the remote image if this process already transferred
+        # or verified it, unless it cannot be mounted anymore
+        key = (self._ssh_target(), remote_ewdk)
+        stat = ewdk_iso.stat()
+        local = (str(ewdk_iso.resolve()), stat.st_size, stat.st_mtime_ns)
+        if _remote_ewdk.get(key) == local:
+            self.log.debug("EWDK ISO already present on remote host (cached)")
+            try:
+                await self._mount_ewdk_async(remote_ewdk)
+                return
+            except ExecutorError:
+                _remote_ewdk.pop(key, None)
+
         if self.ewdk_skip_checksum:
-            if self._remote_file_exists(remote_ewdk):
+            if await self._remote_file_exists_async(remote_ewdk):
                 self.log.debug(
                     "EWDK ISO already present on remote host (checksum skipped)"
                 )
@@ -423,10 +828,13 @@ class SSHWindowsExecutor(BaseWindowsExecutor):
                 self.log.debug(
                     "EWDK ISO not found on remote host, transferring"
                 )
-                self._scp_file(ewdk_iso, remote_ewdk)
+                await self._scp_file_async(ewdk_iso, remote_ewdk)
         else:
-            local_digest = sha256sum(ewdk_iso)
-            remote_digest = self._remote_sha256(remote_ewdk)
+            # hash the local image and the remote one concurrently
+            local_digest, remote_digest = await asyncio.gather(
+                asyncio.to_thread(sha256sum, ewdk_iso),
+                self._remote_sha256_async(remote_ewdk),
+            )
 
             if local_digest == remote_digest:
                 self.log.debug(
@@ -441,61 +849,94 @@ class SSHWindowsExecutor(BaseWindowsExecutor):
                     self.log.debug(
                         f"EWDK ISO checksum mismatch (local={local_digest},remote={remote_digest}), re-transferring"
                     )
-                self._scp_file(ewdk_iso, remote_ewdk)
+                await self._scp_file_async(ewdk_iso, remote_ewdk)
 
+        await self._mount_ewdk_async(remote_ewdk)
+        _remote_ewdk[key] = local
+
+    async def _mount_ewdk_async(self, remote_ewdk: str):
         # Mount the ISO if not already mounted (idempotent)
         self.log.debug("Ensuring EWDK ISO is mounted on remote host")
-        self._run_powershell(
+        await self._run_powershell_async(
             f"if (-not (Get-DiskImage -ImagePath '{remote_ewdk}').Attached) {{ Mount-DiskImage -ImagePath '{remote_ewdk}' }}"
         )
 
-    def start_worker(self):
+    def setup_remote(self):
+        self.run_until_complete(self.setup_remote_async())
+
+    async def start_worker_async(self):
         assert self.vm is not None
         self.log.debug(f"starting worker vm: {self.vm}")
 
-        state = vm_state(self, self.vm)
+        state = await vm_state_async(self, self.vm)
         self.log.debug(f"vm '{self.vm}' state: {state}")
         vm_running = state != "Halted"
 
         if self.ewdk_path and self.ewdk_mode == "attach" and not vm_running:
             # assign before start so the device is available at boot
-            self.attach_ewdk(self.vm, vm_running=False)
+            await asyncio.to_thread(self.attach_ewdk, self.vm, vm_running=False)
 
         if not vm_running:
-            start_vm(self, self.vm)
+            await start_vm_async(self, self.vm)
 
         # ensure connectivity
-        self.ssh_cmd(["exit 0"])
+        await self.ssh_cmd_async(["exit 0"])
 
         if self.ewdk_path and self.ewdk_mode == "attach" and vm_running:
-            self.attach_ewdk(self.vm, vm_running=True)
+            await asyncio.to_thread(self.attach_ewdk, self.vm, vm_running=True)
         elif self.ewdk_path and self.ewdk_mode == "copy":
-            self.setup_remote()
+            await self.setup_remote_async()
+
+    def start_worker(self):
+        self.run_until_complete(self.start_worker_async())
+
+    async def run_async(self, *args, **kwargs):  # type: ignore
+        return await self.retry_async(self.run_once_async, *args, **kwargs)
 
-    def run(
+    async def run_once_async(  # type: ignore
         self,
         cmd: List[str],
         copy_in: List[Tuple[Path, PurePath]] = None,
         copy_out: List[Tuple[PurePath, Path]] = None,
     ) -> str:
-        if self.vm is not None:
-            self.start_worker()
-        else:
-            self.setup_remote()
+        # resources used on the Windows side are not available, only account
+        # for the wall time
+        start = monotonic()
+        try:
+            if self.vm is not None:
+                await self.start_worker_async()
+            else:
+                await self.setup_remote_async()
 
-        # this executor doesn't use a dispvm, clear the build dir every time
-        self.ssh_cmd(
-            [
-                f'if exist "{self.get_builder_dir()}" rmdir /s /q "{self.get_builder_dir()}"'
-            ]
-        )
+            # this executor doesn't use a dispvm, clear the build dir every time
+            await self.ssh_cmd_async(
+                [
+                    f'if exist "{self.get_builder_dir()}" rmdir /s /q "{self.get_builder_dir()}"'
+                ]
+            )
 
-        for src_in, dst_in in copy_in or []:
-            self.copy_in(src_in, dst_in)
+            self.notify_phase("copy-in")
+            if self.delta_copy_in:
+                await self.copy_in_delta_async(copy_in or [])
+            elif self.copy_mode == "tar":
+                await self.copy_in_tar_async(copy_in or [])
+            else:
+                for src_in, dst_in in copy_in or []:
+                    await self.copy_in_async(src_in, dst_in)
+
+            self.notify_phase("run")
+            stdout = await self.ssh_cmd_async(cmd)
 
-        stdout = self.ssh_cmd(cmd)
+            self.notify_phase("copy-out")
+            if self.copy_mode == "tar":
+                await self.copy_out_tar_async(copy_out or [])
+            else:
+                for src_out, dst_out in copy_out or []:
+                    await self.copy_out_async(src_out, dst_out)
 
-        for src_out, dst_out in copy_out or []:
-            self.copy_out(src_out, dst_out)
+            return stdout
+        finally:
+            self.add_resources({"wall_time": monotonic() - start})
 
-        return stdout
+    def run(self, *args, **kwargs):  # type: ignore
+        return self.run_until_complete(self.run_async(*args, **kwargs))
@@ -17,13 +17,21 @@
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
 import heapq
+import threading
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
 from dataclasses import dataclass
-from typing import Optional, List
+from typing import Callable, Dict, List, Optional, Set, Tuple
 
 from qubesbuilder.common import STAGES
 from qubesbuilder.component import QubesComponent
 from qubesbuilder.distribution import QubesDistribution
 from qubesbuilder.exc import QubesBuilderError, ConfigError, ComponentError
+from qubesbuilder.log import QubesBuilderLogger
 from qubesbuilder.plugins import (
     JobReference,
     JobDependency,
@@ -224,6 +232,158 @@ class Pipeline:
         return result
 
 
+def get_ancestors(graph: dict) -> Dict[Plugin, Set[Plugin]]:
+    """
+    Get the jobs each job of a dependency graph depends on, directly or not.
+    """
+    ancestors: Dict[Plugin, Set[Plugin]] = {}
+
+    def visit(job):
+        if job not in ancestors:
+            ancestors[job] = set()
+            for dep in graph.get(job, []):
+                ancestors[job] |= {dep} | visit(dep)
+        return ancestors[job]
+
+    for job in graph:
+        visit(job)
+    return ancestors
+
+
+# Stages whose jobs for the same distribution share the local repository or
+# the signing and publishing state, even without a dependency between them.
+SHARED_DIST_STAGES = ("build", "sign", "publish", "upload")
+
+
+def shares_dist_state(job: Plugin, other: Plugin) -> bool:
+    """
+    Check whether two jobs of the same stage update the same distribution
+    state and must not run at the same time.
+    """
+    stage = getattr(job, "stage", None)
+    dist = getattr(job, "dist", None)
+    return (
+        stage in SHARED_DIST_STAGES
+        and dist is not None
+        and getattr(other, "stage", None) == stage
+        and getattr(other, "dist", None) == dist
+    )
+
+
+def run_jobs(
+    jobs: List[Plugin],
+    run_job: Callable[[Plugin], None],
+    graph: Optional[dict] = None,
+    overlap: bool = False,
+):
+    """
+    Run jobs in the given order.
+
+    With 'overlap', a job does not wait for the previous one to complete if
+    it does not depend on it: it is started as soon as the previous one
+    copies out its final outputs (see Plugin.notify_copy_out), so that its
+    inputs are copied in while the outputs of the previous job are copied
+    out. Jobs of the same stage and distribution sharing state (see
+    SHARED_DIST_STAGES) are never overlapped. At most two jobs are running
+    at the same time.
+    """
+    if not overlap or graph is None:
+        for job in jobs:
+            run_job(job)
+        return
+
+    ancestors = get_ancestors(graph)
+    running: List[Tuple[Plugin, Future, threading.Event]] = []
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        for job in jobs:
+            while len(running) > 1 or (running and running[0][1].done()):
+                running.pop(0)[1].result()
+            if running:
+                previous, future, copy_out = running[0]
+                if previous in ancestors.get(job, set()) or shares_dist_state(
+                    job, previous
+                ):
+                    running.pop(0)
+                    future.result()
+                else:
+                    copy_out.wait()
+                    if future.done():
+                        running.pop(0)
+                        future.result()
+
+            event = threading.Event()
+
+            def on_done(_: Future, event: threading.Event = event):
+                event.set()
+
+            callbacks = getattr(job, "copy_out_callbacks", None)
+            if isinstance(callbacks, list):
+                callbacks.append(event.set)
+            future = pool.submit(run_job, job)
+            future.add_done_callback(on_done)
+            running.append((job, future, event))
+
+        for _, future, _ in running:
+            future.result()
+
+
+def run_jobs_concurrently(
+    jobs: List[Plugin],
+    run_job: Callable[[Plugin], None],
+    graph: dict,
+    max_workers: int,
+):
+    """
+    Run jobs concurrently, at most 'max_workers' at the same time.
+
+    A job is started once the jobs it depends on are completed, in the given
+    order. A failure does not stop the other jobs but the jobs depending on
+    the failed one are skipped. Failures are reported once all jobs are done.
+    """
+    pending = list(jobs)
+    deps = {job: set(graph.get(job, [])).intersection(jobs) for job in jobs}
+    done: Set[Plugin] = set()
+    failed: Dict[Plugin, BaseException] = {}
+    skipped: List[Plugin] = []
+    running: Dict[Future, Plugin] = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while pending or running:
+            for job in list(pending):
+                if deps[job].intersection(failed) or any(
+                    dep in skipped for dep in deps[job]
+                ):
+                    pending.remove(job)
+                    skipped.append(job)
+                elif deps[job].issubset(done) and len(running) < max_workers:
+                    pending.remove(job)
+                    running[pool.submit(run_job, job)] = job
+            if not running:
+                if pending:
+                    raise PipelineError("cycle detected in job dependencies")
+                break
+            completed, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in completed:
+                job = running.pop(future)
+                error = future.exception()
+                if error is None:
+                    done.add(job)
+                else:
+                    failed[job] = error
+
+    if not failed:
+        return
+    if len(failed) == 1 and not skipped:
+        raise next(iter(failed.values()))
+    QubesBuilderLogger.error(f"{len(failed)} job(s) failed:")
+    for job, error in failed.items():
+        QubesBuilderLogger.error(f"  {job!r}: {str(error)}")
+    for job in skipped:
+        QubesBuilderLogger.error(f"  {job!r}: skipped (dependency failed)")
+    raise PipelineError(
+        f"{len(failed)} job(s) failed and {len(skipped)} skipped."
+    ) from next(iter(failed.values()))
+
+
 class JobFactory:
     def __init__(self, config):
         self.config = config
@@ -1,4 +1,8 @@
+import atexit
 import datetime
+import os
+import queue
+import threading
 from logging import (
     Formatter,
     StreamHandler,
@@ -9,6 +13,13 @@ from logging import (
     NOTSET,
     INFO,
 )
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, Set
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None  # type: ignore[assignment]
 
 from qubesbuilder.exc import QubesBuilderError
 
@@ -39,6 +50,14 @@ class ConsoleFormatter(Formatter):
         "reset": "\x1b[0m",
     }
 
+    level_colors = {
+        "DEBUG": "grey",
+        "INFO": "reset",
+        "WARNING": "yellow",
+        "ERROR": "red",
+        "CRITICAL": "red",
+    }
+
     def __init__(self, fmt=None, *args, **kwargs):
         if fmt is None:
             fmt = (
@@ -51,13 +70,7 @@ class ConsoleFormatter(Formatter):
 
     def format(self, record):
         result = super().format(record)
-        level_color = {
-            "DEBUG": "grey",
-            "INFO": "reset",
-            "WARNING": "yellow",
-            "ERROR": "red",
-            "CRITICAL": "red",
-        }.get(record.levelname, "reset")
+        level_color = self.level_colors.get(record.levelname, "reset")
         result = result.replace("$COLOR", self.colors[level_color])
         return result
 
@@ -73,6 +86,133 @@ def create_file_handler(log_file, **kwargs):
     return file_handler
 
 
+class BatchFileHandler(FileHandler):
+    """
+    A file handler only flushing when requested, optionally compressing
+    the log file with zstd.
+    """
+
+    def __init__(self, filename, mode="a", compression=None, delay=False):
+        if compression not in (None, "zstd"):
+            raise QubesBuilderError(
+                f"Unsupported log compression '{compression}'."
+            )
+        if compression == "zstd" and zstandard is None:
+            raise QubesBuilderError("Cannot find 'zstandard' on the system.")
+        self.compression = compression
+        super().__init__(filename, mode=mode, encoding="utf-8", delay=delay)
+
+    def _open(self):
+        if self.compression == "zstd":
+            # Appending creates a new frame, flushing ends the current block
+            # so content written so far can always be decompressed.
+            return zstandard.open(
+                self.baseFilename,
+                self.mode,
+                cctx=zstandard.ZstdCompressor(),
+                encoding=self.encoding,
+            )
+        return super()._open()
+
+    def flush(self):
+        # called by emit() for each record
+        pass
+
+    def flush_batch(self):
+        super().flush()
+
+
+class LogWriter(QueueListener):
+    """
+    Background thread writing queued records to their log files. Files are
+    flushed once the queue is drained.
+    """
+
+    def __init__(self):
+        self.log_queue: queue.Queue = queue.Queue()
+        super().__init__(self.log_queue)
+        self._lock = threading.Lock()
+        self._file_handlers: Dict[str, BatchFileHandler] = {}
+        self._dirty: Set[BatchFileHandler] = set()
+
+    def add_file(self, filename, compression=None):
+        with self._lock:
+            if filename not in self._file_handlers:
+                file_handler = BatchFileHandler(
+                    filename, compression=compression, delay=True
+                )
+                file_handler.setLevel(DEBUG)
+                file_handler.setFormatter(FileFormatter(datefmt=FileLogDateFmt))
+                self._file_handlers[filename] = file_handler
+
+    def is_running(self):
+        return self._thread is not None
+
+    def handle(self, item):
+        filename, record = item
+        file_handler = self._file_handlers[filename]
+        if record.levelno >= file_handler.level:
+            file_handler.handle(record)
+            self._dirty.add(file_handler)
+        if self.log_queue.empty():
+            for file_handler in self._dirty:
+                file_handler.flush_batch()
+            self._dirty.clear()
+
+    def stop(self):
+        if self.is_running():
+            super().stop()
+        with self._lock:
+            for file_handler in self._file_handlers.values():
+                file_handler.close()
+            self._file_handlers.clear()
+
+
+_log_writer: Optional[LogWriter] = None
+
+
+def get_log_writer():
+    global _log_writer
+    if _log_writer is None:
+        _log_writer = LogWriter()
+        _log_writer.start()
+        atexit.register(_log_writer.stop)
+    return _log_writer
+
+
+class QueueFileHandler(QueueHandler):
+    """
+    A handler passing records to the background log writer thread instead
+    of writing to the file from the logging thread.
+    """
+
+    def __init__(self, filename, compression=None):
+        self.baseFilename = os.path.abspath(filename)
+        self.log_writer = get_log_writer()
+        self.log_writer.add_file(self.baseFilename, compression=compression)
+        super().__init__(self.log_writer.queue)
+
+    def prepare(self, record):
+        # formatting is left to the writer thread
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        self.queue.put_nowait((self.baseFilename, record))
+
+    def flush(self):
+        # wait for records queued so far to be written
+        if self.log_writer.is_running():
+            self.log_writer.log_queue.join()
+
+
+def create_queue_file_handler(log_file, compression=None):
+    queue_handler = QueueFileHandler(log_file, compression=compression)
+    queue_handler.setLevel(DEBUG)
+    return queue_handler
+
+
 def create_console_handler(verbose, **kwargs):
     console_handler = StreamHandler(**kwargs)
     console_handler.setLevel(DEBUG if verbose else INFO)
@@ -94,7 +234,7 @@ def get_logger_name(name, plugin):
     return ".".join([name] + fname)
 
 
-def get_log_filename(plugin, logs_dir):
+def get_log_filename(plugin, logs_dir, compression=None):
     fname = [QubesBuilderTimeStamp]
     if getattr(plugin, "component", None) is not None:
         fname.append(plugin.component.name)
@@ -106,12 +246,18 @@ def get_log_filename(plugin, logs_dir):
     if getattr(plugin, "template", None) is not None:
         fname.append(plugin.template.name)
     log_fname = "-".join(fname)
-    return (logs_dir / log_fname).with_suffix(".log")
+    log_filename = (logs_dir / log_fname).with_suffix(".log")
+    if compression == "zstd":
+        log_filename = log_filename.with_suffix(".log.zst")
+    return log_filename
 
 
-def init_logger(verbose=False, log_file=None):
+def init_logger(
+    verbose=False, log_file=None, log_queue=False, log_compression=None
+):
     QubesBuilderLogger.setLevel(DEBUG)
     QubesBuilderLogger.set_log_file(log_file)
+    QubesBuilderLogger.set_log_queue(log_queue, log_compression)
     QubesBuilderLogger.addHandler(create_console_handler(verbose))
 
 
@@ -126,6 +272,9 @@ class QBLogger(Logger):
         # log_file will be set only if provided by cli option --log-file
         # for a global log file
         self._log_file = log_file
+        # per-job log files written by the background log writer
+        self._log_queue = False
+        self._log_compression = None
 
     def getChild(self, suffix, plugin=None):
         if plugin:
@@ -141,21 +290,38 @@ class QBLogger(Logger):
 
                 # Check if the given logger has a log file already
                 log_file = logger._log_file
+                log_queue = QubesBuilderLogger._log_queue
+                log_compression = QubesBuilderLogger._log_compression
                 if not log_file:
-                    log_file = get_log_filename(plugin, logs_dir)
+                    log_file = get_log_filename(
+                        plugin,
+                        logs_dir,
+                        compression=log_compression if log_queue else None,
+                    )
 
                 # Check if a FileHandler already exists for this logfile
                 existing_log_files = [
                     fh.baseFilename
                     for fh in logger.handlers
-                    if isinstance(fh, FileHandler)
+                    if isinstance(fh, (FileHandler, QueueFileHandler))
                 ]
                 # If not FileHandler already exists, create it
                 if str(log_file) not in existing_log_files:
                     logger._log_file = log_file
-                    file_handler = create_file_handler(
-                        logger._log_file, mode="a", delay=True
-                    )
+                    if log_queue:
+                        file_handler = create_queue_file_handler(
+                            logger._log_file,
+                            compression=(
+                                log_compression
+                                if logger._log_file
+                                != QubesBuilderLogger._log_file
+                                else None
+                            ),
+                        )
+                    else:
+                        file_handler = create_file_handler(
+                            logger._log_file, mode="a", delay=True
+                        )
                     logger.addHandler(file_handler)
             except Exception as e:
                 raise QubesBuilderError("Failed to initialize logger") from e
@@ -166,7 +332,15 @@ class QBLogger(Logger):
     def set_log_file(self, log_file):
         self._log_file = log_file
 
+    def set_log_queue(self, log_queue, log_compression=None):
+        self._log_queue = log_queue
+        self._log_compression = log_compression
+
     def get_log_file(self):
+        # make sure records queued so far are written
+        for handler in self.handlers:
+            if isinstance(handler, QueueFileHandler):
+                handler.flush()
         return self._log_file
 
 
@@ -17,6 +17,7 @@
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
 import enum
+from contextlib import contextmanager
 from dataclasses import dataclass
 from pathlib import Path, PurePosixPath
 from typing import List, Dict, Any, Optional, Callable
@@ -280,6 +281,37 @@ class Plugin:
         self.log = QubesBuilderLogger.getChild(self.name, self)
         self.executor = self.config.get_executor_from_config(stage, self)
         self.dependencies = []
+        # Called once the job copies out its final outputs, see
+        # notify_copy_out().
+        self.copy_out_callbacks: List[Callable[[], None]] = []
+
+    def notify_copy_out(self):
+        """
+        Notify that the job is copying out its final outputs: nothing else
+        is run in its executor afterwards.
+        """
+        for callback in list(self.copy_out_callbacks):
+            callback()
+
+    @contextmanager
+    def last_run(self, last: bool = True):
+        """
+        Notify the job copy-out when the executor run made in this block
+        enters its copy-out phase, if it is the last run of the job.
+        """
+        if not last:
+            yield
+            return
+
+        def on_phase(phase: str):
+            if phase == "copy-out":
+                self.notify_copy_out()
+
+        self.executor.phase_callbacks.append(on_phase)
+        try:
+            yield
+        finally:
+            self.executor.phase_callbacks.remove(on_phase)
 
     def update_placeholders(self, stage: str):
         self._placeholders.setdefault(stage, self.executor.get_placeholders())
@@ -400,6 +432,7 @@ class Plugin:
         log_file = self.log.get_log_file()
         if log_file:
             self.log.info(f"Log file: {log_file}")
+        self.executor.pop_resources()
         self.check_dependencies()
 
     def get_cache_dir(self) -> Path:
@@ -490,6 +523,12 @@ class Plugin:
         info: dict,
         artifacts_dir: Path,
     ):
+        # resources used by the executor for the runs of the job stage since
+        # its info was last saved
+        if stage == self.stage:
+            resources = self.executor.pop_resources()
+            if resources:
+                info = {**info, "resources": resources}
         artifacts_dir.mkdir(parents=True, exist_ok=True)
         try:
             with open(
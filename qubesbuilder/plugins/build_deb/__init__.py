@@ -339,14 +339,15 @@ class DEBBuildPlugin(BuildPlugin):
             ]
             # fmt: on
             try:
-                self.executor.run(
-                    cmd,
-                    copy_in,
-                    copy_out,
-                    environment=self.environment,
-                    no_fail_copy_out_allowed_patterns=["-dbgsym_"],
-                    files_inside_executor_with_placeholders=files_inside_executor_with_placeholders,
-                )
+                with self.last_run(directory == parameters["build"][-1]):
+                    self.executor.run(
+                        cmd,
+                        copy_in,
+                        copy_out,
+                        environment=self.environment,
+                        no_fail_copy_out_allowed_patterns=["-dbgsym_"],
+                        files_inside_executor_with_placeholders=files_inside_executor_with_placeholders,
+                    )
             except ExecutorError as e:
                 msg = f"{self.component}:{self.dist}:{directory}: Failed to build packages: {str(e)}"
                 errors, start_line = extract_lines_before(
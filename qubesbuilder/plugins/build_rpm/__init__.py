@@ -370,17 +370,18 @@ class RPMBuildPlugin(BuildPlugin):
                 f"{self.executor.get_build_dir()} {self.executor.get_build_dir()}/rpm {dist_tag} {self.dist.architecture}"
             ]
             try:
-                self.executor.run(
-                    cmd,
-                    copy_in,
-                    copy_out,
-                    environment=self.environment,
-                    no_fail_copy_out_allowed_patterns=[
-                        "-debugsource",
-                        "-debuginfo",
-                    ],
-                    files_inside_executor_with_placeholders=files_inside_executor_with_placeholders,
-                )
+                with self.last_run(build == parameters["build"][-1]):
+                    self.executor.run(
+                        cmd,
+                        copy_in,
+                        copy_out,
+                        environment=self.environment,
+                        no_fail_copy_out_allowed_patterns=[
+                            "-debugsource",
+                            "-debuginfo",
+                        ],
+                        files_inside_executor_with_placeholders=files_inside_executor_with_placeholders,
+                    )
             except ExecutorError as e:
                 msg = f"{self.component}:{self.dist}:{build}: Failed to build RPMs: {str(e)}."
                 errors, start_line = extract_lines_before(
@@ -17,23 +17,35 @@
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import hashlib
+import json
 import os.path
 import re
 import shlex
 import shutil
+import subprocess
 import tempfile
+import threading
 import urllib.parse
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from shlex import quote
-from typing import Any, List, Union
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
 
-from qubesbuilder.common import VerificationMode, get_archive_name
+from qubesbuilder.common import VerificationMode, get_archive_name, link_file
 from qubesbuilder.component import QubesComponent
-from qubesbuilder.exc import NoQubesBuilderFileError
+from qubesbuilder.exc import ComponentError, NoQubesBuilderFileError
 from qubesbuilder.executors import ExecutorError
 from qubesbuilder.executors.local import LocalExecutor
 from qubesbuilder.plugins import Plugin, PluginContext, PluginError
 
+# Timeout in seconds of the remote head check
+GIT_LS_REMOTE_TIMEOUT = 60
+
+# Verified objects are shared by fetch jobs running concurrently
+_verified_objects_lock = threading.Lock()
+
 
 class FetchError(PluginError):
     pass
@@ -100,22 +112,13 @@ class FetchPlugin(Plugin):
         copy_in = self.default_copy_in(
             executor.get_plugins_dir(), executor.get_sources_dir()
         )
-        for key_dir_str in self.config.get("key-dirs", []):
-            key_dir = Path(key_dir_str)
-            if not key_dir.is_absolute():
-                key_dir = self.config.get_conf_path().parent.joinpath(key_dir)
-            if not key_dir.is_dir():
-                self.log.warn(f"Key directory '{key_dir!s}' is not a directory")
-                continue
-            for key_file in key_dir.iterdir():
-                if key_file.suffix != ".asc":
-                    continue
-                copy_in += [
-                    (
-                        key_file,
-                        executor.get_plugins_dir() / "fetch/keys",
-                    )
-                ]
+        for key_file in self.get_key_dirs_files():
+            copy_in += [
+                (
+                    key_file,
+                    executor.get_plugins_dir() / "fetch/keys",
+                )
+            ]
 
         # Get GIT source for a given Qubes OS component
         get_sources_cmd = [
@@ -144,6 +147,45 @@ class FetchPlugin(Plugin):
         if self.component.fetch_versions_only:
             get_sources_cmd += ["--fetch-versions-only"]
 
+        # Verified objects are exported to the host-side git cache
+        git_cache = self.get_git_cache() if self.config.git_cache else None
+        if git_cache:
+            get_sources_cmd += [
+                "--git-cache-output",
+                str(executor.get_builder_dir() / "git-cache"),
+            ]
+            for rev in self.get_git_cache_revs(git_cache):
+                get_sources_cmd += ["--git-cache-known", rev]
+
+        # Tags and commits already verified with the same keys are not
+        # verified again
+        if self.config.verified_objects_cache:
+            verified_objects = self.get_verified_objects_path()
+            if verified_objects.exists():
+                copy_in += [(verified_objects, executor.get_builder_dir())]
+                get_sources_cmd += [
+                    "--verified-objects",
+                    str(executor.get_builder_dir() / verified_objects.name),
+                ]
+            get_sources_cmd += [
+                "--verified-objects-output",
+                str(executor.get_builder_dir() / "verified-objects-new.json"),
+            ]
+
+        # Temporary directory
+        temp_dir = Path(tempfile.mkdtemp(dir=self.config.temp_dir))
+
+        # Source information (commit hash, version tags and modules) is
+        # gathered and modules archives are created in the same executor
+        # run as the fetch. Modules are only known from the .qubesbuilder
+        # of the previously fetched sources at this point.
+        modules = []
+        if local_source_dir.exists():
+            try:
+                modules = self.get_parameters(self.stage).get("modules", [])
+            except ComponentError:
+                pass
+
         cmd = []
         copy_out = [(source_dir, self.config.sources_dir)]
 
@@ -155,6 +197,14 @@ class FetchPlugin(Plugin):
                 shutil.rmtree(str(local_source_dir))
             elif self.config.skip_git_fetch:
                 do_fetch = False
+            elif (
+                self.config.git_check_remote_head
+                and self.is_remote_head_unchanged(local_source_dir)
+            ):
+                self.log.info(
+                    f"{self.component}: remote head unchanged. Skipping git fetch."
+                )
+                do_fetch = False
             else:
                 self.log.info(
                     f"{self.component}: source already fetched. Updating."
@@ -165,12 +215,50 @@ class FetchPlugin(Plugin):
                 else:
                     copy_in += [(local_source_dir, executor.get_builder_dir())]
 
+        # On fresh clones, only objects missing from the git cache are
+        # downloaded. Updates use the objects of the existing sources.
+        if git_cache and not local_source_dir.exists():
+            copy_in += [(git_cache, executor.get_cache_dir() / "git")]
+            get_sources_cmd += [
+                "--git-cache",
+                str(executor.get_cache_dir() / "git" / git_cache.name),
+            ]
+
+        source_info = None
         if do_fetch:
             cmd += [
                 f"cd {str(executor.get_builder_dir())}",
                 " ".join(get_sources_cmd),
+                self.get_source_info_cmd(executor, modules),
             ]
-            executor.run(cmd, copy_in, copy_out, environment=self.environment)
+            copy_out += [(executor.get_builder_dir() / "source-info", temp_dir)]
+            if git_cache:
+                copy_out += [
+                    (executor.get_builder_dir() / "git-cache", temp_dir)
+                ]
+            if self.config.verified_objects_cache:
+                copy_out += [
+                    (
+                        executor.get_builder_dir()
+                        / "verified-objects-new.json",
+                        temp_dir,
+                    )
+                ]
+            try:
+                executor.run(
+                    cmd, copy_in, copy_out, environment=self.environment
+                )
+            except ExecutorError:
+                shutil.rmtree(temp_dir)
+                raise
+            source_info = temp_dir / "source-info"
+            if git_cache:
+                self.update_git_cache(git_cache, temp_dir / "git-cache")
+            if self.config.verified_objects_cache:
+                self.update_verified_objects(
+                    temp_dir / "verified-objects-new.json",
+                    local_source_dir,
+                )
 
         # Update parameters based on previously fetched sources as .qubesbuilder
         # is now available.
@@ -183,30 +271,42 @@ class FetchPlugin(Plugin):
 
         # Download and verify files given in .qubesbuilder
         if not self.config.get("skip-files-fetch", False):
-            for file in parameters.get("files", []):
-                if "url" in file:
-                    self.download_file(file, executor, distfiles_dir)
-                elif "git-url" in file:
-                    self.download_git_archive(file, executor, distfiles_dir)
-                else:
+            files = parameters.get("files", [])
+            for file in files:
+                if "url" not in file and "git-url" not in file:
                     msg = (
                         "'files' entries must have either url or git-url entry"
                     )
                     raise FetchError(msg)
+            # Files are downloaded concurrently in a single executor run
+            self.download_files(
+                [file for file in files if "url" in file],
+                executor,
+                distfiles_dir,
+            )
+            for file in files:
+                if "url" not in file:
+                    self.download_git_archive(file, executor, distfiles_dir)
 
         #
         # source hash and version tags determination
         #
 
-        # Temporary directory
-        temp_dir = Path(tempfile.mkdtemp(dir=self.config.temp_dir))
-
         # Keep existing fetch info if it is up-to-date
         source_hash = self.component.get_source_hash(force_update=True)
         old_info = self.get_artifacts_info(stage=self.stage, basename="source")
         if "source-hash" in old_info and old_info["source-hash"] == source_hash:
+            shutil.rmtree(temp_dir)
             return
 
+        # The source has not been fetched or the modules have changed with it
+        # (e.g. first fetch): get the source information in a separate run.
+        modules = parameters.get("modules", [])
+        if source_info is None or modules != self.get_source_info_modules(
+            source_info
+        ):
+            source_info = self.get_source_info(temp_dir, modules)
+
         # We store the fetched source hash as original reference to be compared
         # for any further modifications. Once the source is fetched, we may locally
         # modify the source for development and at prep stage we would need to recompute
@@ -214,187 +314,457 @@ class FetchPlugin(Plugin):
         info: dict[str, Any] = {
             "source-hash": source_hash,
         }
+        info.update(self.read_source_info(source_info, modules))
 
-        if self.config.get("git-run-inplace", False):
-            executor = LocalExecutor()
-            executor.log = self.log.getChild(self.stage)
-        else:
-            executor = self.executor
+        # Modules (formerly known as INCLUDED_SOURCES in Makefile.builder)
+        for module in info.get("modules", []):
+            archive = source_info / module["archive"]
+            distfile = distfiles_dir / module["archive"]
+            # module archives are named after their commit and shared by all
+            # components in the distfiles store
+            store_path = self.get_modules_store_dir() / module["archive"]
+            if archive.exists():
+                shutil.move(archive, distfile)
+            elif not distfile.exists() and not self.link_from_distfiles_store(
+                store_path, distfile
+            ):
+                msg = f"{self.component}: Failed to generate module archive '{module['archive']}'."
+                raise FetchError(msg)
+            if not store_path.exists():
+                self.store_in_distfiles_store(distfile, store_path)
 
-        # Source component directory inside executors
-        source_dir = executor.get_builder_dir() / self.component.name
+        if self.config.increment_devel_versions:
+            self.component.increment_devel_versions()
+
+        try:
+            self.save_artifacts_info(
+                stage=self.stage,
+                basename="source",
+                info=info,
+                artifacts_dir=self.get_component_artifacts_dir("fetch"),
+            )
+            # Clean temp_dir
+            shutil.rmtree(temp_dir)
+        except OSError as e:
+            msg = f"{self.component}: Failed to clean or create artifacts: {str(e)}."
+            raise FetchError(msg) from e
+
+    def get_remote_head(self) -> Optional[str]:
+        """
+        Get the commit of the component branch (or tag) on its remote.
+        """
+        try:
+            result = subprocess.run(
+                [
+                    "git",
+                    "ls-remote",
+                    "--",
+                    self.component.url,
+                    self.component.branch,
+                ],
+                check=True,
+                capture_output=True,
+                text=True,
+                timeout=GIT_LS_REMOTE_TIMEOUT,
+                env={**os.environ, "GIT_TERMINAL_PROMPT": "0"},
+            )
+        except (OSError, subprocess.SubprocessError) as e:
+            self.log.debug(
+                f"{self.component}: Failed to get remote head: {str(e)}."
+            )
+            return None
+        refs = {}
+        for line in result.stdout.splitlines():
+            commit, _, ref = line.partition("\t")
+            refs[ref] = commit
+        # peeled annotated tags first
+        for ref in (
+            f"refs/heads/{self.component.branch}",
+            f"refs/tags/{self.component.branch}^{{}}",
+            f"refs/tags/{self.component.branch}",
+        ):
+            if ref in refs:
+                return refs[ref]
+        return None
+
+    def is_remote_head_unchanged(self, local_source_dir: Path) -> bool:
+        """
+        Check whether the previously fetched source is clean and still at the
+        commit of the component branch on its remote.
+        """
+        try:
+            old_info = self.get_artifacts_info(
+                stage=self.stage, basename="source"
+            )
+        except ComponentError:
+            return False
+        commit_hash = old_info.get("git-commit-hash", None)
+        if not commit_hash:
+            return False
+        try:
+            local_head = subprocess.run(
+                ["git", "-C", str(local_source_dir), "rev-parse", "HEAD"],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout.strip()
+            status = subprocess.run(
+                [
+                    "git",
+                    "-C",
+                    str(local_source_dir),
+                    "status",
+                    "--porcelain",
+                    "--ignore-submodules=none",
+                ],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+        except (OSError, subprocess.CalledProcessError):
+            return False
+        if local_head != commit_hash or status:
+            return False
+        return self.get_remote_head() == commit_hash
+
+    def get_verified_objects_path(self) -> Path:
+        return self.config.cache_dir / "fetch" / "verified-objects.json"
+
+    def get_key_dirs_files(self) -> List[Path]:
+        """
+        Get the maintainers keys from key-dirs. They are added to the keys of
+        the fetch plugin and override the ones with the same name.
+        """
+        key_files = []
+        for key_dir_str in self.config.get("key-dirs", []):
+            key_dir = Path(key_dir_str)
+            if not key_dir.is_absolute():
+                key_dir = self.config.get_conf_path().parent.joinpath(key_dir)
+            if not key_dir.is_dir():
+                self.log.warn(f"Key directory '{key_dir!s}' is not a directory")
+                continue
+            for key_file in key_dir.iterdir():
+                if key_file.suffix != ".asc":
+                    continue
+                key_files.append(key_file)
+        return key_files
+
+    def get_keyring_digest(self) -> Optional[str]:
+        """
+        Get the digest of the maintainers keys used to verify the component,
+        as computed by get-and-verify-source.py, from the host key files.
+        """
+        keys: Dict[str, Path] = {}
+        keys_dir = self.manager.entities[self.name].directory / "keys"
+        if keys_dir.is_dir():
+            keys.update({p.name: p for p in keys_dir.iterdir()})
+        keys.update({p.name: p for p in self.get_key_dirs_files()})
+        digest = hashlib.sha256(b"maintainers")
+        for maintainer in sorted(self.component.maintainers):
+            key_file = keys.get(f"{maintainer}.asc")
+            if not key_file or not key_file.is_file():
+                return None
+            content = key_file.read_bytes()
+            digest.update(f"\0{key_file.name}\0{len(content)}\0".encode())
+            digest.update(content)
+        return digest.hexdigest()
+
+    def get_fetched_objects(self, source_dir: Path) -> Set[str]:
+        """
+        Get the objects verified when fetching the component sources: the
+        fetched commit and the tags pointing to it, as 'type:object id'.
+        """
+        try:
+            commit_hash = subprocess.run(
+                ["git", "-C", str(source_dir), "rev-parse", "HEAD^{commit}"],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout.strip()
+            tags = subprocess.run(
+                [
+                    "git",
+                    "-C",
+                    str(source_dir),
+                    "tag",
+                    f"--points-at={commit_hash}",
+                    "--format=%(if:equals=tag)%(objecttype)%(then)%(objectname)%(end)",
+                ],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout.split()
+        except (OSError, subprocess.CalledProcessError) as e:
+            self.log.debug(
+                f"{self.component}: Failed to get fetched objects: {str(e)}."
+            )
+            return set()
+        return {f"commit:{commit_hash}"} | {f"tag:{tag}" for tag in tags}
+
+    def update_verified_objects(
+        self, new_verified_objects: Path, source_dir: Path
+    ):
+        """
+        Add the tags and commits verified by the executor to the ones
+        already verified. Only the objects of the fetched sources are
+        accepted, for the keys of the component on the host.
+        """
+        try:
+            new = json.loads(new_verified_objects.read_text())
+        except (OSError, ValueError) as e:
+            self.log.warning(
+                f"{self.component}: Failed to read verified objects: {str(e)}."
+            )
+            return
+        if not isinstance(new, dict):
+            return
+        keyring_digest = self.get_keyring_digest()
+        if not keyring_digest:
+            return
+        # keyring digest:object type:object id -> signing key fingerprint
+        expected = {
+            f"{keyring_digest}:{obj}"
+            for obj in self.get_fetched_objects(source_dir)
+        }
+        new = {
+            key: value
+            for key, value in new.items()
+            if key in expected
+            and isinstance(value, str)
+            and re.fullmatch(r"[0-9A-Fa-f]{40}", value)
+        }
+        if not new:
+            return
+        path = self.get_verified_objects_path()
+        with _verified_objects_lock:
+            try:
+                verified = json.loads(path.read_text())
+            except (OSError, ValueError):
+                verified = {}
+            verified.update(new)
+            temp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}")
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                temp_path.write_text(json.dumps(verified, indent=2))
+                os.replace(temp_path, path)
+            except OSError as e:
+                temp_path.unlink(missing_ok=True)
+                self.log.warning(
+                    f"{self.component}: Failed to save verified objects: {str(e)}."
+                )
+
+    def get_git_cache(self) -> Optional[Path]:
+        """
+        Get the bare repository of the host-side git cache for the component.
+        It is shared by repositories with the same name (e.g. forks).
+        """
+        name = Path(urllib.parse.urlparse(self.component.url).path).name
+        name = re.sub(r"\.git$", "", name)
+        if not name:
+            return None
+        git_cache = self.config.cache_dir / "git" / f"{name}.git"
+        if not (git_cache / "objects").is_dir():
+            try:
+                subprocess.run(
+                    ["git", "init", "-q", "--bare", str(git_cache)],
+                    check=True,
+                    capture_output=True,
+                )
+            except (OSError, subprocess.CalledProcessError) as e:
+                self.log.warning(
+                    f"{self.component}: Failed to create git cache: {str(e)}."
+                )
+                return None
+        return git_cache
+
+    @staticmethod
+    def get_git_cache_revs(git_cache: Path) -> List[str]:
+        """
+        Get the revisions whose objects are in the git cache.
+        """
+        try:
+            return subprocess.run(
+                [
+                    "git",
+                    "-C",
+                    str(git_cache),
+                    "for-each-ref",
+                    "--format=%(objectname)",
+                    "refs/qb/",
+                ],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout.split()
+        except (OSError, subprocess.CalledProcessError):
+            return []
+
+    def update_git_cache(self, git_cache: Path, git_cache_output: Path):
+        """
+        Import in the git cache the objects exported by the executor.
+
+        Packs are indexed and checked on the host rather than fetched from
+        the untrusted repository. Only the verified HEAD is referenced.
+        """
+        head_file = git_cache_output / "HEAD"
+        if not head_file.exists():
+            return
+        try:
+            head = head_file.read_text().strip()
+            if not re.fullmatch(r"[0-9a-f]{40}|[0-9a-f]{64}", head):
+                raise ValueError(f"invalid commit '{head}'")
+            for pack in sorted(git_cache_output.glob("objects-*.pack")):
+                with open(pack, "rb") as f:
+                    subprocess.run(
+                        ["git", "index-pack", "--stdin", "--strict"],
+                        stdin=f,
+                        cwd=git_cache,
+                        check=True,
+                        capture_output=True,
+                    )
+            for cmd in [
+                ["update-ref", f"refs/qb/{self.component.name}", head],
+                ["gc", "--auto", "--quiet"],
+            ]:
+                subprocess.run(
+                    ["git", *cmd],
+                    cwd=git_cache,
+                    check=True,
+                    capture_output=True,
+                )
+        except (OSError, ValueError, subprocess.CalledProcessError) as e:
+            self.log.warning(
+                f"{self.component}: Failed to update git cache: {str(e)}."
+            )
+
+    def get_source_info_cmd(self, executor, modules: List[str]) -> str:
+        """
+        Command getting the source information and creating the modules
+        archives not available yet into the 'source-info' directory.
+        """
+        distfiles_dir = self.get_component_distfiles_dir()
+        cmd = [
+            executor.get_plugins_dir() / "fetch/scripts/get-source-info",
+            executor.get_builder_dir() / self.component.name,
+            executor.get_builder_dir() / "source-info",
+        ]
+        for module in modules:
+            cmd += ["--module", module]
+        archives: Set[str] = set()
+        archives_dirs = [distfiles_dir]
+        if not self.config.force_fetch:
+            archives_dirs.append(self.get_modules_store_dir())
+        for archives_dir in archives_dirs:
+            if archives_dir.exists():
+                archives.update(
+                    archive.name
+                    for archive in archives_dir.iterdir()
+                    if any(archive.name.startswith(f"{m}-") for m in modules)
+                )
+        for archive_name in sorted(archives):
+            cmd += ["--skip-archive", archive_name]
+        return quote_list(cmd)
+
+    def get_modules_store_dir(self) -> Path:
+        """
+        Modules archives shared by all components in the distfiles store.
+        """
+        return self.config.cache_dir / "distfiles" / "modules"
 
-        # Get git hash and tags
+    def get_source_info(self, temp_dir: Path, modules: List[str]) -> Path:
+        """
+        Get the source information of already fetched sources.
+        """
+        local_source_dir = self.config.sources_dir / self.component.name
         if self.config.get("git-run-inplace", False):
+            executor = LocalExecutor()
+            executor.log = self.log.getChild(self.stage)
+            source_dir = executor.get_builder_dir() / self.component.name
             cmd = [f"ln -s {local_source_dir} {source_dir}"]
             copy_in = []
         else:
+            executor = self.executor
             cmd = []
             copy_in = [(local_source_dir, executor.get_builder_dir())]
-        copy_out = [
-            (executor.get_builder_dir() / "hash", temp_dir),
-            (executor.get_builder_dir() / "vtags", temp_dir),
-        ]
-        cmd += [
-            quote_list(["cd", "--", executor.get_builder_dir()]),
-            quote_list(["git", "-C", source_dir, "rev-parse", "HEAD^{}"])
-            + " >> hash",
-            quote_list(
-                [
-                    "git",
-                    "-C",
-                    source_dir,
-                    "tag",
-                    "--points-at",
-                    "HEAD",
-                    "--list",
-                    "v*",
-                ]
-            )
-            + " >> vtags",
+        copy_in += [
+            (
+                self.manager.entities["fetch"].directory,
+                executor.get_plugins_dir(),
+            ),
         ]
-        self.log.debug(cmd)
+        source_info = temp_dir / "source-info"
+        if source_info.exists():
+            shutil.rmtree(source_info)
+        cmd += [self.get_source_info_cmd(executor, modules)]
+        copy_out = [(executor.get_builder_dir() / "source-info", temp_dir)]
         try:
             executor.run(cmd, copy_in, copy_out, environment=self.environment)
         except ExecutorError as e:
-            msg = (
-                f"{self.component}: Failed to get source hash information: {e}."
-            )
+            msg = f"{self.component}: Failed to get source information: {e}."
             raise FetchError(msg) from e
+        return source_info
+
+    def load_source_info(self, source_info: Path) -> dict:
+        try:
+            with open(source_info / "info.json") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            msg = f"{self.component}: Invalid source information."
+            raise FetchError(msg) from e
+        if not isinstance(data, dict):
+            msg = f"{self.component}: Invalid source information."
+            raise FetchError(msg)
+        return data
 
-        # Read git hash and vtags
-        with open(temp_dir / "hash") as f:
-            data = f.read().splitlines()
+    def get_source_info_modules(self, source_info: Path) -> List[str]:
+        modules = self.load_source_info(source_info).get("modules", [])
+        return [
+            m["name"] for m in modules if isinstance(m, dict) and "name" in m
+        ]
 
-        if not re.match(r"[\da-f]{40}", data[0]):
+    def read_source_info(self, source_info: Path, modules: List[str]) -> dict:
+        """
+        Read and validate the source information produced in the executor.
+        """
+        data = self.load_source_info(source_info)
+        info: dict[str, Any] = {}
+
+        commit_hash = data.get("git-commit-hash")
+        if not isinstance(commit_hash, str) or not re.match(
+            r"[\da-f]{40}", commit_hash
+        ):
             msg = f"{self.component}: Invalid git hash detected."
             raise FetchError(msg)
+        info["git-commit-hash"] = commit_hash
 
-        info["git-commit-hash"] = data[0]
         info["git-version-tags"] = []
-
-        with open(temp_dir / "vtags") as f:
-            data = f.read().splitlines()
-
-        for tag in data:
-            if not re.match("^v.*", tag):
+        for tag in data.get("git-version-tags", []):
+            if not isinstance(tag, str) or not re.match("^v.*", tag):
                 msg = f"{self.component}: Invalid git version tag detected."
                 raise FetchError(msg)
             info["git-version-tags"].append(tag)
 
-        # Modules (formerly known as INCLUDED_SOURCES in Makefile.builder)
-        modules = parameters.get("modules", [])
         if modules:
-            # Get git module hashes
-            if self.config.get("git-run-inplace", False):
-                cmd = [f"ln -s {local_source_dir} {source_dir}"]
-                copy_in = []
-            else:
-                cmd = []
-                copy_in = [(local_source_dir, executor.get_builder_dir())]
-            copy_out = [(executor.get_builder_dir() / "modules", temp_dir)]
-            cmd += [
-                quote_list(
-                    ["rm", "-f", "--", executor.get_builder_dir() / "modules"]
-                ),
-                quote_list(["cd", "--", executor.get_builder_dir()]),
-            ]
-            for module in modules:
-                cmd += [
-                    quote_list(
-                        ["git", "-C", source_dir / module, "rev-parse", "HEAD"]
-                    )
-                    + " >> modules",
-                ]
-            try:
-                executor.run(
-                    cmd, copy_in, copy_out, environment=self.environment
-                )
-            except ExecutorError as e:
-                msg = f"{self.component}: Failed to get source module information: {str(e)}."
-                raise FetchError(msg) from e
-
-            # Read package release name
-            with open(temp_dir / "modules") as f:
-                data = f.read().splitlines()
-            if len(data) != len(modules):
+            if self.get_source_info_modules(source_info) != modules:
                 msg = f"{self.component}: Invalid modules data."
                 raise FetchError(msg)
-
-            for commit_hash in data:
-                if not re.match("[0-9a-f]{40}", commit_hash):
+            info["modules"] = []
+            for module in data["modules"]:
+                commit_hash = module.get("hash")
+                if not isinstance(commit_hash, str) or not re.match(
+                    "[0-9a-f]{40}", commit_hash
+                ):
                     msg = f"{self.component}: Invalid module hash detected."
                     raise FetchError(msg)
-
-            info.update(
-                {
-                    "modules": [
-                        {"name": name, "hash": str(data[idx])}
-                        for idx, name in enumerate(modules)
-                    ],
-                }
-            )
-
-            #
-            # Create modules archives
-            #
-
-            executor = self.executor
-            source_dir = executor.get_builder_dir() / self.component.name
-
-            copy_in = [
-                (self.component.source_dir, executor.get_builder_dir()),
-                (
-                    self.manager.entities["fetch"].directory,
-                    executor.get_plugins_dir(),
-                ),
-            ]
-            copy_out = []
-            cmd = []
-            for module in info["modules"]:
-                module["archive"] = (
-                    f"{module['name']}-{module['hash'][0:16]}.tar.gz"
+                # the archive name is not taken from the executor
+                info["modules"].append(
+                    {
+                        "name": module["name"],
+                        "hash": commit_hash,
+                        "archive": f"{module['name']}-{commit_hash[0:16]}.tar.gz",
+                    }
                 )
-                copy_out += [
-                    (
-                        source_dir / module["name"] / module["archive"],
-                        distfiles_dir,
-                    ),
-                ]
-                cmd += [
-                    quote_list(
-                        [
-                            f"{executor.get_plugins_dir()}/fetch/scripts/create-archive",
-                            f"{source_dir}/{module['name']}",
-                            f"{module['archive']}",
-                            f"{module['name']}/",
-                        ]
-                    ),
-                ]
-
-            try:
-                executor.run(
-                    cmd, copy_in, copy_out, environment=self.environment
-                )
-            except ExecutorError as e:
-                msg = f"{self.component}: Failed to generate module archives: {str(e)}."
-                raise FetchError(msg) from e
-
-        if self.config.increment_devel_versions:
-            self.component.increment_devel_versions()
-
-        try:
-            self.save_artifacts_info(
-                stage=self.stage,
-                basename="source",
-                info=info,
-                artifacts_dir=self.get_component_artifacts_dir("fetch"),
-            )
-            # Clean temp_dir
-            shutil.rmtree(temp_dir)
-        except OSError as e:
-            msg = f"{self.component}: Failed to clean or create artifacts: {str(e)}."
-            raise FetchError(msg) from e
+        return info
 
     def download_git_archive(self, file, executor, distfiles_dir):
         repo_bn = os.path.basename(file["git-url"]).partition(".git")[0]
@@ -425,6 +795,11 @@ class FetchPlugin(Plugin):
                     f"{self.component}: file {archive_name} already downloaded. Skipping."
                 )
                 return
+        store_path = self.get_distfiles_store_path(file)
+        if self.link_from_distfiles_store(
+            store_path, distfiles_dir / archive_name
+        ):
+            return
         copy_in = [
             (
                 self.manager.entities["fetch"].directory,
@@ -471,29 +846,48 @@ class FetchPlugin(Plugin):
             executor.run(cmd, copy_in, copy_out, environment=self.environment)
         except ExecutorError as e:
             raise FetchError(f"Failed to download file '{file}': {str(e)}.")
+        self.store_in_distfiles_store(distfiles_dir / archive_name, store_path)
+
+    @staticmethod
+    def get_file_names(file: dict):
+        """
+        Get the name of a downloaded file and its final name, without the
+        archive suffix if the file is requested to be uncompressed.
+        """
+        parsed_url = urllib.parse.urlparse(file["url"])
+        fn = str(os.path.basename(parsed_url.geturl()))
+        if file.get("uncompress", False):
+            return fn, Path(fn).with_suffix("").name
+        return fn, fn
 
     def download_file(self, file, executor, distfiles_dir):
-        # Temporary dir for downloaded file
-        temp_dir = Path(tempfile.mkdtemp(dir=self.config.temp_dir))
+        self.download_files([file], executor, distfiles_dir)
+
+    def download_files(self, files, executor, distfiles_dir):
         #
         # download
         #
-        parsed_url = urllib.parse.urlparse(file["url"])
-        fn = str(os.path.basename(parsed_url.geturl()))
-        # If we request to uncompress the file we drop the archive suffix
-        if file.get("uncompress", False):
-            final_fn = Path(fn).with_suffix("").name
-        else:
-            final_fn = fn
-        untrusted_final_fn = "untrusted_" + final_fn
-        if (distfiles_dir / final_fn).exists():
-            if self.config.force_fetch:
-                os.remove(distfiles_dir / final_fn)
-            else:
-                self.log.info(
-                    f"{self.component}: file {final_fn} already downloaded. Skipping."
-                )
-                return
+        pending = []
+        for file in files:
+            _, final_fn = self.get_file_names(file)
+            if (distfiles_dir / final_fn).exists():
+                if self.config.force_fetch:
+                    os.remove(distfiles_dir / final_fn)
+                else:
+                    self.log.info(
+                        f"{self.component}: file {final_fn} already downloaded. Skipping."
+                    )
+                    continue
+            if self.link_from_distfiles_store(
+                self.get_distfiles_store_path(file), distfiles_dir / final_fn
+            ):
+                continue
+            pending.append(file)
+        if not pending:
+            return
+
+        # Temporary dir for downloaded files
+        temp_dir = Path(tempfile.mkdtemp(dir=self.config.temp_dir))
         copy_in = [
             (
                 self.manager.entities["fetch"].directory,
@@ -502,40 +896,76 @@ class FetchPlugin(Plugin):
             (self.component.source_dir, executor.get_builder_dir()),
         ]
         source_dir = executor.get_builder_dir() / self.component.name
-        copy_out = [(source_dir / untrusted_final_fn, temp_dir)]
-        # Construct command for "download-file".
-        download_cmd = [
-            str(executor.get_plugins_dir() / "fetch/scripts/download-file"),
-            "--output-dir",
-            str(executor.get_builder_dir() / self.component.name),
-            "--file-name",
-            fn,
-            "--file-url",
-            file["url"],
-        ]
-        if file.get("signature", None):
-            download_cmd += ["--signature-url", file["signature"]]
-            signature_fn = os.path.basename(file["signature"])
-            untrusted_signature_fn = "untrusted_" + signature_fn
-            copy_out += [
-                (
-                    executor.get_builder_dir()
-                    / self.component.name
-                    / untrusted_signature_fn,
-                    temp_dir,
-                )
+        copy_out = []
+        download_cmds = []
+        for file in pending:
+            fn, final_fn = self.get_file_names(file)
+            copy_out += [(source_dir / f"untrusted_{final_fn}", temp_dir)]
+            # Construct command for "download-file".
+            download_cmd = [
+                str(executor.get_plugins_dir() / "fetch/scripts/download-file"),
+                "--output-dir",
+                str(executor.get_builder_dir() / self.component.name),
+                "--file-name",
+                fn,
+                "--file-url",
+                file["url"],
+            ]
+            if file.get("signature", None):
+                download_cmd += ["--signature-url", file["signature"]]
+                signature_fn = os.path.basename(file["signature"])
+                copy_out += [
+                    (source_dir / f"untrusted_{signature_fn}", temp_dir)
+                ]
+            if file.get("uncompress", False):
+                download_cmd += ["--uncompress"]
+            download_cmds.append(" ".join(map(shlex.quote, download_cmd)))
+        if len(download_cmds) == 1:
+            cmd = download_cmds
+        else:
+            # Run downloads in background and wait for all of them. The
+            # subshell keeps them after the commands joined by the executor.
+            background_cmd = [
+                f"{download_cmd} & pid{i}=$!"
+                for i, download_cmd in enumerate(download_cmds)
+            ]
+            wait_cmd = [f"wait $pid{i} || rc=1" for i in range(len(pending))]
+            cmd = [
+                f"({'; '.join(background_cmd + ['rc=0'] + wait_cmd)}; exit $rc)"
             ]
-        if file.get("uncompress", False):
-            download_cmd += ["--uncompress"]
-        cmd = [" ".join(map(shlex.quote, download_cmd))]
         try:
             executor.run(cmd, copy_in, copy_out, environment=self.environment)
         except ExecutorError as e:
             shutil.rmtree(temp_dir)
-            raise FetchError(f"Failed to download file '{file}': {str(e)}.")
+            files_str = ", ".join(str(file) for file in pending)
+            raise FetchError(f"Failed to download files {files_str}: {str(e)}.")
+
         #
         # verify
         #
+        try:
+            if len(pending) == 1:
+                self.verify_file(pending[0], executor, temp_dir, distfiles_dir)
+            else:
+                with ThreadPoolExecutor(max_workers=len(pending)) as pool:
+                    futures = [
+                        pool.submit(
+                            self.verify_file,
+                            file,
+                            executor,
+                            temp_dir,
+                            distfiles_dir,
+                        )
+                        for file in pending
+                    ]
+                    for future in futures:
+                        future.result()
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def verify_file(self, file, executor, temp_dir, distfiles_dir):
+        _, final_fn = self.get_file_names(file)
+        untrusted_final_fn = "untrusted_" + final_fn
         # Keep executor workflow if we move verification of files in another
         # cage type (copy-in, copy-out and cmd would need adjustments).
         if isinstance(executor, LocalExecutor):
@@ -546,7 +976,7 @@ class FetchPlugin(Plugin):
             local_executor = LocalExecutor()
         local_executor.log = self.log.getChild("fetch")
 
-        copy_in = []
+        copy_in: List[Tuple[Path, Path]] = []
         copy_out = [(temp_dir / final_fn, distfiles_dir)]
         # Construct command for "verify-file".
         verify_cmd = [
@@ -600,8 +1030,76 @@ class FetchPlugin(Plugin):
             )
         except ExecutorError as e:
             raise FetchError(f"Failed to verify file '{file}': {str(e)}.")
-        finally:
-            shutil.rmtree(temp_dir)
+        self.store_in_distfiles_store(
+            distfiles_dir / final_fn, self.get_distfiles_store_path(file)
+        )
+
+    def get_distfiles_store_path(self, file: dict) -> Optional[Path]:
+        """
+        Get the path of a file in the content-addressed distfiles store shared
+        by all components. Files are keyed by their expected checksum and git
+        archives by their commit id. Files only verified by a signature and
+        git archives of a tag are not known before being downloaded.
+        """
+        store_dir = self.config.cache_dir / "distfiles"
+        if "url" in file:
+            for algo, length in (("sha256", 64), ("sha512", 128)):
+                if not file.get(algo, None):
+                    continue
+                try:
+                    digest = (
+                        (self.component.source_dir / file[algo])
+                        .read_text()
+                        .strip()
+                        .lower()
+                    )
+                except OSError:
+                    return None
+                if not re.fullmatch(rf"[0-9a-f]{{{length}}}", digest):
+                    return None
+                return store_dir / algo / digest
+        elif "git-url" in file and "commit-id" in file:
+            # the archive name holds its prefix and compression
+            return (
+                store_dir / "git" / file["commit-id"] / get_archive_name(file)
+            )
+        return None
+
+    def link_from_distfiles_store(
+        self, store_path: Optional[Path], distfile: Path
+    ) -> bool:
+        """
+        Link a file already verified for any component from the distfiles
+        store. Return True if the distfile is now available.
+        """
+        if not store_path or self.config.force_fetch or not store_path.exists():
+            return False
+        try:
+            link_file(store_path, distfile)
+        except OSError as e:
+            self.log.warning(
+                f"{self.component}: Failed to link {distfile.name} from distfiles store: {str(e)}."
+            )
+            return False
+        self.log.info(
+            f"{self.component}: file {distfile.name} found in distfiles store. Skipping."
+        )
+        return True
+
+    def store_in_distfiles_store(
+        self, distfile: Path, store_path: Optional[Path]
+    ):
+        """
+        Add a verified distfile to the distfiles store.
+        """
+        if not store_path or not distfile.exists():
+            return
+        try:
+            link_file(distfile, store_path)
+        except OSError as e:
+            self.log.warning(
+                f"{self.component}: Failed to add {distfile.name} to distfiles store: {str(e)}."
+            )
 
 
 PLUGINS = [FetchPlugin]
@@ -20,13 +20,15 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 import argparse
+import hashlib
+import json
 import os
 import re
 import shutil
 import subprocess
 import sys
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Optional
 
 
 def verify_git_obj(gpg_client, keyring_dir, repository_dir, obj_type, obj_path):
@@ -78,6 +80,189 @@ def verify_git_obj(gpg_client, keyring_dir, repository_dir, obj_type, obj_path):
         print(f"ERROR: {e!r}; stderr: {e.stderr}")
 
 
+def init_keyring(
+    gpg_client: str,
+    git_keyring_dir: Path,
+    keys_dir: Path,
+    maintainers: List[str],
+    trust_all_keys: bool,
+):
+    """
+    Import and trust the keys of the maintainers (or all keys) in the
+    keyring used to verify tags and commits.
+    """
+    env = os.environ.copy()
+    env["GNUPGHOME"] = str(git_keyring_dir)
+    git_keyring_dir.mkdir(parents=True, exist_ok=True)
+    git_keyring_dir.chmod(0o700)
+    # We request a list to init the keyring. It looks like it does
+    # not do it on first import, so we just show available keys.
+    subprocess.run(
+        [gpg_client, "--list-keys"],
+        capture_output=True,
+        check=True,
+        env=env,
+    )
+    if trust_all_keys:
+        for file in keys_dir.glob("*"):
+            subprocess.run(
+                [gpg_client, "--import", str(file)],
+                check=True,
+                env=env,
+                capture_output=True,
+            )
+        list_keys = subprocess.run(
+            [gpg_client, "--list-keys", "--with-colons"],
+            capture_output=True,
+            check=True,
+            env=env,
+        )
+        for line in list_keys.stdout.splitlines():
+            if not line.startswith(b"fpr:"):
+                continue
+            keyid = line.decode().split(":")[9]
+            subprocess.run(
+                [gpg_client, "--import-ownertrust"],
+                input=f"{keyid}:6:\n",
+                capture_output=True,
+                text=True,
+                env=env,
+                check=True,
+            )
+
+    for keyid in maintainers:
+        key_path = keys_dir / f"{keyid}.asc"
+        if not key_path.exists():
+            raise ValueError(f"Cannot find {key_path}")
+        subprocess.run(
+            [gpg_client, "--import", keys_dir / f"{keyid}.asc"],
+            check=True,
+            env=env,
+            capture_output=True,
+        )
+        subprocess.run(
+            [gpg_client, "--import-ownertrust"],
+            input=f"{keyid}:6:\n",
+            capture_output=True,
+            text=True,
+            env=env,
+            check=True,
+        )
+
+    subprocess.run(
+        ["gpgconf", "--kill", "gpg-agent"], check=True, capture_output=True
+    )
+
+
+def get_keyring_digest(
+    keys_dir: Path, maintainers: List[str], trust_all_keys: bool
+) -> str:
+    """
+    Get a digest of the keys trusted for the verification. Any change to the
+    keys invalidates the previously verified objects.
+    """
+    if trust_all_keys:
+        key_files = sorted(p for p in keys_dir.glob("*") if p.is_file())
+    else:
+        key_files = []
+        for keyid in sorted(maintainers):
+            key_path = keys_dir / f"{keyid}.asc"
+            if not key_path.exists():
+                raise ValueError(f"Cannot find {key_path}")
+            key_files.append(key_path)
+    digest = hashlib.sha256()
+    digest.update(b"trust-all-keys" if trust_all_keys else b"maintainers")
+    for key_file in key_files:
+        content = key_file.read_bytes()
+        digest.update(f"\0{key_file.name}\0{len(content)}\0".encode())
+        digest.update(content)
+    return digest.hexdigest()
+
+
+def load_verified_objects(path: Optional[Path]) -> Dict[str, str]:
+    """
+    Load objects previously verified as 'keyring digest:type:object id'
+    mapped to the fingerprint of the key that signed them.
+    """
+    if not path or not path.exists():
+        return {}
+    try:
+        data = json.loads(path.read_text())
+    except (OSError, ValueError) as e:
+        print(f"WARNING: Cannot load verified objects: {str(e)}")
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    return {k: v for k, v in data.items() if isinstance(v, str)}
+
+
+def use_git_cache(repo: Path, git_cache: Path):
+    """
+    Use objects of the cache repository, if any, for the next fetch.
+    """
+    alternates = repo / ".git/objects/info/alternates"
+    if (git_cache / "objects").is_dir():
+        alternates.parent.mkdir(parents=True, exist_ok=True)
+        alternates.write_text(f"{git_cache / 'objects'}\n")
+
+
+def dissociate_git_cache(repo: Path):
+    """
+    Copy objects borrowed from the cache repository and stop using it.
+    """
+    alternates = repo / ".git/objects/info/alternates"
+    if alternates.exists():
+        subprocess.run(
+            ["git", "repack", "-a", "-d", "-q"],
+            capture_output=True,
+            cwd=repo,
+            check=True,
+        )
+        alternates.unlink()
+
+
+def export_git_cache(repo: Path, known_revs: List[str], output_dir: Path):
+    """
+    Write objects of the verified HEAD as a pack in the output directory,
+    along with the HEAD commit. Objects reachable from the known revisions
+    already are in the cache repository and are left out.
+    """
+    known = []
+    for rev in known_revs:
+        if (
+            subprocess.run(
+                ["git", "cat-file", "-e", f"{rev}^{{commit}}"],
+                capture_output=True,
+                cwd=repo,
+            ).returncode
+            == 0
+        ):
+            known.append(f"^{rev}")
+    head = subprocess.run(
+        ["git", "rev-parse", "HEAD"],
+        capture_output=True,
+        text=True,
+        cwd=repo,
+        check=True,
+    ).stdout.strip()
+    if head not in known_revs:
+        subprocess.run(
+            [
+                "git",
+                "pack-objects",
+                "--revs",
+                "-q",
+                str(output_dir / "objects"),
+            ],
+            input="\n".join([head] + known) + "\n",
+            capture_output=True,
+            text=True,
+            cwd=repo,
+            check=True,
+        )
+    (output_dir / "HEAD").write_text(f"{head}\n")
+
+
 def main(args):
     # Sanity check on branch and repo
     if not re.match(r"^[A-Za-z0-9][A-Za-z0-9/._-]+$", args.git_branch):
@@ -102,6 +287,27 @@ def main(args):
     )
     fetch_versions_only = args.fetch_versions_only
     maintainers = args.maintainer or []
+    git_cache = (
+        Path(args.git_cache).expanduser().resolve() if args.git_cache else None
+    )
+    git_cache_output = (
+        Path(args.git_cache_output).expanduser().resolve()
+        if args.git_cache_output
+        else None
+    )
+    if git_cache_output:
+        git_cache_output.mkdir(parents=True, exist_ok=True)
+    verified_objects = load_verified_objects(
+        Path(args.verified_objects) if args.verified_objects else None
+    )
+    new_verified_objects: Dict[str, str] = {}
+    verified_objects_output = (
+        Path(args.verified_objects_output).expanduser().resolve()
+        if args.verified_objects_output
+        else None
+    )
+    if verified_objects_output:
+        verified_objects_output.write_text("{}")
     minimum_distinct_maintainers = int(args.minimum_distinct_maintainers)
 
     gpg_sequoia = "/usr/bin/gpg-sq"
@@ -192,6 +398,8 @@ def main(args):
                     cwd=repo,
                     check=True,
                 )
+                if git_cache:
+                    use_git_cache(repo, git_cache)
                 subprocess.run(
                     ["git", "fetch"]
                     + (["--tags"] if looks_like_commit else [])
@@ -201,6 +409,7 @@ def main(args):
                     cwd=repo,
                     check=True,
                 )
+                dissociate_git_cache(repo)
                 subprocess.run(
                     ["git", "reset", "-q", "--soft", "FETCH_HEAD"],
                     capture_output=True,
@@ -208,9 +417,17 @@ def main(args):
                     check=True,
                 )
             else:
+                # only objects missing from the cache are downloaded
+                reference_opts = []
+                if git_cache:
+                    reference_opts = [
+                        f"--reference-if-able={git_cache}",
+                        "--dissociate",
+                    ]
                 subprocess.run(
                     ["git", "clone"]
                     + git_options
+                    + reference_opts
                     + ["-n", "-q", "-b", git_branch]
                     + ["--", git_url, str(repo)],
                     capture_output=True,
@@ -271,67 +488,38 @@ def main(args):
         else:
             print("--> Verifying tags...")
 
-        env = os.environ.copy()
-        env["GNUPGHOME"] = str(git_keyring_dir)
-        git_keyring_dir.mkdir(parents=True, exist_ok=True)
-        git_keyring_dir.chmod(0o700)
-        # We request a list to init the keyring. It looks like it does
-        # not do it on first import, so we just show available keys.
-        subprocess.run(
-            [gpg_client, "--list-keys"],
-            capture_output=True,
-            check=True,
-            env=env,
+        keyring_digest = get_keyring_digest(
+            keys_dir, maintainers, args.trust_all_keys
         )
-        if args.trust_all_keys:
-            for file in keys_dir.glob("*"):
-                subprocess.run(
-                    [gpg_client, "--import", str(file)],
-                    check=True,
-                    env=env,
-                    capture_output=True,
+        keyring_initialized = False
+
+        def verify_obj(obj_type, obj_path):
+            nonlocal keyring_initialized
+            key = f"{keyring_digest}:{obj_type}:{obj_path}"
+            if key in verified_objects:
+                print(f"---> Already verified {obj_type} {obj_path}.")
+                return verified_objects[key]
+            # gpg is only needed for objects not verified yet
+            if not keyring_initialized:
+                init_keyring(
+                    gpg_client,
+                    git_keyring_dir,
+                    keys_dir,
+                    maintainers,
+                    args.trust_all_keys,
                 )
-            list_keys = subprocess.run(
-                [gpg_client, "--list-keys", "--with-colons"],
-                capture_output=True,
-                check=True,
-                env=env,
-            )
-            for line in list_keys.stdout.splitlines():
-                if not line.startswith(b"fpr:"):
-                    continue
-                keyid = line.decode().split(":")[9]
-                subprocess.run(
-                    [gpg_client, "--import-ownertrust"],
-                    input=f"{keyid}:6:\n",
-                    capture_output=True,
-                    text=True,
-                    env=env,
-                    check=True,
-                )
-
-        for keyid in maintainers:
-            key_path = keys_dir / f"{keyid}.asc"
-            if not key_path.exists():
-                raise ValueError(f"Cannot find {key_path}")
-            subprocess.run(
-                [gpg_client, "--import", keys_dir / f"{keyid}.asc"],
-                check=True,
-                env=env,
-                capture_output=True,
-            )
-            subprocess.run(
-                [gpg_client, "--import-ownertrust"],
-                input=f"{keyid}:6:\n",
-                capture_output=True,
-                text=True,
-                env=env,
-                check=True,
+                keyring_initialized = True
+            valid_sig_key = verify_git_obj(
+                gpg_client=gpg_client,
+                keyring_dir=git_keyring_dir,
+                repository_dir=repo,
+                obj_type=obj_type,
+                obj_path=obj_path,
             )
+            if valid_sig_key:
+                new_verified_objects[key] = valid_sig_key
+            return valid_sig_key
 
-        subprocess.run(
-            ["gpgconf", "--kill", "gpg-agent"], check=True, capture_output=True
-        )
         expected_hash = verify_ref
         hash_len = len(expected_hash)
 
@@ -372,13 +560,7 @@ def main(args):
                     f"---> Tag has wrong hash (found {tag[hash_len + 1:hash_len]}, expected {expected_hash})"
                 )
             tag = tag[:hash_len]
-            valid_sig_key = verify_git_obj(
-                gpg_client=gpg_client,
-                keyring_dir=git_keyring_dir,
-                repository_dir=repo,
-                obj_type="tag",
-                obj_path=tag,
-            )
+            valid_sig_key = verify_obj("tag", tag)
             if valid_sig_key:
                 verified_tags.add(valid_sig_key)
                 print(f"---> Good tag {tag}.")
@@ -397,13 +579,7 @@ def main(args):
 
         if not tags:
             print(f"---> No tag pointing at {expected_hash}")
-            if verify_git_obj(
-                gpg_client=gpg_client,
-                keyring_dir=git_keyring_dir,
-                repository_dir=repo,
-                obj_type="commit",
-                obj_path=expected_hash,
-            ):
+            if verify_obj("commit", expected_hash):
                 if check == "signed-tag-or-commit":
                     print(
                         f"---> {expected_hash} does not have a signed tag. However, it is signed by a trusted key, and CHECK is set to {check}. Accepting it anyway."
@@ -417,6 +593,9 @@ def main(args):
             else:
                 raise ValueError(f"---> Invalid commit {expected_hash}.")
 
+    if verified_objects_output:
+        verified_objects_output.write_text(json.dumps(new_verified_objects))
+
     if fetch_only:
         return
 
@@ -503,6 +682,9 @@ def main(args):
             capture_output=True,
         )
 
+    if git_cache_output:
+        export_git_cache(repo, args.git_cache_known, git_cache_output)
+
 
 def get_args():
     parser = argparse.ArgumentParser()
@@ -577,6 +759,28 @@ def get_args():
         action="store_true",
         help="Import and trust all keys present in *keys-dir*. Conflicts with --maintainer.",
     )
+    parser.add_argument(
+        "--git-cache",
+        help="Repository whose objects are used instead of downloading them.",
+    )
+    parser.add_argument(
+        "--git-cache-output",
+        help="Directory where to write objects of the verified source for the cache repository.",
+    )
+    parser.add_argument(
+        "--git-cache-known",
+        action="append",
+        default=[],
+        help="Revision whose objects are already in the cache repository.",
+    )
+    parser.add_argument(
+        "--verified-objects",
+        help="File of tags and commits already verified with the same keys.",
+    )
+    parser.add_argument(
+        "--verified-objects-output",
+        help="File where to write tags and commits newly verified.",
+    )
     parser.add_argument(
         "--minimum-distinct-maintainers",
         help="Minimum of mandatory distinct maintainer signatures.",
@@ -17,6 +17,10 @@
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import hashlib
+from pathlib import Path, PurePath
+from typing import Optional
+
 from qubesbuilder.component import QubesComponent
 from qubesbuilder.config import Config
 from qubesbuilder.distribution import QubesDistribution
@@ -112,6 +116,58 @@ class SourcePlugin(Plugin):
             self.log.info(f"{self.component}:{self.dist}: Nothing to be done.")
             return
 
+    def get_source_archive_cache_dir(self) -> Optional[Path]:
+        """
+        Get the directory of the archives of the component source shared by
+        all distributions. It is keyed by the source content and the commit
+        (its timestamp is the mtime of archived files). Archives are named
+        after their prefix and compression.
+        """
+        parameters = self.get_parameters(self.stage)
+        # Commands and salt formulas may change the source before archiving
+        if (
+            parameters.get("source", {}).get("commands", [])
+            or self.component.is_salt()
+        ):
+            return None
+        try:
+            commit_hash = self.component.get_source_commit_hash()
+            source_hash = self.component.get_source_hash(force_update=False)
+        except ComponentError:
+            return None
+        key = hashlib.sha256(f"{source_hash}:{commit_hash}".encode())
+        return self.config.cache_dir / "archives" / key.hexdigest()
+
+    def get_create_archive_threads(self) -> int:
+        """
+        Get the number of threads used to compress the source archive.
+        """
+        threads = self.get_parameters(self.stage).get(
+            "create-archive-threads", 1
+        )
+        if (
+            isinstance(threads, bool)
+            or not isinstance(threads, int)
+            or threads < 0
+        ):
+            raise SourceError(
+                f"{self.component}:{self.dist}: Invalid value for 'create-archive-threads'."
+            )
+        return threads
+
+    def get_create_archive_cmd(
+        self, source_dir: PurePath, archive_name: str
+    ) -> str:
+        """
+        Get the command creating the archive of the component source. The
+        number of compression threads is set by 'create-archive-threads'.
+        """
+        threads = self.get_create_archive_threads()
+        cmd = f"{self.executor.get_plugins_dir()}/fetch/scripts/create-archive"
+        if threads != 1:
+            cmd += f" --threads {threads}"
+        return f"{cmd} {source_dir} {archive_name}"
+
     def update_parameters(self, stage: str):
         super().update_parameters(stage)
 
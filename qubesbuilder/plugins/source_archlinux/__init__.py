@@ -194,7 +194,7 @@ class ArchLinuxSourcePlugin(SourcePlugin):
             create_archive = parameters.get("create-archive", create_archive)
             if create_archive:
                 cmd.append(
-                    f"{self.executor.get_plugins_dir()}/fetch/scripts/create-archive {source_dir} {source_orig}",
+                    self.get_create_archive_cmd(source_dir, source_orig),
                 )
                 copy_out.append(
                     (source_dir / source_orig, artifacts_dir),
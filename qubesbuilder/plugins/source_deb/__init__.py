@@ -277,7 +277,7 @@ class DEBSourcePlugin(DEBDistributionPlugin, SourcePlugin):
 
                 if create_archive:
                     cmd += [
-                        f"{self.executor.get_plugins_dir()}/fetch/scripts/create-archive {source_dir} {source_orig}",
+                        self.get_create_archive_cmd(source_dir, source_orig),
                         f"mv {source_dir}/{source_orig} {self.executor.get_builder_dir()}",
                     ]
                     # Extra distfiles (non-archive) are moved into the source
@@ -343,9 +343,10 @@ class DEBSourcePlugin(DEBDistributionPlugin, SourcePlugin):
                 " ".join(gen_packages_list_cmd),
             ]
             try:
-                self.executor.run(
-                    cmd, copy_in, copy_out, environment=self.environment
-                )
+                with self.last_run(directory == parameters["build"][-1]):
+                    self.executor.run(
+                        cmd, copy_in, copy_out, environment=self.environment
+                    )
             except ExecutorError as e:
                 msg = f"{self.component}:{self.dist}:{directory}: Failed to generate source: {str(e)}"
                 errors, start_line = extract_lines_before(
@@ -26,6 +26,7 @@ from qubesbuilder.common import (
     is_filename_valid,
     get_archive_name,
     extract_lines_before,
+    link_file,
 )
 from qubesbuilder.component import QubesComponent
 from qubesbuilder.config import Config
@@ -154,79 +155,22 @@ class RPMSourcePlugin(SourcePlugin):
             # spec file basename will be used as prefix for some artifacts
             build_bn = build.mangle()
 
+            # Package information, created archive and source RPM are
+            # gathered outside the source component directory
+            source_info_dir = self.executor.get_builder_dir() / "source-info"
+
             # generate expected artifacts info filename for sanity checks
             artifacts_info_filename = self.get_artifacts_info_filename(
                 self.stage, build_bn
             )
 
-            # Generate %{name}-%{version}-%{release} and %Source0
-            copy_in = self.default_copy_in(
-                self.executor.get_plugins_dir(), self.executor.get_sources_dir()
-            ) + [
-                (self.component.source_dir, self.executor.get_builder_dir()),
-            ]
-
-            copy_out = [
-                (source_dir / f"{build_bn}_package_release_name", temp_dir),
-                (source_dir / f"{build_bn}_packages.list", temp_dir),
-            ]
-
             if self.config.increment_devel_versions:
                 dist_tag = f"{self.component.devel}.{self.dist.tag}"
             else:
                 dist_tag = self.dist.tag
 
-            cmd = [
-                f"{self.executor.get_plugins_dir()}/source_rpm/scripts/get-source-info "
-                f"{source_dir} {source_dir / build} {dist_tag}"
-            ]
-            try:
-                self.executor.run(
-                    cmd, copy_in, copy_out, environment=self.environment
-                )
-            except ExecutorError as e:
-                msg = f"{self.component}:{self.dist}:{build}: Failed to get source information: {str(e)}."
-                raise SourceError(msg) from e
-
-            # Read package release name
-            with open(temp_dir / f"{build_bn}_package_release_name") as f:
-                data = f.read().splitlines()
-            if len(data) < 2:
-                msg = f"{self.component}:{self.dist}:{build}: Invalid data."
-                raise SourceError(msg)
-
-            source_rpm = f"{data[0]}.src.rpm"
-            if not is_filename_valid(
-                source_rpm, forbidden_filename=artifacts_info_filename
-            ):
-                msg = f"{self.component}:{self.dist}:{build}: Invalid source rpm name."
-                raise SourceError(msg)
-
-            source_orig = None
-            if create_archive:
-                # Source0 may contain a URL.
-                source_orig = os.path.basename(data[1])
-                if not is_filename_valid(
-                    source_orig, forbidden_filename=artifacts_info_filename
-                ):
-                    msg = f"{self.component}:{self.dist}:{build}: Invalid source names."
-                    raise SourceError(msg)
-
-            # Read packages list
-            packages_list = []
-            with open(temp_dir / f"{build_bn}_packages.list") as f:
-                data = f.read().splitlines()
-            for line in data:
-                if not is_filename_valid(line, allowed_ext=[".rpm"]):
-                    msg = f"{self.component}:{self.dist}:{build}: Invalid package name."
-                    raise SourceError(msg)
-                packages_list.append(line)
-
-            #
-            # Create source RPM
-            #
-
-            # Copy-in distfiles, content and source
+            # Source information and source RPM are generated in a single
+            # executor run. Copy-in distfiles, content and source.
             copy_in = self.default_copy_in(
                 self.executor.get_plugins_dir(), self.executor.get_sources_dir()
             ) + [
@@ -234,13 +178,18 @@ class RPMSourcePlugin(SourcePlugin):
                 (self.component.source_dir, self.executor.get_builder_dir()),
             ]
 
-            # Copy-out source RPM
-            copy_out = [
-                (self.executor.get_build_dir() / source_rpm, artifacts_dir),
+            # Copy-out package information and source RPM
+            copy_out = [(source_info_dir, temp_dir)]
+
+            # Generate %{name}-%{version}-%{release}, %Source0 and packages list
+            cmd = [
+                f"mkdir -p {source_info_dir}",
+                f"{self.executor.get_plugins_dir()}/source_rpm/scripts/get-source-info "
+                f"{source_dir} {source_dir / build} {dist_tag} {source_info_dir}",
             ]
 
-            # Init command with .qubesbuilder command entries and then run 'mock' to generate source RPM
-            cmd = parameters.get("source", {}).get("commands", [])
+            # Add .qubesbuilder command entries and then run 'mock' to generate source RPM
+            cmd += parameters.get("source", {}).get("commands", [])
 
             mock_conf = f"{self.dist.fullname}-{self.dist.version}-{self.dist.architecture}.cfg"
 
@@ -274,12 +223,29 @@ class RPMSourcePlugin(SourcePlugin):
                     f"--outfile {source_dir}/Makefile.vars -- "
                     f"{self.executor.get_plugins_dir()}/source/salt/FORMULA-DEFAULTS {source_dir}/FORMULA"
                 ]
+            # The archive is created once for all distributions
+            archive_cache_dir = None
             if create_archive:
-                # If no Source0 is provided, we expect 'source' from query-spec.
-                if source_orig != "source":
-                    cmd += [
-                        f"{self.executor.get_plugins_dir()}/fetch/scripts/create-archive {source_dir} {source_orig}",
-                    ]
+                archive_cmd = [
+                    f"{self.executor.get_plugins_dir()}/source_rpm/scripts/create-source-archive"
+                ]
+                threads = self.get_create_archive_threads()
+                if threads != 1:
+                    archive_cmd += [f"--threads {threads}"]
+                archive_cache_dir = self.get_source_archive_cache_dir()
+                if archive_cache_dir:
+                    if archive_cache_dir.exists():
+                        copy_in += [
+                            (archive_cache_dir, self.executor.get_builder_dir())
+                        ]
+                        archive_cmd += [
+                            f"--cache-dir {self.executor.get_builder_dir() / archive_cache_dir.name}"
+                        ]
+                    archive_cmd += [f"--output-dir {source_info_dir}"]
+                archive_cmd += [
+                    f"{source_dir} {source_info_dir / build_bn}_package_release_name"
+                ]
+                cmd += [" ".join(archive_cmd)]
 
             for file in parameters.get("files", []):
                 fn = get_archive_name(file)
@@ -335,15 +301,19 @@ class RPMSourcePlugin(SourcePlugin):
                 f"@PLUGINS_DIR@/chroot_rpm/mock/{mock_conf}"
             ]
 
-            cmd += [" ".join(mock_cmd)]
+            cmd += [
+                " ".join(mock_cmd),
+                f"mv {self.executor.get_build_dir()}/*.src.rpm {source_info_dir}",
+            ]
             try:
-                self.executor.run(
-                    cmd,
-                    copy_in,
-                    copy_out,
-                    environment=self.environment,
-                    files_inside_executor_with_placeholders=files_inside_executor_with_placeholders,
-                )
+                with self.last_run(build == parameters["build"][-1]):
+                    self.executor.run(
+                        cmd,
+                        copy_in,
+                        copy_out,
+                        environment=self.environment,
+                        files_inside_executor_with_placeholders=files_inside_executor_with_placeholders,
+                    )
             except ExecutorError as e:
                 msg = f"{self.component}:{self.dist}:{build}: Failed to generate SRPM ({str(e)})"
                 errors, start_line = extract_lines_before(
@@ -356,6 +326,63 @@ class RPMSourcePlugin(SourcePlugin):
                 }
                 raise SourceError(msg, additional_info=additional_info) from e
 
+            source_info = temp_dir / "source-info"
+
+            # Read package release name
+            with open(source_info / f"{build_bn}_package_release_name") as f:
+                data = f.read().splitlines()
+            if len(data) < 2:
+                msg = f"{self.component}:{self.dist}:{build}: Invalid data."
+                raise SourceError(msg)
+
+            source_rpm = f"{data[0]}.src.rpm"
+            if not is_filename_valid(
+                source_rpm, forbidden_filename=artifacts_info_filename
+            ):
+                msg = f"{self.component}:{self.dist}:{build}: Invalid source rpm name."
+                raise SourceError(msg)
+
+            source_orig = None
+            if create_archive:
+                # Source0 may contain a URL.
+                source_orig = os.path.basename(data[1])
+                if not is_filename_valid(
+                    source_orig, forbidden_filename=artifacts_info_filename
+                ):
+                    msg = f"{self.component}:{self.dist}:{build}: Invalid source names."
+                    raise SourceError(msg)
+
+            # Read packages list
+            packages_list = []
+            with open(source_info / f"{build_bn}_packages.list") as f:
+                data = f.read().splitlines()
+            for line in data:
+                if not is_filename_valid(line, allowed_ext=[".rpm"]):
+                    msg = f"{self.component}:{self.dist}:{build}: Invalid package name."
+                    raise SourceError(msg)
+                packages_list.append(line)
+
+            if not (source_info / source_rpm).exists():
+                msg = f"{self.component}:{self.dist}:{build}: Cannot find source RPM '{source_rpm}'."
+                raise SourceError(msg)
+            shutil.move(source_info / source_rpm, artifacts_dir / source_rpm)
+
+            # Created archive
+            if (
+                archive_cache_dir
+                and source_orig
+                and (source_info / source_orig).exists()
+            ):
+                try:
+                    link_file(
+                        source_info / source_orig,
+                        archive_cache_dir / source_orig,
+                    )
+                except OSError as e:
+                    self.log.warning(
+                        f"{self.component}:{self.dist}:{build}: Failed to cache source archive: {str(e)}."
+                    )
+
             # Save package information we parsed for next stages
             try:
                 info = fetch_info
@@ -1,15 +1,56 @@
+import asyncio
+import errno
+import fcntl
+import gc
+import io
+import json
 import os
+import shutil
 import subprocess
+import sys
+import tarfile
 import tempfile
-from pathlib import Path
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
 
 import pytest
 
+from qubesbuilder.bench import (
+    bench_archives,
+    bench_executor,
+    bench_read_stream,
+)
+from qubesbuilder.common import PROJECT_PATH
 from qubesbuilder.exc import QubesBuilderError
-from qubesbuilder.executors import Executor, ExecutorError
-from qubesbuilder.executors.container import ContainerExecutor
+from qubesbuilder.executors import (
+    Executor,
+    ExecutorError,
+    InfrastructureError,
+    diff_manifest,
+    get_footprint,
+    get_manifest,
+    parse_size,
+)
+from qubesbuilder.executors.container import (
+    ContainerExecutor,
+    DockerException,
+    DockerNotFound,
+    RequestsConnectionError,
+    close_clients,
+    parse_container_stats,
+)
+from qubesbuilder.executors.fake import (
+    FakeExecutor,
+    read_shim_calls,
+    use_shims,
+)
 from qubesbuilder.executors.local import LocalExecutor
 from qubesbuilder.executors.qubes import (
+    COPY_IN_SENDER,
+    COPY_OUT_RECEIVER,
     LinuxQubesExecutor,
     build_run_cmd,
     build_run_cmd_and_list,
@@ -88,6 +129,39 @@ def test_executor_get_cache_dir():
     assert executor.get_cache_dir() == Path("/builder/cache")
 
 
+def test_executor_retry_infrastructure_error():
+    executor = MockExecutor(retries=2, retry_delay=0)
+    calls = []
+
+    async def run(fail):
+        calls.append(fail)
+        if len(calls) <= fail:
+            raise InfrastructureError("Failed to create disposable qube.")
+        return "done"
+
+    # infrastructure failures are retried
+    assert executor.run_until_complete(executor.retry_async(run, 2)) == "done"
+    assert len(calls) == 3
+    assert executor.resources["retries"] == 2
+
+    # up to the given number of retries
+    calls.clear()
+    with pytest.raises(InfrastructureError):
+        executor.run_until_complete(executor.retry_async(run, 3))
+    assert len(calls) == 3
+
+    # build failures are not retried
+    async def build():
+        calls.append(None)
+        raise ExecutorError("Failed to run 'make'.")
+
+    calls.clear()
+    with pytest.raises(ExecutorError):
+        executor.run_until_complete(executor.retry_async(build))
+    assert len(calls) == 1
+    assert executor.resources["retries"] == 4
+
+
 def test_executor_get_user_not_implemented():
     executor = MockExecutorWithError()
     with pytest.raises(NotImplementedError):
@@ -262,9 +336,329 @@ def test_copy_out_error_ignored(executor):
     executor.run(cmd, [], copy_out, no_fail_copy_out_allowed_patterns=patterns)
 
 
+def test_read_stream():
+    data = b"first\nsecond\r\n" + b"x" * 25 + b"\nlast"
+    lines = []
+
+    async def read():
+        stream = asyncio.StreamReader()
+        stream.feed_data(data)
+        stream.feed_eof()
+        return await Executor._read_stream(
+            stream,
+            lines.append,
+            collect=True,
+            max_length=10,
+            read_size=4,
+        )
+
+    assert asyncio.run(read()) == data
+    assert lines == [
+        "first",
+        "second",
+        "x" * 10 + "\u2026",
+        "x" * 10 + "\u2026",
+        "x" * 5,
+        "last",
+    ]
+
+
+def test_manifest(temp_directory):
+    (temp_directory / "subdir").mkdir()
+    (temp_directory / "subdir" / "file").write_text("content")
+    (temp_directory / "other").write_text("other")
+
+    manifest = get_manifest(temp_directory)
+    assert sorted(manifest) == ["other", "subdir/file"]
+    assert manifest["other"][0] == 5
+    assert get_manifest(temp_directory / "other") == {"": manifest["other"]}
+
+    # hash is reused when size and mtime are unchanged
+    previous = {rel: entry[:2] + ["cached"] for rel, entry in manifest.items()}
+    assert get_manifest(temp_directory, previous)["other"][2] == "cached"
+
+    (temp_directory / "other").write_text("changed")
+    (temp_directory / "subdir" / "new").write_text("new")
+    (temp_directory / "subdir" / "file").unlink()
+    changed, deleted = diff_manifest(manifest, get_manifest(temp_directory))
+    assert changed == ["other", "subdir/new"]
+    assert deleted == ["subdir/file"]
+
+
 # executor specific tests
 
 
+def test_local_copy_strategy_reflink(temp_directory, monkeypatch):
+    source_dir = temp_directory / "source"
+    (source_dir / "subdir").mkdir(parents=True)
+    (source_dir / "subdir" / "file").write_text("content")
+    (source_dir / "link").symlink_to("subdir/file")
+    distfile = temp_directory / "file.tar.gz"
+    distfile.write_text("archive")
+
+    executor = LocalExecutor(directory=temp_directory, copy_strategy="reflink")
+    executor.get_builder_dir().mkdir(parents=True)
+    executor.copy_in(source_dir, executor.get_sources_dir())
+    executor.copy_in(distfile, executor.get_distfiles_dir())
+
+    copied_dir = executor.get_sources_dir() / "source"
+    assert (copied_dir / "subdir" / "file").read_text() == "content"
+    assert os.readlink(copied_dir / "link") == "subdir/file"
+    assert (copied_dir / "subdir" / "file").stat().st_ino != (
+        source_dir / "subdir" / "file"
+    ).stat().st_ino
+
+    # without reflink support, distfiles are hardlinked
+    def no_reflink(fd, request, arg):
+        raise OSError(errno.EOPNOTSUPP, "reflink not supported")
+
+    monkeypatch.setattr(fcntl, "ioctl", no_reflink)
+    executor.copy_in(distfile, executor.get_distfiles_dir())
+    copied_distfile = executor.get_distfiles_dir() / distfile.name
+    assert os.path.samefile(copied_distfile, distfile)
+    assert distfile.stat().st_nlink == 2
+
+    # copying again over a hardlink must not alter the input
+    executor.copy_in(distfile, executor.get_distfiles_dir())
+    assert distfile.read_text() == "archive"
+
+    # other inputs, like the local repository, may be modified in place
+    repository_dir = temp_directory / "host-fc41"
+    repository_dir.mkdir()
+    (repository_dir / "repomd.xml").write_text("metadata")
+    executor.copy_in(repository_dir, executor.get_repository_dir())
+    copied_file = executor.get_repository_dir() / "host-fc41" / "repomd.xml"
+    with open(copied_file, "a") as f:
+        f.write("updated")
+    assert (repository_dir / "repomd.xml").read_text() == "metadata"
+    executor.cleanup()
+
+
+def test_local_run_async_concurrent(temp_directory):
+    # the first job only completes once the second one has run, which
+    # requires both of them to be driven by the same loop concurrently
+    flag = temp_directory / "flag"
+    executors = [LocalExecutor(), LocalExecutor()]
+    cmds = [
+        [f"timeout 10 sh -c 'while [ ! -e {flag} ]; do sleep 0.1; done'"],
+        [f"touch {flag}"],
+    ]
+
+    async def run():
+        await asyncio.gather(
+            *[e.run_async(cmd) for e, cmd in zip(executors, cmds)]
+        )
+
+    asyncio.run(run())
+    assert flag.exists()
+
+
+def test_run_until_complete_thread_loop():
+    async def get_loop():
+        return asyncio.get_running_loop()
+
+    loops = []
+
+    def run():
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            for _ in range(2):
+                loops.append(Executor.run_until_complete(get_loop()))
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+    # the loop is kept for the thread and closed once it is done
+    assert loops[0] is loops[1]
+    gc.collect()
+    assert loops[0].is_closed()
+    assert Executor.run_until_complete(get_loop()) is not loops[0]
+
+
+def test_local_run_resources():
+    executor = LocalExecutor()
+    executor.run(["head -c 4M /dev/zero | sha256sum"])
+    assert set(executor.resources) == {
+        "cpu_time",
+        "max_rss",
+        "read_bytes",
+        "write_bytes",
+        "wall_time",
+    }
+    assert executor.resources["cpu_time"] > 0
+    assert executor.resources["max_rss"] > 0
+    wall_time = executor.resources["wall_time"]
+
+    # resources are accumulated over runs
+    executor.run(["true"])
+    assert executor.resources["wall_time"] > wall_time
+
+
+def test_parse_size():
+    assert parse_size(1024) == 1024
+    assert parse_size("4K") == 4096
+    assert parse_size("2g") == 2 * 1024**3
+    assert 0 < parse_size("50%") < parse_size("100%")
+    with pytest.raises(ExecutorError) as e:
+        parse_size("lots")
+    assert str(e.value) == "Invalid size 'lots'."
+
+
+def test_local_tmpfs_footprint(temp_directory):
+    footprints_file = temp_directory / "footprints.json"
+    executor = LocalExecutor(tmpfs="build", tmpfs_size="1M")
+    executor.footprints_file = footprints_file
+    assert executor.get_tmpfs_dir() == executor.get_build_dir()
+    # no footprint recorded yet
+    assert executor.use_tmpfs()
+
+    executor.run(
+        [
+            f"mkdir -p {executor.get_build_dir()}",
+            "head -c 2M /dev/urandom > " f"{executor.get_build_dir()}/blob",
+        ]
+    )
+    footprint = get_footprint(footprints_file, executor.log.name)
+    assert footprint >= 2 * 1024**2
+
+    # the previous run does not fit anymore
+    assert not executor.use_tmpfs()
+    executor = LocalExecutor(tmpfs="builder", tmpfs_size="1G")
+    executor.footprints_file = footprints_file
+    assert executor.get_tmpfs_dir() == executor.get_builder_dir()
+    assert executor.use_tmpfs()
+
+
+def test_local_tmpfs_unknown():
+    with pytest.raises(ExecutorError) as e:
+        LocalExecutor(tmpfs="all")
+    assert str(e.value) == "Unknown tmpfs mode 'all'."
+    # the size is only used with a tmpfs
+    LocalExecutor(tmpfs="none", tmpfs_size="invalid")
+    with pytest.raises(ExecutorError):
+        LocalExecutor(tmpfs="build", tmpfs_size="invalid")
+
+
+def test_local_tmpfs_not_cleaned(temp_directory, monkeypatch):
+    calls = []
+
+    def mount_tmpfs(executor):
+        calls.append("mount")
+        executor._tmpfs_mounted = True
+
+    def umount_tmpfs(executor, keep=False):
+        calls.append(("umount", keep))
+        executor._tmpfs_mounted = False
+
+    monkeypatch.setattr(LocalExecutor, "mount_tmpfs", mount_tmpfs)
+    monkeypatch.setattr(LocalExecutor, "umount_tmpfs", umount_tmpfs)
+    executor = LocalExecutor(tmpfs="build", clean=False)
+    executor.run(["true"])
+    # the tmpfs is unmounted but its content is kept
+    assert calls == ["mount", ("umount", True)]
+    executor = LocalExecutor(tmpfs="build", clean=False)
+    with pytest.raises(ExecutorError):
+        executor.run(["false"])
+    assert calls[2:] == ["mount", ("umount", True)]
+
+
+def test_container_tmpfs_copies(temp_directory):
+    source_dir = temp_directory / "source"
+    (source_dir / "rpm").mkdir(parents=True)
+    (source_dir / "rpm" / "foo.spec").write_text("spec")
+    executor = ContainerExecutor("docker", "fedora:latest", tmpfs="build")
+    copy_in = [
+        (source_dir, executor.get_build_dir()),
+        (source_dir, executor.get_sources_dir()),
+    ]
+    entries, copies = executor.get_tmpfs_copies(copy_in)
+    assert entries == [(source_dir.resolve(), "builder/build/source")]
+    assert copies == [(source_dir, executor.get_sources_dir())]
+
+    # entries are streamed as an archive extracted onto the tmpfs
+    read_fd, write_fd = os.pipe()
+    writer = threading.Thread(
+        target=ContainerExecutor._write_tar, args=(write_fd, entries)
+    )
+    writer.start()
+    with os.fdopen(read_fd, "rb") as f, tarfile.open(
+        fileobj=f, mode="r|"
+    ) as tar:
+        tar.extractall(temp_directory / "root", filter="data")
+    writer.join()
+    assert (
+        temp_directory / "root/builder/build/source/rpm/foo.spec"
+    ).read_text() == "spec"
+
+
+def test_container_tmpfs_outputs():
+    executor = ContainerExecutor("docker", "fedora:latest", tmpfs="build")
+    build_dir = executor.get_build_dir()
+    outputs_cmd, copy_out = executor.get_outputs_cmd(
+        [
+            (build_dir / "rpm" / "foo.rpm", Path("/artifacts/rpm")),
+            (executor.get_builder_dir() / "foo.log", Path("/artifacts")),
+        ],
+        [executor.get_tmpfs_dir()],
+    )
+    assert copy_out == [
+        (
+            PurePosixPath("/mnt/qubesbuilder-outputs/build/rpm/foo.rpm"),
+            Path("/artifacts/rpm"),
+        ),
+        (executor.get_builder_dir() / "foo.log", Path("/artifacts")),
+    ]
+    assert outputs_cmd == [
+        "sudo mkdir -p -- /mnt/qubesbuilder-outputs/build/rpm && "
+        "{ sudo cp -a -- /builder/build/rpm/foo.rpm "
+        "/mnt/qubesbuilder-outputs/build/rpm/ 2>/dev/null || true; }"
+    ]
+
+
+def test_container_stats_parsing():
+    docker_stats = {
+        "cpu_stats": {"cpu_usage": {"total_usage": 2_500_000_000}},
+        "memory_stats": {"usage": 1024, "max_usage": 4096},
+        "blkio_stats": {
+            "io_service_bytes_recursive": [
+                {"major": 8, "minor": 0, "op": "Read", "value": 100},
+                {"major": 8, "minor": 0, "op": "Write", "value": 200},
+                {"major": 8, "minor": 16, "op": "read", "value": 1},
+            ]
+        },
+    }
+    assert parse_container_stats(docker_stats) == {
+        "cpu_time": 2.5,
+        "max_rss": 4096,
+        "read_bytes": 101,
+        "write_bytes": 200,
+    }
+    podman_stats = {
+        "Error": None,
+        "Stats": [
+            {
+                "CPUNano": 1_000_000_000,
+                "MemUsage": 2048,
+                "BlockInput": 10,
+                "BlockOutput": 20,
+            }
+        ],
+    }
+    assert parse_container_stats(json.dumps(podman_stats).encode()) == {
+        "cpu_time": 1.0,
+        "max_rss": 2048,
+        "read_bytes": 10,
+        "write_bytes": 20,
+    }
+    assert parse_container_stats(b"garbage") == {}
+
+
+def test_local_copy_strategy_unknown():
+    with pytest.raises(ExecutorError) as e:
+        LocalExecutor(copy_strategy="rsync")
+    assert str(e.value) == "Unknown copy strategy 'rsync'."
+
+
 def test_container_unknown_client_type():
     with pytest.raises(ExecutorError) as e:
         ContainerExecutor("toto", "fedora:latest")
@@ -279,9 +673,263 @@ def test_container_executor_get_user_get_group():
     assert executor.get_group() == "toto"
 
 
+def test_container_bind_mounts(temp_directory):
+    cache_dir = temp_directory / "fedora-41-x86_64"
+    cache_dir.mkdir()
+    plugin_dir = temp_directory / "fetch"
+    plugin_dir.mkdir()
+    key_file = temp_directory / "key.asc"
+    key_file.touch()
+
+    executor = ContainerExecutor(
+        "docker", "fedora:latest", bind_mounts=["cache"]
+    )
+    copy_in = [
+        (cache_dir, executor.get_cache_dir() / "chroot"),
+        (plugin_dir, executor.get_plugins_dir()),
+        (key_file, executor.get_cache_dir()),
+    ]
+    mounts, copies = executor.get_bind_mounts(copy_in)
+    assert mounts == [
+        (
+            cache_dir,
+            executor.get_cache_dir() / "chroot",
+            PurePosixPath("/mnt/qubesbuilder/0"),
+        )
+    ]
+    assert sorted(copies) == sorted(copy_in[1:])
+    executor._overlays_volume = "qubesbuilder-overlays-test"
+    volumes = executor.get_bind_mounts_volumes(mounts)
+    assert volumes == {
+        str(cache_dir.resolve()): {
+            "bind": "/mnt/qubesbuilder/0",
+            "mode": "ro,z",
+        },
+        "qubesbuilder-overlays-test": {
+            "bind": "/mnt/qubesbuilder-overlays",
+            "mode": "rw",
+        },
+    }
+
+    # the build writes to the mounted input through an overlay
+    options = (
+        "lowerdir=/mnt/qubesbuilder/0,"
+        "upperdir=/mnt/qubesbuilder-overlays/0/upper,"
+        "workdir=/mnt/qubesbuilder-overlays/0/work"
+    )
+    target = "/builder/cache/chroot/fedora-41-x86_64"
+    assert executor.get_overlays_cmd(mounts) == [
+        f"sudo mkdir -p -- {target} /mnt/qubesbuilder-overlays/0/upper "
+        "/mnt/qubesbuilder-overlays/0/work",
+        f"{{ sudo mount -t overlay -o {options},metacopy=on overlay {target}"
+        f" 2>/dev/null || sudo mount -t overlay -o {options} overlay {target}; }}",
+    ]
+    # outputs within overlays are saved before the container stops
+    outputs_cmd, copy_out = executor.get_outputs_cmd(
+        [(PurePosixPath(target) / "cache.tar", Path("/artifacts"))],
+        [PurePosixPath(target)],
+    )
+    assert copy_out == [
+        (
+            PurePosixPath(
+                "/mnt/qubesbuilder-outputs/cache/chroot/fedora-41-x86_64/cache.tar"
+            ),
+            Path("/artifacts"),
+        )
+    ]
+
+    # nothing is mounted if another input is copied inside it
+    mounts, copies = executor.get_bind_mounts(
+        copy_in
+        + [(key_file, executor.get_cache_dir() / "chroot" / cache_dir.name)]
+    )
+    assert not mounts
+
+    # disabled by default
+    executor = ContainerExecutor("docker", "fedora:latest")
+    mounts, copies = executor.get_bind_mounts(copy_in)
+    assert not mounts
+
+
+@pytest.mark.parametrize("name", ["build", "artifacts"])
+def test_container_bind_mounts_unknown_input(name):
+    with pytest.raises(ExecutorError) as e:
+        ContainerExecutor("docker", "fedora:latest", bind_mounts=[name])
+    assert str(e.value) == f"Unknown bind mounts input(s): {name}."
+
+
+def test_container_bind_mounts_modified_input(temp_directory):
+    executor = ContainerExecutor("docker", "fedora:latest", bind_mounts=True)
+    try:
+        with executor.get_client() as client:
+            client.ping()
+    except (ExecutorError, DockerException) as e:
+        pytest.skip(f"docker is not available: {str(e)}")
+
+    repository_dir = temp_directory / "host-fc41"
+    repository_dir.mkdir()
+    (repository_dir / "repomd.xml").write_text("metadata\n")
+    output_dir = temp_directory / "output"
+    output_dir.mkdir()
+    mounted_dir = executor.get_repository_dir() / repository_dir.name
+    # modified in place as done when updating the repository metadata
+    executor.run(
+        [f"echo updated >> {mounted_dir}/repomd.xml"],
+        copy_in=[(repository_dir, executor.get_repository_dir())],
+        copy_out=[(mounted_dir / "repomd.xml", output_dir)],
+    )
+    assert (output_dir / "repomd.xml").read_text() == "metadata\nupdated\n"
+    assert (repository_dir / "repomd.xml").read_text() == "metadata\n"
+
+
+def test_container_client_pool_and_image_cache():
+    calls = []
+
+    class FakeImage:
+        attrs = {"Id": "sha256:1234"}
+
+    class FakeImages:
+        def get(self, name):
+            calls.append(("get", name))
+            raise DockerException("not found")
+
+        def pull(self, name):
+            calls.append(("pull", name))
+            time.sleep(0.1)
+            return FakeImage()
+
+    class FakeClient:
+        def __init__(self, **kwargs):
+            calls.append(("client", kwargs))
+            self.images = FakeImages()
+
+        def ping(self):
+            return True
+
+    executors = [
+        ContainerExecutor("docker", "fedora:pool", base_url="unix:///pool")
+        for _ in range(4)
+    ]
+    for executor in executors:
+        executor._client = FakeClient
+
+    def resolve(executor):
+        with executor.get_client() as client:
+            return executor.get_image(client)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(resolve, executors))
+
+    assert all(attrs["Id"] == "sha256:1234" for attrs in results)
+    assert calls == [
+        ("client", {"base_url": "unix:///pool"}),
+        ("get", "fedora:pool"),
+        ("pull", "fedora:pool"),
+    ]
+    close_clients()
+
+
+def test_container_client_errors():
+    clients = []
+
+    class FakeClient:
+        def __init__(self, **kwargs):
+            self.closed = False
+            self.reachable = True
+            clients.append(self)
+
+        def ping(self):
+            if not self.reachable:
+                raise RequestsConnectionError("connection refused")
+            return True
+
+        def close(self):
+            self.closed = True
+
+    executor = ContainerExecutor(
+        "docker", "fedora:errors", base_url="unix:///errors"
+    )
+    executor._client = FakeClient
+
+    # API errors are failures of the run and keep the client
+    with pytest.raises(ExecutorError) as e:
+        with executor.get_client():
+            raise DockerException("conflict")
+    assert not isinstance(e.value, InfrastructureError)
+    assert str(e.value) == "Container client error: conflict"
+    assert len(clients) == 1 and not clients[0].closed
+
+    # connection errors are retryable and drop the client
+    with pytest.raises(InfrastructureError):
+        with executor.get_client():
+            try:
+                raise RequestsConnectionError("connection reset")
+            except RequestsConnectionError as exc:
+                raise DockerException("request failed") from exc
+    assert clients[0].closed
+    with executor.get_client():
+        pass
+    assert len(clients) == 2
+
+    # a pooled client that cannot be reached anymore is dropped
+    clients[1].reachable = False
+    with pytest.raises(InfrastructureError) as e:
+        with executor.get_client():
+            pass
+    assert str(e.value) == "Cannot connect to container client."
+    assert clients[1].closed
+    with executor.get_client():
+        pass
+    assert len(clients) == 3
+    close_clients()
+
+
+def test_container_pruned_image():
+    resolved = []
+    created = []
+
+    class FakeImages:
+        def get(self, name):
+            resolved.append(name)
+            image_id = f"sha256:{len(resolved)}"
+            return type("Image", (), {"attrs": {"Id": image_id}})()
+
+    class FakeContainers:
+        def create(self, image, command, **kwargs):
+            created.append(image)
+            if image == "sha256:1":
+                raise DockerNotFound("No such image")
+            return object()
+
+    class FakeClient:
+        def __init__(self, **kwargs):
+            self.images = FakeImages()
+            self.containers = FakeContainers()
+
+        def ping(self):
+            return True
+
+    executor = ContainerExecutor(
+        "docker", "fedora:pruned", base_url="unix:///pruned"
+    )
+    executor._client = FakeClient
+    with executor.get_client() as client:
+        executor._attrs = executor.get_image(client)
+        executor.create_container(client, ["true"])
+        assert created == ["sha256:1", "sha256:2"]
+        assert executor._attrs["Id"] == "sha256:2"
+        # the refreshed image is cached for the next executors
+        other = ContainerExecutor(
+            "docker", "fedora:pruned", base_url="unix:///pruned"
+        )
+        assert other.get_image(client)["Id"] == "sha256:2"
+    assert resolved == ["fedora:pruned", "fedora:pruned"]
+    close_clients()
+
+
 def test_container_not_running():
     executor = ContainerExecutor(
-        "docker", "fedora:latest", base_url="tcp://127.0.0.1:1234"
+        "docker", "fedora:latest", base_url="tcp://127.0.0.1:1234", retries=0
     )
     cmd = ["true"]
     with pytest.raises(ExecutorError) as e:
@@ -425,3 +1073,199 @@ def test_qubes_command_helpers():
     assert build_run_cmd_and_list(
         "builder-dvm", [["echo", "a"], ["echo", "b"]]
     ) == ["/usr/bin/qvm-run-vm", "--", "builder-dvm", "echo a && echo b"]
+
+
+@pytest.mark.skipif(shutil.which("zstd") is None, reason="zstd is required")
+def test_qubes_copy_out_compressed(temp_directory):
+    source = temp_directory / "source"
+    source.write_bytes(os.urandom(1024**2) + bytes(8 * 1024**2))
+    destination = temp_directory / "destination"
+    destination.mkdir()
+
+    # qfile-agent and qfile-unpacker stand-ins: the agent waits for the
+    # transfer result sent back by the unpacker before exiting.
+    agent = temp_directory / "qfile-agent"
+    agent.write_text(
+        "#!/bin/bash\n"
+        'stat -c %s "$1" && cat "$1"\n'
+        'read -r result && [ "$result" = ok ]\n'
+    )
+    agent.chmod(0o755)
+    unpacker = (
+        'read -r size && head -c "$size" > "$1/file" && echo ok && cat >&2'
+    )
+
+    loader = (
+        "import importlib.machinery, importlib.util, sys;"
+        "loader = importlib.machinery.SourceFileLoader("
+        "'service', sys.argv.pop(1));"
+        "service = importlib.util.module_from_spec("
+        "importlib.util.spec_from_loader('service', loader));"
+        "loader.exec_module(service);"
+        "service.QFILE_AGENT = sys.argv.pop(1);"
+        "service.main()"
+    )
+    result_read, result_write = os.pipe()
+    service = subprocess.Popen(
+        [
+            sys.executable,
+            "-c",
+            loader,
+            str(PROJECT_PATH / "rpc" / "qubesbuilder.FileCopyOut"),
+            str(agent),
+            f"zstd+{encode_for_vmexec(str(source))}",
+        ],
+        stdin=result_read,
+        stdout=subprocess.PIPE,
+    )
+    os.close(result_read)
+    receiver = subprocess.Popen(
+        [
+            "bash",
+            "-c",
+            COPY_OUT_RECEIVER,
+            "bash",
+            "bash",
+            "-c",
+            unpacker,
+            "bash",
+            str(destination),
+        ],
+        stdin=service.stdout,
+        stdout=result_write,
+    )
+    os.close(result_write)
+    service.stdout.close()
+    assert service.wait(timeout=60) == 0
+    assert receiver.wait(timeout=60) == 0
+    assert (destination / "file").read_bytes() == source.read_bytes()
+
+
+@pytest.mark.skipif(shutil.which("zstd") is None, reason="zstd is required")
+@pytest.mark.parametrize("ignore_symlinks", [False, True])
+def test_qubes_copy_in_compressed_symlinks(temp_directory, ignore_symlinks):
+    source = temp_directory / "source"
+    (source / "sub").mkdir(parents=True)
+    (source / "file").write_text("file")
+    (source / "link").symlink_to("file")
+    (source / "sub" / "link").symlink_to("../file")
+
+    # the receiver accepts the compressed mode and reports a success
+    sender = subprocess.run(
+        [
+            "bash",
+            "-c",
+            COPY_IN_SENDER,
+            "bash",
+            str(temp_directory),
+            source.name,
+            str(int(ignore_symlinks)),
+            "false",
+        ],
+        input=b"zstd\nok\n",
+        capture_output=True,
+        check=True,
+    )
+    archive = subprocess.run(
+        ["zstd", "-d", "-q", "-c"],
+        input=sender.stdout,
+        capture_output=True,
+        check=True,
+    ).stdout
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        names = {str(PurePosixPath(member.name)) for member in tar.getmembers()}
+    assert names == {"source", "source/file", "source/sub"} | (
+        set() if ignore_symlinks else {"source/link", "source/sub/link"}
+    )
+
+
+def test_qubes_copy_compression_unknown():
+    with pytest.raises(ExecutorError) as e:
+        LinuxQubesExecutor(dispvm="builder-dvm", copy_compression="xz")
+    assert str(e.value) == "Unknown copy compression 'xz'."
+
+
+def test_fake_executor(temp_directory):
+    (temp_directory / "input").write_bytes(b"\0" * 1000)
+    executor = FakeExecutor(latency=0.01, bandwidth=10000, run_time=0.05)
+    phases = []
+    executor.phase_callbacks.append(phases.append)
+    executor.run(
+        ["make"],
+        copy_in=[(temp_directory / "input", PurePosixPath("/builder"))],
+        copy_out=[(PurePosixPath("/builder/build/out"), temp_directory)],
+    )
+    assert phases == ["copy-in", "run", "copy-out"]
+    assert executor.calls == {"copy-in": 1, "run": 1, "copy-out": 1}
+    # latency of each call, plus transfer and run times
+    assert executor.simulated == pytest.approx(0.03 + 0.1 + 0.05)
+    assert executor.resources["wall_time"] >= executor.simulated
+    assert not (temp_directory / "out").exists()
+
+    with pytest.raises(ExecutorError):
+        executor.copy_in(temp_directory / "missing", PurePosixPath("/builder"))
+
+
+def test_qubes_fake_backend(temp_directory):
+    (temp_directory / "input").write_text("content")
+    executor = LinuxQubesExecutor(dispvm="builder-dvm", retries=0)
+    with use_shims(temp_directory / "shims", latency=0.01) as calls_file:
+        executor.run(
+            ["true"],
+            copy_in=[(temp_directory / "input", PurePosixPath("/builder"))],
+            copy_out=[(PurePosixPath("/builder/out"), temp_directory)],
+        )
+    calls, simulated = read_shim_calls(calls_file)
+    assert executor.dispvm.startswith("disp")
+    assert calls == {
+        "qrexec-client-vm admin.vm.CreateDisposable": 1,
+        "qrexec-client-vm admin.vm.Start": 1,
+        "qrexec-client-vm qubes.Filecopy": 1,
+        "qrexec-client-vm qubesbuilder.FileCopyIn": 1,
+        "qrexec-client-vm qubesbuilder.FileCopyOut": 1,
+        "qrexec-client-vm admin.vm.CurrentState": 1,
+        "qrexec-client-vm admin.vm.Kill": 1,
+        "qvm-run-vm sudo": 1,
+        "qvm-run-vm env": 1,
+        "qvm-run-vm cat": 1,
+    }
+    assert simulated == pytest.approx(0.1)
+    # the actual tools are restored
+    assert build_run_cmd("vm", ["true"])[0] == "/usr/bin/qvm-run-vm"
+
+
+def test_bench_executor(temp_directory):
+    result = bench_executor(
+        "fake", jobs=2, latency=0.01, directory=temp_directory
+    )
+    assert set(result.phases) == {"setup", "copy-in", "run", "copy-out"}
+    assert result.calls == {"copy-in": 1, "run": 1, "copy-out": 1}
+    assert result.simulated == pytest.approx(0.03)
+    assert result.total >= result.simulated
+
+
+def test_bench_read_stream():
+    results = list(bench_read_stream(size=1024**2, read_size=4096))
+    assert [r.mode for r in results] == ["lines", "collect", "lines+collect"]
+    assert results[0].lines == results[2].lines > 0
+    assert results[1].lines == 0
+    assert all(r.throughput > 0 for r in results)
+
+
+def test_bench_archives(temp_directory):
+    results = list(
+        bench_archives(
+            archive_formats=["gz", "zst"],
+            threads=[1],
+            runs=3,
+            input_size=64 * 1024,
+            directory=temp_directory,
+        )
+    )
+    assert [r.archive_format for r in results] == ["gz", "zst"]
+    assert len(results[0].digests) == 3
+    assert results[0].deterministic
+    assert 0 < results[0].ratio < 1
+    assert results[0].throughput > 0
+    if not shutil.which("zstd"):
+        assert results[1].skipped == "cannot find 'zstd'"
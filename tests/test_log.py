@@ -3,6 +3,7 @@ from pathlib import Path
 
 import pytest
 import logging
+from qubesbuilder.common import extract_lines_before, sanitize_line
 from qubesbuilder.config import Config
 from qubesbuilder.pluginmanager import PluginManager
 from qubesbuilder.log import (
@@ -12,6 +13,7 @@ from qubesbuilder.log import (
     create_console_handler,
     QubesBuilderLogger,
     init_logger,
+    zstandard,
 )
 
 
@@ -190,3 +192,32 @@ def test_qb_logger_no_duplicate_logs(root_logger, plugins, capsys):
 
     stdout, stderr = capsys.readouterr()
     assert stderr.count("Info message") == 1
+
+
+def test_sanitize_line():
+    assert sanitize_line(b"abc\r\x00\x1b[0m\xff~") == "abc ..[0m.~"
+    assert sanitize_line(bytearray(b"line")) == "line"
+
+
+@pytest.mark.parametrize("compression", [None, "zstd"])
+def test_qb_logger_queue(root_logger, plugins, compression):
+    if compression == "zstd" and zstandard is None:
+        pytest.skip("zstandard is not available")
+    teardown_logging()
+    init_logger(log_queue=True, log_compression=compression)
+    try:
+        logger = root_logger.getChild("test_logger", plugin=plugins[0])
+        for i in range(1000):
+            logger.debug(f"line {i}")
+        logger.error("EXCEPTION: %s", "failure")
+
+        # records are written once the log file is requested
+        log_file = logger.get_log_file()
+        assert log_file.name.endswith(".log.zst" if compression else ".log")
+        lines, _ = extract_lines_before(
+            log_file, "EXCEPTION:", num_lines_before=2, max_split=3
+        )
+        assert lines == ["line 998", "line 999", "EXCEPTION: failure"]
+    finally:
+        teardown_logging()
+        init_logger()
@@ -11,6 +11,7 @@ from qubesbuilder.config import Config
 from qubesbuilder.distribution import QubesDistribution
 from qubesbuilder.exc import ComponentError, DistributionError, ConfigError
 from qubesbuilder.executors.container import ContainerExecutor
+from qubesbuilder.executors.fake import FakeExecutor
 from qubesbuilder.pluginmanager import PluginManager
 from qubesbuilder.plugins import DistributionComponentPlugin
 from qubesbuilder.template import QubesTemplate, TemplateError
@@ -979,6 +980,32 @@ def test_config_executor():
             }
 
 
+def test_config_executor_fake():
+    executor = Config.get_executor(
+        {"type": "fake", "options": {"latency": "0.5", "run-time": 1}}
+    )
+    assert isinstance(executor, FakeExecutor)
+    assert executor._latency == 0.5
+    assert executor._run_time == 1.0
+
+
+def test_config_log_compression(temp_config_file, monkeypatch):
+    assert Config(temp_config_file).log_compression is None
+    temp_config_file.write_text("log-compression: gzip\n")
+    with pytest.raises(ConfigError) as e:
+        Config(temp_config_file).log_compression
+    assert str(e.value) == "Unsupported log compression 'gzip'."
+
+    temp_config_file.write_text("log-compression: zstd\n")
+    monkeypatch.setattr("qubesbuilder.config.zstandard", None)
+    with pytest.raises(ConfigError) as e:
+        Config(temp_config_file).log_compression
+    assert (
+        str(e.value)
+        == "Log compression 'zstd' requires the 'zstandard' Python module."
+    )
+
+
 def test_config_executor_include_dist_no_dict():
     with (
         tempfile.NamedTemporaryFile("w") as config_file_main,
@@ -16,10 +16,17 @@
 # with this program. If not, see <https://www.gnu.org/licenses/>.
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
+import threading
+import time
+
+import pytest
 
 from qubesbuilder.cli.cli_package import _component_stage
 from qubesbuilder.common import PROJECT_PATH
 from qubesbuilder.config import Config
+from qubesbuilder.exc import QubesBuilderError
+from qubesbuilder.jobs import PipelineError, run_jobs, run_jobs_concurrently
+from qubesbuilder.plugins import Plugin
 
 DEFAULT_BUILDER_CONF = PROJECT_PATH / "tests/builder-ci.yml"
 
@@ -67,3 +74,151 @@ def test_fetch_runs_independently_per_component(tmp_path):
     assert (
         "example-advanced-clone" in fetch_done
     ), "example-advanced-clone not recorded - fetch was blocked by first component"
+
+
+class FakeExecutor:
+    def __init__(self):
+        self.phase_callbacks = []
+
+    def notify_phase(self, phase):
+        for callback in self.phase_callbacks:
+            callback(phase)
+
+    def run(self):
+        for phase in ("copy-in", "run", "copy-out"):
+            self.notify_phase(phase)
+
+
+class FakeJob:
+    last_run = Plugin.last_run
+    notify_copy_out = Plugin.notify_copy_out
+
+    def __init__(self, name, stage="prep", dist=None, runs=1):
+        self.name = name
+        self.stage = stage
+        self.dist = dist
+        self.runs = runs
+        self.executor = FakeExecutor()
+        self.copy_out_callbacks = []
+
+    def run(self, on_run=None):
+        for i in range(self.runs):
+            with self.last_run(i == self.runs - 1):
+                self.executor.run()
+            if on_run:
+                on_run(i)
+
+
+def test_run_jobs_overlap():
+    a, b, c = FakeJob("a"), FakeJob("b"), FakeJob("c")
+    graph = {a: [], b: [], c: [b]}
+    events = []
+    b_started = threading.Event()
+
+    def run_job(job):
+        events.append(f"{job.name}:start")
+        if job is b:
+            b_started.set()
+        job.run()
+        if job is a:
+            # the next job starts while this one copies out
+            assert b_started.wait(timeout=10)
+        events.append(f"{job.name}:end")
+
+    run_jobs([a, b, c], run_job, graph=graph, overlap=True)
+    # c depends on b and is only started once b is completed
+    assert events.index("b:start") < events.index("a:end")
+    assert events.index("b:end") < events.index("c:start")
+
+
+def test_run_jobs_overlap_last_run():
+    # a runs its executor three times, b and c build for the same dist
+    a = FakeJob("a", stage="build", dist="host-fc41", runs=3)
+    b = FakeJob("b", stage="build", dist="vm-bookworm")
+    c = FakeJob("c", stage="build", dist="vm-bookworm")
+    graph = {a: [], b: [], c: []}
+    events = []
+    b_started = threading.Event()
+
+    def run_job(job):
+        events.append(f"{job.name}:start")
+        if job is b:
+            b_started.set()
+        job.run(on_run=lambda i: events.append(f"{job.name}:run{i}"))
+        if job is a:
+            assert b_started.wait(timeout=10)
+        events.append(f"{job.name}:end")
+
+    run_jobs([a, b, c], run_job, graph=graph, overlap=True)
+    # b only starts once a copies out its last outputs
+    assert events.index("a:run1") < events.index("b:start")
+    assert events.index("b:start") < events.index("a:end")
+    # c shares the local repository of b and waits for it
+    assert events.index("b:end") < events.index("c:start")
+
+
+def test_run_jobs_overlap_error():
+    a, b, c = FakeJob("a"), FakeJob("b"), FakeJob("c")
+    done = []
+
+    def run_job(job):
+        if job is a:
+            raise QubesBuilderError("failed")
+        done.append(job)
+
+    with pytest.raises(QubesBuilderError):
+        run_jobs(
+            [a, b, c], run_job, graph={a: [], b: [a], c: [b]}, overlap=True
+        )
+    assert done == []
+
+
+def test_run_jobs_concurrently():
+    a, b, c, d = (FakeJob(name) for name in "abcd")
+    graph = {a: [], b: [], c: [a], d: []}
+    lock = threading.Lock()
+    running = []
+    max_running = []
+    events = []
+
+    def run_job(job):
+        with lock:
+            running.append(job)
+            max_running.append(len(running))
+            events.append(f"{job.name}:start")
+        time.sleep(0.1)
+        with lock:
+            running.remove(job)
+            events.append(f"{job.name}:end")
+
+    run_jobs_concurrently([a, b, c, d], run_job, graph=graph, max_workers=2)
+    assert max(max_running) == 2
+    assert events.index("b:start") < events.index("a:end")
+    # c depends on a
+    assert events.index("a:end") < events.index("c:start")
+    assert len(events) == 8
+
+
+def test_run_jobs_concurrently_errors():
+    a, b, c, d = (FakeJob(name) for name in "abcd")
+    done = []
+
+    def run_job(job):
+        if job in (a, b):
+            raise QubesBuilderError(f"{job.name} failed")
+        done.append(job)
+
+    # other jobs are run and failures are reported at the end
+    with pytest.raises(PipelineError) as e:
+        run_jobs_concurrently(
+            [a, b, c, d],
+            run_job,
+            graph={a: [], b: [], c: [a], d: []},
+            max_workers=4,
+        )
+    assert str(e.value) == "2 job(s) failed and 1 skipped."
+    assert done == [d]
+
+    # a single failure is raised as is
+    with pytest.raises(QubesBuilderError, match="a failed"):
+        run_jobs_concurrently([a, d], run_job, graph={}, max_workers=2)
@@ -17,17 +17,25 @@
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import hashlib
+import json
+import shutil
+import subprocess
+
 import pytest
 import importlib
 
+from qubesbuilder.component import QubesComponent
 from qubesbuilder.config import Config
 from qubesbuilder.distribution import QubesDistribution
 from qubesbuilder.executors import ExecutorError
 import qubesbuilder.log as qb_log
 import qubesbuilder.plugins as qb_plugins
+from qubesbuilder.plugins.fetch import FetchPlugin
+from qubesbuilder.plugins.source import SourceError
+from qubesbuilder.plugins.source_rpm import RPMSourcePlugin
 from qubesbuilder.plugins.upload import UploadError, UploadPlugin
 
-
 BUILDER_CONF = """\
 executor:
   type: local
@@ -103,6 +111,33 @@ def test_supported_distribution(dist, expected):
     assert UploadPlugin.supported_distribution(dist) is expected
 
 
+def test_save_artifacts_info_resources(config, tmp_path):
+    plugin = _plugin(config, QubesDistribution("host-fc37"))
+    plugin.executor.add_resources({"wall_time": 1.0, "max_rss": 10})
+    # resources are only stored in the info of the job stage
+    plugin.save_artifacts_info("build", "foo", {"files": []}, tmp_path)
+    assert plugin.get_artifacts_info("build", "foo", tmp_path) == {
+        "files": []
+    }
+    plugin.save_artifacts_info("upload", "foo", {"files": []}, tmp_path)
+    assert plugin.get_artifacts_info("upload", "foo", tmp_path) == {
+        "files": [],
+        "resources": {"wall_time": 1.0, "max_rss": 10},
+    }
+
+    # and only for the runs since the info was last saved
+    plugin.save_artifacts_info("upload", "bar", {"files": []}, tmp_path)
+    assert "resources" not in plugin.get_artifacts_info(
+        "upload", "bar", tmp_path
+    )
+    plugin.executor.add_resources({"wall_time": 2.0})
+    plugin.save_artifacts_info("upload", "bar", {"files": []}, tmp_path)
+    assert plugin.get_artifacts_info("upload", "bar", tmp_path) == {
+        "files": [],
+        "resources": {"wall_time": 2.0},
+    }
+
+
 def test_run_requires_local_executor(config):
     plugin = _plugin(config, QubesDistribution("host-fc37"))
     plugin.executor = object()
@@ -209,3 +244,361 @@ def test_run_wraps_executor_error(config, monkeypatch):
 
     with pytest.raises(UploadError, match="Failed to upload to remote host"):
         plugin.run(repository_publish="unstable")
+
+
+def test_fetch_distfiles_store(config, tmp_path, monkeypatch):
+    source_dir = tmp_path / "component"
+    source_dir.mkdir()
+    digest = hashlib.sha256(b"content").hexdigest()
+    (source_dir / "file.tar.gz.sha256").write_text(f"{digest}\n")
+    plugin = FetchPlugin(
+        component=QubesComponent(source_dir), config=config, stage="fetch"
+    )
+
+    def fail_run(*args, **kwargs):
+        raise AssertionError("file should not be downloaded")
+
+    monkeypatch.setattr(plugin.executor, "run", fail_run)
+
+    # files are keyed by their checksum
+    file = {
+        "url": "https://example.com/file.tar.gz",
+        "sha256": "file.tar.gz.sha256",
+    }
+    store_path = config.cache_dir / "distfiles" / "sha256" / digest
+    assert plugin.get_distfiles_store_path(file) == store_path
+    store_path.parent.mkdir(parents=True)
+    store_path.write_bytes(b"content")
+    distfiles_dir = tmp_path / "distfiles"
+    plugin.download_file(file, plugin.executor, distfiles_dir)
+    distfile = distfiles_dir / "file.tar.gz"
+    assert distfile.read_bytes() == b"content"
+    assert distfile.stat().st_ino == store_path.stat().st_ino
+
+    # git archives are keyed by their commit id
+    file = {"git-url": "https://example.com/repo.git", "commit-id": "a" * 40}
+    archive = distfiles_dir / f"repo-{'a' * 40}.tar.gz"
+    archive.write_bytes(b"archive")
+    store_path = plugin.get_distfiles_store_path(file)
+    plugin.store_in_distfiles_store(archive, store_path)
+    assert store_path.stat().st_ino == archive.stat().st_ino
+    other_distfiles_dir = tmp_path / "other-distfiles"
+    plugin.download_git_archive(file, plugin.executor, other_distfiles_dir)
+    assert (other_distfiles_dir / archive.name).read_bytes() == b"archive"
+
+    # files only verified with a signature or git tags are not stored
+    assert not plugin.get_distfiles_store_path(
+        {"url": "https://example.com/file", "signature": "file.asc"}
+    )
+    assert not plugin.get_distfiles_store_path(
+        {"git-url": "https://example.com/repo.git", "tag": "v1.0"}
+    )
+
+
+def test_fetch_download_files(config, tmp_path, monkeypatch):
+    source_dir = tmp_path / "component"
+    source_dir.mkdir()
+    files = []
+    for name in ("first", "second"):
+        digest = hashlib.sha256(name.encode()).hexdigest()
+        (source_dir / f"{name}.sha256").write_text(f"{digest}\n")
+        files.append(
+            {
+                "url": f"https://example.com/{name}",
+                "sha256": f"{name}.sha256",
+            }
+        )
+    plugin = FetchPlugin(
+        component=QubesComponent(source_dir), config=config, stage="fetch"
+    )
+    config.temp_dir.mkdir(parents=True)
+    runs = []
+
+    def run(cmd, copy_in, copy_out, **kwargs):
+        runs.append(cmd)
+        for src, dst in copy_out:
+            (dst / src.name).write_text(src.name.replace("untrusted_", ""))
+
+    monkeypatch.setattr(plugin.executor, "run", run)
+
+    # all the files are downloaded in the same run
+    distfiles_dir = tmp_path / "distfiles"
+    distfiles_dir.mkdir()
+    plugin.download_files(files, plugin.executor, distfiles_dir)
+    assert len(runs) == 1
+    assert len(runs[0]) == 1
+    assert runs[0][0].count("download-file") == 2
+    assert (distfiles_dir / "first").read_text() == "first"
+    assert (distfiles_dir / "second").read_text() == "second"
+
+    # nothing to download
+    plugin.download_files(files, plugin.executor, distfiles_dir)
+    assert len(runs) == 1
+
+
+def test_fetch_remote_head_unchanged(config, tmp_path):
+    def git(*args, cwd=tmp_path):
+        return subprocess.run(
+            ["git", "-c", "user.name=test", "-c", "user.email=test@localhost"]
+            + list(args),
+            cwd=cwd,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+
+    remote = tmp_path / "remote.git"
+    git("init", "--bare", "-b", "main", str(remote))
+    source_dir = config.sources_dir / "component"
+    git("clone", str(remote), str(source_dir))
+    (source_dir / "version").write_text("1.0.0\n")
+    (source_dir / "rel").write_text("1\n")
+    git("add", "version", "rel", cwd=source_dir)
+    git("commit", "-m", "init", cwd=source_dir)
+    git("push", "origin", "HEAD:main", cwd=source_dir)
+
+    plugin = FetchPlugin(
+        component=QubesComponent(source_dir, url=str(remote)),
+        config=config,
+        stage="fetch",
+    )
+    assert not plugin.is_remote_head_unchanged(source_dir)
+
+    commit_hash = git("rev-parse", "HEAD", cwd=source_dir)
+    plugin.save_artifacts_info(
+        stage="fetch",
+        basename="source",
+        info={"git-commit-hash": commit_hash},
+        artifacts_dir=plugin.get_component_artifacts_dir("fetch"),
+    )
+    assert plugin.get_remote_head() == commit_hash
+    assert plugin.is_remote_head_unchanged(source_dir)
+
+    # local modifications
+    (source_dir / "rel").write_text("2\n")
+    assert not plugin.is_remote_head_unchanged(source_dir)
+    git("checkout", "rel", cwd=source_dir)
+
+    # new commit on the remote
+    git("commit", "--allow-empty", "-m", "update", cwd=source_dir)
+    git("push", "origin", "HEAD:main", cwd=source_dir)
+    git("reset", "--hard", "HEAD~1", cwd=source_dir)
+    assert not plugin.is_remote_head_unchanged(source_dir)
+
+
+def test_fetch_update_verified_objects(config, tmp_path):
+    def git(*args):
+        return subprocess.run(
+            ["git", "-c", "user.name=test", "-c", "user.email=test@localhost"]
+            + list(args),
+            cwd=source_dir,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+
+    source_dir = tmp_path / "component"
+    source_dir.mkdir()
+    git("init")
+    git("commit", "--allow-empty", "-m", "first")
+    git("tag", "-a", "-m", "v1.0", "v1.0")
+    other_tag = git("rev-parse", "v1.0")
+    git("commit", "--allow-empty", "-m", "second")
+    commit_hash = git("rev-parse", "HEAD")
+    git("tag", "-a", "-m", "v1.1", "v1.1")
+    tag = git("rev-parse", "v1.1")
+
+    maintainer = "0064428F455451B3EBE78A7F063938BA42CFA724"
+    plugin = FetchPlugin(
+        component=QubesComponent(source_dir, maintainers=[maintainer]),
+        config=config,
+        stage="fetch",
+    )
+    # the digest is computed on the host as get-and-verify-source.py does
+    get_and_verify_source = importlib.import_module(
+        "qubesbuilder.plugins.fetch.scripts.get-and-verify-source"
+    )
+    digest = get_and_verify_source.get_keyring_digest(
+        plugin.manager.entities["fetch"].directory / "keys", [maintainer], False
+    )
+    assert plugin.get_keyring_digest() == digest
+
+    fingerprint = "8B080B3E649B153AA44FE43E722F2B7B164FDEF7"
+    new = tmp_path / "new.json"
+    new.write_text(
+        json.dumps(
+            {
+                f"{digest}:tag:{tag}": fingerprint,
+                f"{digest}:commit:{commit_hash}": fingerprint,
+                # objects not fetched by the job are ignored
+                f"{digest}:tag:{other_tag}": fingerprint,
+                f"{digest}:commit:{'a' * 40}": fingerprint,
+                # digests not matching the host keys are ignored
+                f"{'d' * 64}:tag:{tag}": fingerprint,
+                # invalid entries are ignored
+                f"{digest}:blob:{commit_hash}": fingerprint,
+                f"{digest}:tag:{tag}x": fingerprint,
+            }
+        )
+    )
+    plugin.update_verified_objects(new, source_dir)
+    verified = json.loads(plugin.get_verified_objects_path().read_text())
+    assert verified == {
+        f"{digest}:tag:{tag}": fingerprint,
+        f"{digest}:commit:{commit_hash}": fingerprint,
+    }
+
+    # unknown maintainer key
+    plugin.component.maintainers = ["0" * 40]
+    plugin.get_verified_objects_path().unlink()
+    plugin.update_verified_objects(new, source_dir)
+    assert not plugin.get_verified_objects_path().exists()
+
+
+def test_source_archive_cache_dir(config, tmp_path):
+    source_dir = tmp_path / "component"
+    source_dir.mkdir()
+    (source_dir / ".qubesbuilder").write_text(
+        "host:\n  rpm:\n    build:\n    - component.spec\n"
+        "vm:\n  rpm:\n    build:\n    - component.spec\n"
+    )
+    (source_dir / "version").write_text("1.0\n")
+    for cmd in [
+        ["init"],
+        ["add", ".qubesbuilder", "version"],
+        ["commit", "-m", "init"],
+    ]:
+        subprocess.run(
+            ["git", "-c", "user.name=test", "-c", "user.email=test@localhost"]
+            + cmd,
+            cwd=source_dir,
+            check=True,
+            capture_output=True,
+        )
+
+    def get_dir(dist):
+        component = QubesComponent(source_dir)
+        plugin = RPMSourcePlugin(
+            component=component,
+            dist=QubesDistribution(dist),
+            config=config,
+            stage="prep",
+        )
+        return plugin.get_source_archive_cache_dir()
+
+    # archives are shared by distributions
+    path = get_dir("host-fc41")
+    assert path.parent == config.cache_dir / "archives"
+    assert get_dir("vm-fc42") == path
+
+    # it depends on the source content
+    (source_dir / "file").write_text("content")
+    assert get_dir("host-fc41") != path
+
+    # commands may change the source before the archive is created
+    (source_dir / ".qubesbuilder").write_text(
+        "host:\n  rpm:\n    build:\n    - component.spec\n"
+        "source:\n  source:\n    commands:\n    - touch file\n"
+    )
+    assert get_dir("host-fc41") is None
+
+
+def test_create_archive_cmd(config, tmp_path):
+    source_dir = tmp_path / "component"
+    source_dir.mkdir()
+    (source_dir / "version").write_text("1.0\n")
+
+    def get_cmd(threads=None):
+        content = "host:\n  rpm:\n    build:\n    - component.spec\n"
+        if threads is not None:
+            content += f"source:\n  create-archive-threads: {threads}\n"
+        (source_dir / ".qubesbuilder").write_text(content)
+        plugin = RPMSourcePlugin(
+            component=QubesComponent(source_dir),
+            dist=QubesDistribution("host-fc41"),
+            config=config,
+            stage="prep",
+        )
+        return plugin.get_create_archive_cmd(source_dir, "component-1.0.tar.gz")
+
+    assert get_cmd().endswith(
+        f"/fetch/scripts/create-archive {source_dir} component-1.0.tar.gz"
+    )
+    assert " --threads 0 " in get_cmd(0)
+    with pytest.raises(SourceError):
+        get_cmd("all")
+
+
+def test_source_rpm_single_run(config, tmp_path, monkeypatch):
+    source_dir = tmp_path / "component"
+    source_dir.mkdir()
+    (source_dir / ".qubesbuilder").write_text(
+        "host:\n  rpm:\n    build:\n    - component.spec\n"
+    )
+    (source_dir / "version").write_text("1.0\n")
+    for cmd in [["init"], ["add", "."], ["commit", "-m", "init"]]:
+        subprocess.run(
+            ["git", "-c", "user.name=test", "-c", "user.email=test@localhost"]
+            + cmd,
+            cwd=source_dir,
+            check=True,
+            capture_output=True,
+        )
+
+    def get_plugin():
+        plugin = RPMSourcePlugin(
+            component=QubesComponent(source_dir),
+            dist=QubesDistribution("host-fc41"),
+            config=config,
+            stage="prep",
+        )
+        monkeypatch.setattr(plugin, "check_dependencies", lambda: None)
+        monkeypatch.setattr(plugin, "default_copy_in", lambda *args: [])
+        monkeypatch.setattr(plugin.executor, "run", run)
+        return plugin
+
+    runs = []
+
+    def get_cmd(cmd, name):
+        return next(c for c in cmd if name in c)
+
+    def run(cmd, copy_in, copy_out, **kwargs):
+        runs.append((cmd, copy_in))
+        # package information, created archive and source RPM
+        assert len(copy_out) == 1
+        source_info = copy_out[0][1] / copy_out[0][0].name
+        source_info.mkdir()
+        (source_info / "component.spec_package_release_name").write_text(
+            "component-1.0-1.fc41\ncomponent-1.0.tar.gz\n"
+        )
+        (source_info / "component.spec_packages.list").write_text(
+            "component-1.0-1.fc41.x86_64.rpm\n"
+        )
+        (source_info / "component-1.0-1.fc41.src.rpm").write_text("srpm")
+        if "--cache-dir" not in cmd[-5]:
+            (source_info / "component-1.0.tar.gz").write_text("archive")
+
+    plugin = get_plugin()
+    plugin.run()
+    # source information and source RPM are generated in the same run
+    assert len(runs) == 1
+    cmd, copy_in = runs[0]
+    assert cmd.index(get_cmd(cmd, "get-source-info")) < cmd.index(
+        get_cmd(cmd, "/usr/libexec/mock/mock")
+    )
+    assert "--output-dir" in get_cmd(cmd, "create-source-archive")
+    artifacts_dir = plugin.get_dist_component_artifacts_dir("prep")
+    srpm = artifacts_dir / "component-1.0-1.fc41.src.rpm"
+    assert srpm.read_text() == "srpm"
+    info = plugin.get_dist_artifacts_info("prep", "component.spec")
+    assert info["srpm"] == srpm.name
+    assert info["rpms"] == ["component-1.0-1.fc41.x86_64.rpm"]
+    archive_cache_dir = plugin.get_source_archive_cache_dir()
+    assert (archive_cache_dir / "component-1.0.tar.gz").exists()
+
+    # the cached archive is used by the next distribution
+    shutil.rmtree(artifacts_dir)
+    get_plugin().run()
+    cmd, copy_in = runs[1]
+    assert archive_cache_dir in [src for src, _ in copy_in]
+    assert "--cache-dir" in get_cmd(cmd, "create-source-archive")
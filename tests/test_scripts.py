@@ -1,4 +1,5 @@
 import importlib
+import json
 import random
 import shutil
 import string
@@ -105,6 +106,11 @@ def create_dummy_args(
     maintainers=None,
     minimum_distinct_maintainers=1,
     trust_all_keys=False,
+    git_cache=None,
+    git_cache_output=None,
+    git_cache_known=None,
+    verified_objects=None,
+    verified_objects_output=None,
 ):
     args = Namespace()
 
@@ -139,6 +145,11 @@ def create_dummy_args(
     args.maintainer = maintainers
     args.minimum_distinct_maintainers = minimum_distinct_maintainers
     args.trust_all_keys = trust_all_keys
+    args.git_cache = git_cache
+    args.git_cache_output = git_cache_output
+    args.git_cache_known = git_cache_known or []
+    args.verified_objects = verified_objects
+    args.verified_objects_output = verified_objects_output
     return args
 
 
@@ -651,3 +662,331 @@ def test_repository_shallow_clone(temp_directory):
         == "true"
     )
     assert (temp_directory / "version").exists()
+
+
+def test_repository_git_cache(temp_directory):
+    def git(*args, cwd):
+        return subprocess.run(
+            ["git", "-c", "user.name=test", "-c", "user.email=test@localhost"]
+            + list(args),
+            cwd=cwd,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+
+    remote = temp_directory / "remote"
+    remote.mkdir()
+    git("init", "-b", "main", cwd=remote)
+    (remote / "file").write_text("content")
+    git("add", "file", cwd=remote)
+    git("commit", "-m", "init", cwd=remote)
+    cache = temp_directory / "cache.git"
+    git("init", "--bare", str(cache), cwd=temp_directory)
+
+    def fetch(name, known):
+        output = temp_directory / f"{name}-output"
+        args = create_dummy_args(
+            component_repository=str(remote),
+            component_directory=temp_directory / name,
+            insecure_skip_checking=True,
+            git_cache=str(cache),
+            git_cache_output=str(output),
+            git_cache_known=known,
+        )
+        get_and_verify_source(args)
+        packs = list(output.glob("objects-*.pack"))
+        for pack in packs:
+            with open(pack) as f:
+                subprocess.run(
+                    ["git", "index-pack", "--stdin", "--strict"],
+                    stdin=f,
+                    cwd=cache,
+                    check=True,
+                    capture_output=True,
+                )
+        head = (output / "HEAD").read_text().strip()
+        git("update-ref", f"refs/qb/{name}", head, cwd=cache)
+        return head, packs
+
+    # the first clone exports all the objects
+    first, packs = fetch("first", [])
+    assert len(packs) == 1
+    assert git("rev-parse", "main", cwd=remote) == first
+
+    # the second clone only exports the new objects
+    (remote / "file").write_text("new content")
+    git("commit", "-am", "update", cwd=remote)
+    second, packs = fetch("second", [first])
+    assert git("rev-parse", "main", cwd=remote) == second
+    objects = git("verify-pack", "-v", str(packs[0]), cwd=cache)
+    assert first not in objects and second in objects
+    # the clone does not depend on the cache
+    assert not (temp_directory / "second/.git/objects/info/alternates").exists()
+    git("fsck", cwd=temp_directory / "second")
+
+    # nothing is exported when the objects are already in the cache
+    _, packs = fetch("third", [first, second])
+    assert not packs
+
+
+def test_repository_verified_objects(capsys, temp_directory, home_directory):
+    gnupg_dir = home_directory / "gnupg"
+    remote_repo_dir = temp_directory / "remote_repo"
+    key_id = "8B080B3E649B153AA44FE43E722F2B7B164FDEF7"
+    env = {"GNUPGHOME": gnupg_dir, "HOME": home_directory}
+    remote_repo_dir.mkdir()
+    for cmd in [
+        ["git", "init", "-b", "main"],
+        ["git", "config", "user.signingkey", key_id],
+        ["git", "commit", "--allow-empty", "-m", "init"],
+        ["git", "tag", "-s", "v1.0", "-m", "v1.0"],
+    ]:
+        subprocess.run(
+            cmd, check=True, capture_output=True, env=env, cwd=remote_repo_dir
+        )
+    keys_dir = home_directory / "keys"
+    create_keys_dir(keys_dir, [key_id], gnupg_dir)
+
+    def fetch(name, verified_objects=None):
+        output = temp_directory / f"{name}-verified.json"
+        args = create_dummy_args(
+            component_directory=temp_directory / name,
+            component_repository=str(remote_repo_dir),
+            keys_dir=keys_dir,
+            maintainers=[key_id],
+            verified_objects=verified_objects,
+            verified_objects_output=output,
+        )
+        get_and_verify_source(args)
+        return output, capsys.readouterr().out
+
+    # the tag is verified with gpg
+    first, out = fetch("first")
+    assert "---> Good tag" in out
+    verified = json.loads(first.read_text())
+    assert len(verified) == 1
+    assert list(verified.values()) == [key_id]
+
+    # the tag is already verified
+    second, out = fetch("second", first)
+    assert "---> Already verified tag" in out
+    assert json.loads(second.read_text()) == {}
+    assert not (temp_directory / "second/.keyring").exists()
+
+    # a change to the keys invalidates the verified objects
+    with open(keys_dir / f"{key_id}.asc", "a") as f:
+        f.write("\n")
+    _, out = fetch("third", first)
+    assert "---> Good tag" in out
+    subprocess.run(["gpgconf", "--kill", "gpg-agent"], env=env, check=True)
+
+
+def test_download_file_resume(temp_directory):
+    # curl interrupted after the first part of the file, then resumed
+    bin_dir = temp_directory / "bin"
+    bin_dir.mkdir()
+    curl = bin_dir / "curl"
+    curl.write_text("""#!/bin/bash
+while [ "$1" != "-o" ]; do
+    [ "$1" == "--continue-at" ] && resume=1
+    shift
+done
+if [ -e "$2" ] && [ -n "$resume" ]; then
+    echo -n "ial" >> "$2"
+else
+    echo -n "part" > "$2"
+    exit 18
+fi
+""")
+    curl.chmod(0o755)
+    output_dir = temp_directory / "output"
+    subprocess.run(
+        [
+            PROJECT_PATH / "qubesbuilder/plugins/fetch/scripts/download-file",
+            "--output-dir",
+            output_dir,
+            "--file-name",
+            "file",
+            "--file-url",
+            "https://example.com/file",
+        ],
+        check=True,
+        capture_output=True,
+        env={"PATH": f"{bin_dir}:/usr/bin:/bin"},
+    )
+    assert (output_dir / "untrusted_file").read_text() == "partial"
+
+
+def test_get_source_info(temp_directory):
+    def git(*args, cwd):
+        subprocess.run(
+            ["git", "-c", "user.name=test", "-c", "user.email=test@localhost"]
+            + list(args),
+            cwd=cwd,
+            check=True,
+            capture_output=True,
+        )
+
+    source_dir = temp_directory / "component"
+    module_dir = source_dir / "module"
+    module_dir.mkdir(parents=True)
+    git("init", cwd=source_dir)
+    git("commit", "--allow-empty", "-m", "init", cwd=source_dir)
+    git("tag", "v1.0", cwd=source_dir)
+    git("init", cwd=module_dir)
+    (module_dir / "file").write_text("content")
+    git("add", "file", cwd=module_dir)
+    git("commit", "-m", "init", cwd=module_dir)
+
+    output_dir = temp_directory / "source-info"
+    subprocess.run(
+        [
+            PROJECT_PATH / "qubesbuilder/plugins/fetch/scripts/get-source-info",
+            source_dir,
+            output_dir,
+            "--module",
+            "module",
+            "--module",
+            "missing",
+        ],
+        check=True,
+        capture_output=True,
+    )
+    info = json.loads((output_dir / "info.json").read_text())
+    assert len(info["git-commit-hash"]) == 40
+    assert info["git-version-tags"] == ["v1.0"]
+    # missing modules are left out
+    assert [m["name"] for m in info["modules"]] == ["module"]
+    archive = info["modules"][0]["archive"]
+    assert archive == f"module-{info['modules'][0]['hash'][:16]}.tar.gz"
+    assert (output_dir / archive).exists()
+
+    # existing archives are not created again
+    shutil.rmtree(output_dir)
+    subprocess.run(
+        [
+            PROJECT_PATH / "qubesbuilder/plugins/fetch/scripts/get-source-info",
+            source_dir,
+            output_dir,
+            "--module",
+            "module",
+            "--skip-archive",
+            archive,
+        ],
+        check=True,
+        capture_output=True,
+    )
+    assert not (output_dir / archive).exists()
+
+
+def test_create_archive_threads(temp_directory):
+    source_dir = temp_directory / "component"
+    source_dir.mkdir()
+    (source_dir / "file").write_text("content\n" * 1000)
+    for cmd in [["init"], ["add", "file"], ["commit", "-m", "init"]]:
+        subprocess.run(
+            ["git", "-c", "user.name=test", "-c", "user.email=test@localhost"]
+            + cmd,
+            cwd=source_dir,
+            check=True,
+            capture_output=True,
+        )
+
+    def create_archive(name, *args):
+        subprocess.run(
+            [
+                PROJECT_PATH
+                / "qubesbuilder/plugins/fetch/scripts/create-archive",
+                *args,
+                source_dir,
+                name,
+            ],
+            check=True,
+            capture_output=True,
+        )
+        archive = source_dir / name
+        members = subprocess.run(
+            ["tar", "tvf", archive],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        content = archive.read_bytes()
+        archive.unlink()
+        return members, content
+
+    members, single = create_archive("component-1.0.tar.xz")
+    assert "0/0" in members and "component-1.0/file" in members
+    # the output of multi-threaded xz does not depend on the number of
+    # threads nor on the files mtime
+    assert create_archive("component-1.0.tar.xz", "--threads", "0") == (
+        members,
+        create_archive("component-1.0.tar.xz", "--threads", "2")[1],
+    )
+    (source_dir / "file").touch()
+    assert create_archive("component-1.0.tar.xz") == (members, single)
+
+    with pytest.raises(subprocess.CalledProcessError):
+        create_archive("component-1.0.tar.xz", "--threads", "all")
+    # gzip is not a fallback of pigz, their outputs differ
+    if not shutil.which("pigz"):
+        with pytest.raises(subprocess.CalledProcessError):
+            create_archive("component-1.0.tar.gz", "--threads", "2")
+
+
+def test_create_source_archive(temp_directory):
+    source_dir = temp_directory / "component"
+    source_dir.mkdir()
+    (source_dir / "file").write_text("content")
+    for cmd in [["init"], ["add", "file"], ["commit", "-m", "init"]]:
+        subprocess.run(
+            ["git", "-c", "user.name=test", "-c", "user.email=test@localhost"]
+            + cmd,
+            cwd=source_dir,
+            check=True,
+            capture_output=True,
+        )
+    package_info = temp_directory / "component.spec_package_release_name"
+    output_dir = temp_directory / "output"
+    output_dir.mkdir()
+    cache_dir = temp_directory / "cache"
+    cache_dir.mkdir()
+
+    def create_source_archive(source0, *args):
+        package_info.write_text(f"component-1.0-1.fc41\n{source0}\n")
+        return subprocess.run(
+            [
+                PROJECT_PATH
+                / "qubesbuilder/plugins/source_rpm/scripts/create-source-archive",
+                *args,
+                source_dir,
+                package_info,
+            ],
+            capture_output=True,
+        )
+
+    # Source0 may contain a URL
+    archive = "component-1.0.tar.gz"
+    result = create_source_archive(
+        f"https://example.com/{archive}", "--output-dir", output_dir
+    )
+    assert result.returncode == 0
+    assert (source_dir / archive).read_bytes() == (
+        output_dir / archive
+    ).read_bytes()
+
+    # cached archives are used as is
+    (source_dir / archive).unlink()
+    (output_dir / archive).unlink()
+    (cache_dir / archive).write_text("cached")
+    result = create_source_archive(
+        archive, "--cache-dir", cache_dir, "--output-dir", output_dir
+    )
+    assert result.returncode == 0
+    assert (source_dir / archive).read_text() == "cached"
+    assert not (output_dir / archive).exists()
+
+    # no archive without Source0
+    assert create_source_archive("source").returncode == 0
+    assert create_source_archive(".component.tar.gz").returncode == 1
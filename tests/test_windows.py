@@ -18,8 +18,10 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 
+import os
 import subprocess
-from pathlib import Path
+import threading
+from pathlib import Path, PureWindowsPath
 
 import pytest
 import yaml
@@ -27,8 +29,16 @@ import yaml
 from qubesbuilder.component import QubesComponent
 from qubesbuilder.config import Config
 from qubesbuilder.distribution import QubesDistribution
-from qubesbuilder.executors import ExecutorError
-from qubesbuilder.executors.windows import BaseWindowsExecutor
+from qubesbuilder.executors import ExecutorError, InfrastructureError
+from qubesbuilder.executors import qubes as qubes_executors
+from qubesbuilder.executors.qubes import (
+    WindowsQubesExecutor,
+    close_windows_workers,
+)
+from qubesbuilder.executors.windows import (
+    BaseWindowsExecutor,
+    SSHWindowsExecutor,
+)
 from qubesbuilder.plugins import PackagePath
 from qubesbuilder.plugins import PluginError
 from qubesbuilder.plugins.build import BuildError
@@ -46,7 +56,6 @@ from qubesbuilder.plugins.publish_windows import WindowsPublishPlugin
 from qubesbuilder.plugins.sign_windows import WindowsSignPlugin
 from qubesbuilder.plugins.source_windows import WindowsSourcePlugin
 
-
 WIN_QUBESBUILDER = """\
 vm:
   windows:
@@ -263,6 +272,48 @@ class DummyWindowsExecutor(BaseWindowsExecutor):
         return ""
 
 
+class RecordingSSHWindowsExecutor(SSHWindowsExecutor):
+    def __init__(self, **kwargs):
+        super().__init__(ssh_ip="127.0.0.1", delta_copy_in=True, **kwargs)
+        self.remote_manifest = ""
+        self.commands = []
+        self.transferred = []
+
+    async def ssh_cmd_async(self, cmd):
+        self.commands += cmd
+        return ""
+
+    async def _run_powershell_async(self, ps_script):
+        return self.remote_manifest
+
+    async def _scp_file_async(self, local_path, remote_path):
+        self.remote_manifest = local_path.read_text()
+
+    async def execute_async(self, cmd, *args, **kwargs):
+        self.transferred += [f for f in cmd[cmd.index("-q") + 1 : -1]]
+        return 0
+
+
+class RecordingWindowsQubesExecutor(WindowsQubesExecutor):
+    events: list = []
+
+    async def prepare_worker_async(self):
+        self.dispvm = f"disp{len(self.events)}"
+        self.events.append(("start", self.dispvm))
+
+    async def wipe_worker_async(self):
+        self.events.append(("wipe", self.dispvm))
+
+    async def build_async(self, cmd, copy_in=None, copy_out=None):
+        if cmd == ["fail"]:
+            raise ExecutorError("build failed")
+        self.events.append(("build", self.dispvm))
+        return ""
+
+    async def cleanup_async(self):
+        self.events.append(("cleanup", self.dispvm))
+
+
 class DummyPublishExecutor:
     def __init__(self, should_raise=False):
         self.should_raise = should_raise
@@ -1545,3 +1596,169 @@ def test_pipeline_all_stages_produce_artifacts(config, component, win_dist):
     publish_info = yaml.safe_load(publish_artifact.read_text())
     assert len(publish_info["repository-publish"]) == 1
     assert publish_info["repository-publish"][0]["name"] == "current-testing"
+
+
+#
+# Executor
+#
+
+
+def test_ssh_executor_copy_in_delta(tmp_path):
+    plugin_dir = tmp_path / "build_windows"
+    (plugin_dir / "scripts").mkdir(parents=True)
+    (plugin_dir / "scripts" / "build.ps1").write_text("build")
+    (plugin_dir / "scripts" / "sign.ps1").write_text("sign")
+
+    executor = RecordingSSHWindowsExecutor(ssh_control_master=False)
+    copy_in = [(plugin_dir, executor.get_plugins_dir())]
+    executor.copy_in_delta(copy_in)
+    assert sorted(executor.transferred) == [
+        str(plugin_dir / "scripts" / "build.ps1"),
+        str(plugin_dir / "scripts" / "sign.ps1"),
+    ]
+    assert any(c.startswith("xcopy ") for c in executor.commands)
+
+    # nothing to transfer when unchanged
+    executor.transferred = []
+    executor.copy_in_delta(copy_in)
+    assert executor.transferred == []
+
+    # only changed files are transferred and deleted files are removed
+    executor.transferred = []
+    executor.commands = []
+    (plugin_dir / "scripts" / "build.ps1").write_text("build2")
+    (plugin_dir / "scripts" / "sign.ps1").unlink()
+    executor.copy_in_delta(copy_in)
+    assert executor.transferred == [str(plugin_dir / "scripts" / "build.ps1")]
+    assert (
+        'if exist "c:\\builder-mirror\\plugins\\build_windows\\scripts\\sign.ps1" '
+        'del /f /q "c:\\builder-mirror\\plugins\\build_windows\\scripts\\sign.ps1"'
+        in executor.commands
+    )
+
+    # destinations outside the builder directory are copied directly
+    executor.transferred = []
+    executor.commands = []
+    executor.copy_in_delta([(plugin_dir, PureWindowsPath("c:\\tools"))])
+    assert executor.transferred == ["-r", str(plugin_dir)]
+    assert not any(c.startswith("xcopy ") for c in executor.commands)
+
+
+def test_ssh_executor_tar_stream(tmp_path):
+    source = tmp_path / "source"
+    (source / "scripts").mkdir(parents=True)
+    (source / "scripts" / "build.ps1").write_text("build")
+    destination = tmp_path / "destination"
+    destination.mkdir()
+
+    # as copied-in and then copied-out relative to the builder directory
+    read_fd, write_fd = os.pipe()
+    writer = threading.Thread(
+        target=SSHWindowsExecutor._write_tar,
+        args=(write_fd, [(source, "plugins/build_windows")]),
+    )
+    writer.start()
+    SSHWindowsExecutor._read_tar(
+        read_fd, [("plugins/build_windows/scripts", destination)]
+    )
+    writer.join()
+    assert (destination / "scripts" / "build.ps1").read_text() == "build"
+
+
+def test_ssh_executor_options(tmp_path):
+    executor = SSHWindowsExecutor(ssh_ip="127.0.0.1")
+    cmd = executor._ssh_base_cmd()
+    assert "ControlMaster auto" in cmd
+    assert cmd[-1] == "user@127.0.0.1"
+
+    executor = SSHWindowsExecutor(
+        ssh_ip="127.0.0.1", ssh_control_master="false"
+    )
+    assert "ControlMaster auto" not in executor._scp_base_cmd()
+
+    with pytest.raises(ExecutorError) as e:
+        SSHWindowsExecutor(ssh_ip="127.0.0.1", copy_mode="zip")
+    assert str(e.value) == "Unknown copy mode 'zip'."
+
+
+@pytest.mark.parametrize(
+    ("stderr", "check", "expected"),
+    [
+        (b"ssh: connect to host 127.0.0.1 port 22: No route to host", 0, True),
+        (b"mux_client_request_session: read from master failed", 0, True),
+        # the remote command exited with 255 itself
+        (b"build failed", 0, False),
+        (b"build failed", 255, True),
+    ],
+)
+def test_ssh_executor_connection_failure(stderr, check, expected):
+    class FailingSSHWindowsExecutor(SSHWindowsExecutor):
+        async def execute_async(self, cmd, *args, **kwargs):
+            if "check" in cmd:
+                return check, b"", b""
+            return 255, b"", stderr
+
+    executor = FailingSSHWindowsExecutor(ssh_ip="127.0.0.1")
+    with pytest.raises(ExecutorError) as e:
+        executor.ssh_cmd(["build.bat"])
+    assert isinstance(e.value, InfrastructureError) is expected
+
+    # without control master, only ssh messages tell it apart
+    executor = FailingSSHWindowsExecutor(
+        ssh_ip="127.0.0.1", ssh_control_master=False
+    )
+    with pytest.raises(ExecutorError) as e:
+        executor.ssh_cmd(["build.bat"])
+    assert isinstance(e.value, InfrastructureError) is (
+        expected and stderr != b"build failed"
+    )
+
+
+def test_ssh_executor_ewdk_cache(tmp_path):
+    ewdk = tmp_path / "ewdk.iso"
+    ewdk.write_bytes(b"iso")
+
+    executor = RecordingSSHWindowsExecutor(
+        ewdk=str(ewdk), ewdk_mode="copy", ewdk_skip_checksum=True
+    )
+    executor.remote_manifest = "False"
+    executor.setup_remote()
+    assert executor.remote_manifest == "iso"
+
+    # the remote image is neither probed nor transferred again
+    executor.remote_manifest = "False"
+    executor.setup_remote()
+    assert executor.remote_manifest == "False"
+
+
+def test_windows_executor_persistent_worker(tmp_path, monkeypatch):
+    async def vm_state_async(executor, vm):
+        return "Running"
+
+    monkeypatch.setattr(qubes_executors, "vm_state_async", vm_state_async)
+    events = RecordingWindowsQubesExecutor.events = []
+
+    def run(cmd):
+        executor = RecordingWindowsQubesExecutor(
+            ewdk=str(tmp_path / "ewdk.iso"), persistent_worker=True
+        )
+        executor.run(cmd)
+
+    run(["build"])
+    run(["build"])
+    with pytest.raises(ExecutorError):
+        run(["fail"])
+    run(["build"])
+    close_windows_workers()
+
+    assert events == [
+        ("start", "disp0"),
+        ("build", "disp0"),
+        ("wipe", "disp0"),
+        ("build", "disp0"),
+        ("wipe", "disp0"),
+        ("cleanup", "disp0"),
+        ("start", "disp6"),
+        ("build", "disp6"),
+        ("cleanup", "disp6"),
+    ]